@@ -0,0 +1,77 @@
+# app/async_db.py
+"""
+Асинхронный доступ к app.database для async-обработчиков FastAPI.
+sqlite3 блокирующий, поэтому каждый вызов уходит в отдельный ограниченный
+пул потоков (DB_WORKERS): event loop не ждёт БД, а число одновременных
+обращений к SQLite не растёт вместе с числом запросов.
+
+    project = await async_db.get_projects(project_id)
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from app import database
+
+# Потоков под БД: SQLite всё равно пишет по одному, читателям в WAL хватает нескольких
+DB_WORKERS = int(os.getenv("DB_WORKERS", 4))
+
+_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
+
+
+async def run_db(fn, *args, **kwargs):
+    """Выполняет синхронную функцию доступа к БД в пуле DB_WORKERS."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+def _awaitable(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run_db(fn, *args, **kwargs)
+    return wrapper
+
+
+# --- проекты -----------------------------------------------------------
+get_projects          = _awaitable(database.get_projects)
+get_project_ids       = _awaitable(database.get_project_ids)
+count_projects        = _awaitable(database.count_projects)
+create_project        = _awaitable(database.create_project)
+update_project_content = _awaitable(database.update_project_content)
+
+
+async def create_seeded_project(*args, **kwargs) -> int:
+    # app.seeders импортируется по месту: ему нужны pydantic-модели сидов
+    # из app.schemas, а остальным обёрткам — нет
+    from app import seeders
+    return await run_db(seeders.create_seeded_project, *args, **kwargs)
+
+
+async def apply_seed(*args, **kwargs) -> None:
+    from app import seeders
+    return await run_db(seeders.apply_seed, *args, **kwargs)
+
+
+async def list_projects(*args, **kwargs) -> list[dict]:
+    """Страница iter_projects (генератор вычитывается целиком в потоке БД)."""
+    return await run_db(lambda: list(database.iter_projects(*args, **kwargs)))
+
+
+# --- каталог, FAQ, брони, настройки -------------------------------------
+get_products_list     = _awaitable(database.get_products_list)
+add_product           = _awaitable(database.add_product)
+delete_product        = _awaitable(database.delete_product)
+get_faq_entries       = _awaitable(database.get_faq_entries)
+add_faq_entry         = _awaitable(database.add_faq_entry)
+delete_faq_entry      = _awaitable(database.delete_faq_entry)
+create_booking        = _awaitable(database.create_booking)
+get_booking           = _awaitable(database.get_booking)
+update_booking_status = _awaitable(database.update_booking_status)
+get_bookings_by_date  = _awaitable(database.get_bookings_by_date)
+get_all_bookings      = _awaitable(database.get_all_bookings)
+get_setting           = _awaitable(database.get_setting)
+set_setting           = _awaitable(database.set_setting)
+is_banned             = _awaitable(database.is_banned)
+ban_user              = _awaitable(database.ban_user)
@@ -0,0 +1,120 @@
+# app/bulk_export.py
+"""
+Массовый экспорт проектов (например, после правки шаблона).
+Рендер, сборка БД и упаковка каждого проекта выполняются в отдельном
+процессе ProcessPoolExecutor, по одному воркеру на доступное ядро;
+внутри процесса архив сжимается в один поток — ядра уже заняты процессами.
+HTTP-вызов идёт фоновой задачей (export_jobs.submit_bulk_export).
+
+CLI:
+    python -m app.bulk_export --template order_bot
+    python -m app.bulk_export --ids 1 2 3 --workers 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable
+
+from app.database import get_project_ids, get_projects
+from app.export_cache import ensure_export
+
+
+def available_cpus() -> int:
+    """Число ядер, доступных процессу (с учётом affinity/cgroup-маски)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def export_one(project_id: int) -> dict:
+    """Экспортирует один проект в кэш; выполняется в процессе-воркере."""
+    started = time.perf_counter()
+    try:
+        project = get_projects(project_id)
+        if not project:
+            raise LookupError("Проект не найден")
+        path, from_cache = ensure_export(project, zip_workers=1)
+        return {
+            "project_id": project_id,
+            "status":     "ok",
+            "cached":     from_cache,
+            "path":       str(path),
+            "size":       path.stat().st_size,
+            "seconds":    round(time.perf_counter() - started, 3),
+        }
+    except Exception as e:
+        return {
+            "project_id": project_id,
+            "status":     "failed",
+            "error":      f"{type(e).__name__}: {e}",
+            "seconds":    round(time.perf_counter() - started, 3),
+        }
+
+
+def export_many(project_ids: list[int] | None = None,
+                template_type: str | None = None,
+                workers: int | None = None,
+                on_start: Callable[[int, int], None] | None = None,
+                on_result: Callable[[dict], None] | None = None) -> dict:
+    """
+    Экспортирует список проектов (или все проекты шаблона template_type)
+    параллельно и возвращает сводку с таймингами и ошибками по каждому.
+    on_start(число проектов, воркеров) и on_result(итог проекта) — для прогресса.
+    """
+    if project_ids is None:
+        project_ids = get_project_ids(template_type)
+    workers = max(1, min(workers or available_cpus(), len(project_ids) or 1))
+    if on_start is not None:
+        on_start(len(project_ids), workers)
+
+    started = time.perf_counter()
+    results = []
+    # spawn: дочерние процессы не наследуют открытые sqlite-соединения
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = [pool.submit(export_one, pid) for pid in project_ids]
+        for fut in as_completed(futures):
+            results.append(fut.result())
+            if on_result is not None:
+                on_result(results[-1])
+    results.sort(key=lambda r: r["project_id"])
+
+    failed = sum(1 for r in results if r["status"] != "ok")
+    return {
+        "total":   len(results),
+        "ok":      len(results) - failed,
+        "failed":  failed,
+        "workers": workers,
+        "seconds": round(time.perf_counter() - started, 3),
+        "results": results,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Массовый экспорт ботов")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--ids", type=int, nargs="+", help="id проектов")
+    target.add_argument("--template", help="тип шаблона, например order_bot")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="число процессов (по умолчанию — по числу ядер)")
+    args = parser.parse_args(argv)
+
+    report = export_many(args.ids, args.template, args.workers)
+    for r in report["results"]:
+        if r["status"] == "ok":
+            mark = "cache" if r["cached"] else "built"
+            print(f"#{r['project_id']:<6} ok      {r['seconds']:>8.3f}s  {mark}  {r['path']}")
+        else:
+            print(f"#{r['project_id']:<6} FAILED  {r['seconds']:>8.3f}s  {r['error']}")
+    print(f"{report['ok']}/{report['total']} ok, {report['failed']} failed, "
+          f"{report['workers']} workers, {report['seconds']}s")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
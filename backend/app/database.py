@@ -4,200 +4,57 @@ import sqlite3
 import json
 import os
 import json
+import threading
+from collections import OrderedDict
 from app.utils.db_safe import transaction
 from pathlib import Path
 from datetime import datetime, timedelta
 
-from app.utils.db_safe import transaction, safe_execute
+from app.utils.db_safe import (
+    transaction, read_transaction, joined_transaction, safe_execute, iter_execute,
+)
+from app.migrations import LATEST_VERSION, migrate, schema_version
+from app.storage import engine_backed
+from app.utils import exception_index, feedback, moderation
 
 DB_PATH = Path(__file__).resolve().parent / "database.db"
 SLOT_SIZE_MIN = 15  # минута ячейки для расписания
-
+# Граница диапазона в единицах колонок start_ts (секунды эпохи): то же
+# выражение, что и в генерируемой колонке, но над параметром — индекс работает
+_TS = "CAST(strftime('%s', ?) AS INTEGER)"
+_TS_NEXT_DAY = "CAST(strftime('%s', ?, '+1 day') AS INTEGER)"
+
+# --- кэш проектов ----------------------------------------------------
+# id → (rev, проект). Актуальность записи проверяется по projects.rev,
+# который триггер увеличивает при любой правке (в т.ч. из другого процесса).
+PROJECT_CACHE_SIZE = int(os.getenv("PROJECT_CACHE_SIZE", 256))
+_project_cache: "OrderedDict[int, tuple[int, dict]]" = OrderedDict()
+_project_cache_lock = threading.Lock()
+_project_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+# Поля проекта в порядке колонок; в листинг по умолчанию не попадают
+# тяжёлый content и секретный token
+PROJECT_FIELDS = ("id", "name", "template_type", "description", "token", "content")
+PROJECT_LIST_FIELDS = ("id", "name", "template_type", "description")
+
+@engine_backed
 def init_db(db_path: Path = None):
     """
-    Инициализирует схему в файле SQLite.
+    Приводит схему в файле SQLite к последней версии (app/migrations.py).
     Если db_path не указан, используется основной DB_PATH.
+    Актуальная БД проверяется read-only запросом, без DDL и блокировки записи.
     """
     if db_path is None:
         db_path = DB_PATH
+    with read_transaction(db_path) as conn:
+        if schema_version(conn) >= LATEST_VERSION:
+            return
     with transaction(db_path) as conn:
-        cur = conn.cursor()
-        # … остальной код без изменений …
-
-
-        # Проекты
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS projects (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            template_type TEXT,
-            description TEXT,
-            token TEXT,
-            content TEXT
-        )
-        """)
-        # Каталог товаров/услуг
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS products (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            project_id INTEGER,
-            name TEXT,
-            short_desc TEXT,
-            full_desc TEXT,
-            media_path TEXT
-        )
-        """)
-        # Бронирования
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS bookings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            project_id INTEGER,
-            user_id INTEGER,
-            service_id INTEGER,
-            start_dt TEXT,
-            duration_cells INTEGER,
-            client_name TEXT,
-            client_phone TEXT,
-            status TEXT DEFAULT 'pending',
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-        # Бан-лист
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS banned_users (
-            project_id INTEGER,
-            user_id INTEGER,
-            PRIMARY KEY(project_id, user_id)
-        )
-        """)
-        # Корзина
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS cart_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            project_id INTEGER,
-            user_id INTEGER,
-            product_id INTEGER,
-            quantity INTEGER DEFAULT 1
-        )
-        """)
-        # Окна работы
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS work_intervals (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            project_id INTEGER,
-            start_dt TEXT,
-            end_dt TEXT
-        )
-        """)
-        # Исключения (паника)
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS work_exceptions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            project_id INTEGER,
-            start_dt TEXT,
-            end_dt TEXT,
-            state TEXT
-        )
-        """)
-        # Настройки рассылки
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS settings (
-            key TEXT PRIMARY KEY,
-            value TEXT
-        )
-        """)
-        cur.executemany("""
-            INSERT OR IGNORE INTO settings(key,value) VALUES(?,?)
-        """, [
-            ('summary_enabled', 'true'),
-            ('summary_time',    '07:00'),
-            ('summary_timezone','Europe/Bucharest'),
-        ])
-        # FAQ
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS faq_entries (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            project_id INTEGER,
-            question TEXT,
-            answer TEXT,
-            media_path TEXT
-        )
-        """)
-        # Helper-bot: «пасты»
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS helper_entries (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            project_id INTEGER,
-            alias TEXT UNIQUE,
-            content TEXT,
-            media_path TEXT,
-            admin_only BOOLEAN DEFAULT 0
-)
-        )
-        """)
-        # Moderator-bot: настройки
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS moderation_settings (
-            project_id    INTEGER PRIMARY KEY,
-            allow_media    INTEGER DEFAULT 0,
-            allow_stickers INTEGER DEFAULT 0,
-            censor_enabled INTEGER DEFAULT 1,
-            flood_max      INTEGER DEFAULT 3,
-            flood_window_s INTEGER DEFAULT 600
-        )
-        """)
-        # Moderator-bot: белый список доменов
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS link_whitelist (
-            project_id INTEGER,
-            domain     TEXT,
-            PRIMARY KEY(project_id, domain)
-        )
-        """)
-        # Moderator-bot: предупреждения (страйки)
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS user_warnings (
-            project_id INTEGER,
-            chat_id    INTEGER,
-            user_id    INTEGER,
-            strikes    INTEGER DEFAULT 0,
-            last_ts    INTEGER,
-            PRIMARY KEY(project_id, chat_id, user_id)
-        )
-        """)
-        # Moderator-bot: логирование нарушений
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS moderation_logs (
-            id         INTEGER PRIMARY KEY AUTOINCREMENT,
-            project_id INTEGER,
-            chat_id    INTEGER,
-            user_id    INTEGER,
-            message_id INTEGER,
-            violation  TEXT,
-            text       TEXT,
-            ts         INTEGER
-        )
-        """)
- # Anonymous‑Feedback: лог и бан‑лист
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS feedback_messages (
-            id          INTEGER PRIMARY KEY AUTOINCREMENT,
-            project_id  INTEGER,
-            user_id     INTEGER,
-            direction   TEXT,          -- 'in' | 'out'
-            text        TEXT,
-            ts          INTEGER
-        )
-        """)
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS feedback_blocked (
-            project_id INTEGER,
-            user_id    INTEGER,
-            PRIMARY KEY(project_id, user_id)
-        )
-        """)
-def create_project(project):
-    with transaction(DB_PATH) as conn:
+        migrate(conn)
+
+@engine_backed
+def create_project(project, conn=None):
+    with joined_transaction(conn, DB_PATH) as conn:
         cur = conn.execute(
             "INSERT INTO projects(name,template_type,description,token,content) VALUES(?,?,?,?,?)",
             (
@@ -208,49 +65,143 @@ def create_project(project):
                 json.dumps(project.content)
             )
         )
-        return cur.lastrowid
-def update_project_content(project_id: int, content: dict):
-    with transaction(DB_PATH) as conn:
+        project_id = cur.lastrowid
+    invalidate_project(project_id)
+    return project_id
+@engine_backed
+def update_project_content(project_id: int, content: dict, conn=None):
+    with joined_transaction(conn, DB_PATH) as conn:
         conn.execute(
             "UPDATE projects SET content=? WHERE id=?",
             (json.dumps(content), project_id)
         )
+    invalidate_project(project_id)
+
+@engine_backed
+def get_project_content(project_id: int, conn=None):
+    """content проекта (свежая копия); с conn видна и незакоммиченная строка."""
+    with joined_transaction(conn, DB_PATH) as conn:
+        row = conn.execute(
+            "SELECT content FROM projects WHERE id=?", (project_id,)
+        ).fetchone()
+    return json.loads(row[0]) if row else None
+
+def _project_from_row(r) -> dict:
+    return {
+        "id":            r[0],
+        "name":          r[1],
+        "template_type": r[2],
+        "description":   r[3],
+        "token":         r[4],
+        "content":       json.loads(r[5])
+    }
+
+def invalidate_project(project_id=None):
+    """Сбрасывает кэш одного проекта (или весь кэш, если id не задан)."""
+    with _project_cache_lock:
+        if project_id is None:
+            _project_cache.clear()
+        else:
+            _project_cache.pop(project_id, None)
+        _project_cache_stats["invalidations"] += 1
+
+def project_cache_stats() -> dict:
+    """Счётчики кэша проектов: попадания, промахи, сбросы, размер."""
+    with _project_cache_lock:
+        return {
+            **_project_cache_stats,
+            "size":     len(_project_cache),
+            "max_size": PROJECT_CACHE_SIZE,
+        }
+
+def _get_project_cached(project_id):
+    """
+    Проект из LRU-кэша, если его rev не изменился; иначе — из БД
+    с разбором content. Возвращаемый dict общий для всех вызовов:
+    менять его нельзя, для правок — копия.
+    """
+    with _project_cache_lock:
+        entry = _project_cache.get(project_id)
+    if entry is not None:
+        rows = safe_execute("SELECT rev FROM projects WHERE id=?", (project_id,), DB_PATH)
+        if rows and rows[0][0] == entry[0]:
+            with _project_cache_lock:
+                if project_id in _project_cache:
+                    _project_cache.move_to_end(project_id)
+                _project_cache_stats["hits"] += 1
+            return entry[1]
+
+    rows = safe_execute(
+        "SELECT id,name,template_type,description,token,content,rev FROM projects WHERE id=?",
+        (project_id,),
+        DB_PATH
+    )
+    with _project_cache_lock:
+        _project_cache_stats["misses"] += 1
+        if not rows:
+            _project_cache.pop(project_id, None)
+            return None
+        project = _project_from_row(rows[0])
+        _project_cache[project_id] = (rows[0][6], project)
+        _project_cache.move_to_end(project_id)
+        while len(_project_cache) > PROJECT_CACHE_SIZE:
+            _project_cache.popitem(last=False)
+    return project
+
+@engine_backed
 def get_projects(project_id=None):
     if project_id is not None:
+        return _get_project_cached(project_id)
+    else:
+        return list(iter_projects(fields=PROJECT_FIELDS))
+
+@engine_backed
+def iter_projects(after_id=0, limit=None, fields=PROJECT_LIST_FIELDS, template_type=None):
+    """
+    Проекты с id > after_id по возрастанию id (keyset-пагинация),
+    не больше limit штук. Читаются только колонки из fields (id — всегда),
+    content разбирается, только если запрошен. Строки идут потоком.
+    """
+    cols = [f for f in PROJECT_FIELDS if f == "id" or f in fields]
+    sql = f"SELECT {','.join(cols)} FROM projects WHERE id>?"
+    params = [after_id]
+    if template_type is not None:
+        sql += " AND template_type=?"
+        params.append(template_type)
+    sql += " ORDER BY id"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    for row in iter_execute(sql, tuple(params), DB_PATH):
+        project = dict(zip(cols, row))
+        if "content" in project:
+            project["content"] = json.loads(project["content"])
+        yield project
+
+@engine_backed
+def count_projects(template_type=None) -> int:
+    if template_type is None:
+        rows = safe_execute("SELECT count(*) FROM projects", (), DB_PATH)
+    else:
         rows = safe_execute(
-            "SELECT id,name,template_type,description,token,content FROM projects WHERE id=?",
-            (project_id,),
-            DB_PATH
+            "SELECT count(*) FROM projects WHERE template_type=?", (template_type,), DB_PATH
         )
-        if not rows:
-            return None
-        r = rows[0]
-        return {
-            "id":            r[0],
-            "name":          r[1],
-            "template_type": r[2],
-            "description":   r[3],
-            "token":         r[4],
-            "content":       json.loads(r[5])
-        }
+    return rows[0][0]
+
+@engine_backed
+def get_project_ids(template_type=None):
+    """id проектов (опционально — только заданного типа шаблона)."""
+    if template_type is None:
+        rows = safe_execute("SELECT id FROM projects ORDER BY id", (), DB_PATH)
     else:
         rows = safe_execute(
-            "SELECT id,name,template_type,description,token,content FROM projects",
-            (),
+            "SELECT id FROM projects WHERE template_type=? ORDER BY id",
+            (template_type,),
             DB_PATH
         )
-        return [
-            {
-              "id":            r[0],
-              "name":          r[1],
-              "template_type": r[2],
-              "description":   r[3],
-              "token":         r[4],
-              "content":       json.loads(r[5])
-            }
-            for r in rows
-        ]
+    return [r[0] for r in rows]
 
+@engine_backed
 def get_products_list(project_id):
     rows = safe_execute(
         "SELECT id,name,short_desc,full_desc,media_path FROM products WHERE project_id=? ORDER BY id",
@@ -262,6 +213,7 @@ def get_products_list(project_id):
         for r in rows
     ]
 
+@engine_backed
 def add_product(project_id, name, short_desc, full_desc, media_path=""):
     with transaction(DB_PATH) as conn:
         cur = conn.execute(
@@ -270,6 +222,21 @@ def add_product(project_id, name, short_desc, full_desc, media_path=""):
         )
         return cur.lastrowid
 
+@engine_backed
+def add_products_bulk(project_id, items, conn=None):
+    """
+    Пакетная вставка товаров одним executemany в одной транзакции.
+    items — итерируемое кортежей (name, short_desc, full_desc, media_path).
+    Возвращает число вставленных строк.
+    """
+    with joined_transaction(conn, DB_PATH) as conn:
+        cur = conn.executemany(
+            "INSERT INTO products(project_id,name,short_desc,full_desc,media_path) VALUES(?,?,?,?,?)",
+            ((project_id, *item) for item in items)
+        )
+        return cur.rowcount
+
+@engine_backed
 def delete_product(project_id, product_id):
     with transaction(DB_PATH) as conn:
         conn.execute(
@@ -277,6 +244,7 @@ def delete_product(project_id, product_id):
             (project_id, product_id)
         )
 
+@engine_backed
 def create_booking(project_id, user_id, service_id, start_dt, duration_cells, client_name, client_phone):
     with transaction(DB_PATH) as conn:
         cur = conn.execute(
@@ -286,6 +254,21 @@ def create_booking(project_id, user_id, service_id, start_dt, duration_cells, cl
         )
         return cur.lastrowid
 
+@engine_backed
+def create_bookings_bulk(project_id, items, conn=None):
+    """
+    Пакетная вставка броней. items — кортежи
+    (user_id, service_id, start_dt, duration_cells, client_name, client_phone).
+    """
+    with joined_transaction(conn, DB_PATH) as conn:
+        cur = conn.executemany(
+            "INSERT INTO bookings(project_id,user_id,service_id,start_dt,duration_cells,client_name,client_phone) "
+            "VALUES(?,?,?,?,?,?,?)",
+            ((project_id, *item) for item in items)
+        )
+        return cur.rowcount
+
+@engine_backed
 def get_booking(booking_id):
     rows = safe_execute(
         "SELECT project_id,user_id,service_id,start_dt,duration_cells,client_name,client_phone,status "
@@ -307,6 +290,7 @@ def get_booking(booking_id):
         "status":         r[7]
     }
 
+@engine_backed
 def update_booking_status(booking_id, status):
     with transaction(DB_PATH) as conn:
         conn.execute(
@@ -314,11 +298,13 @@ def update_booking_status(booking_id, status):
             (status, booking_id)
         )
 
+@engine_backed
 def get_bookings_by_date(project_id, date_str, status="confirmed"):
     rows = safe_execute(
         "SELECT id,user_id,service_id,start_dt,duration_cells,client_name,client_phone "
-        "FROM bookings WHERE project_id=? AND status=? AND substr(start_dt,1,10)=? ORDER BY start_dt",
-        (project_id, status, date_str),
+        "FROM bookings WHERE project_id=? AND status=? "
+        f"AND start_ts>={_TS} AND start_ts<{_TS_NEXT_DAY} ORDER BY start_ts",
+        (project_id, status, date_str, date_str),
         DB_PATH
     )
     return [
@@ -334,11 +320,12 @@ def get_bookings_by_date(project_id, date_str, status="confirmed"):
         for r in rows
     ]
 
+@engine_backed
 def get_confirmed_future_bookings(project_id):
     now = datetime.utcnow().isoformat()
     rows = safe_execute(
         "SELECT id,start_dt,duration_cells,service_id,client_name "
-        "FROM bookings WHERE project_id=? AND status='confirmed' AND start_dt>?",
+        f"FROM bookings WHERE project_id=? AND status='confirmed' AND start_ts>{_TS}",
         (project_id, now),
         DB_PATH
     )
@@ -347,10 +334,11 @@ def get_confirmed_future_bookings(project_id):
         for r in rows
     ]
 
+@engine_backed
 def get_all_bookings(project_id):
     rows = safe_execute(
         "SELECT id,service_id,start_dt,client_name,status "
-        "FROM bookings WHERE project_id=?",
+        "FROM bookings WHERE project_id=? ORDER BY id",
         (project_id,),
         DB_PATH
     )
@@ -359,6 +347,7 @@ def get_all_bookings(project_id):
         for r in rows
     ]
 
+@engine_backed
 def add_work_interval(project_id, start_iso, end_iso):
     with transaction(DB_PATH) as conn:
         conn.execute(
@@ -366,29 +355,44 @@ def add_work_interval(project_id, start_iso, end_iso):
             (project_id, start_iso, end_iso)
         )
 
+@engine_backed
+def add_work_intervals_bulk(project_id, items, conn=None):
+    """Пакетная вставка окон работы. items — кортежи (start_iso, end_iso)."""
+    with joined_transaction(conn, DB_PATH) as conn:
+        cur = conn.executemany(
+            "INSERT INTO work_intervals(project_id,start_dt,end_dt) VALUES(?,?,?)",
+            ((project_id, *item) for item in items)
+        )
+        return cur.rowcount
+
+@engine_backed
 def get_work_intervals(project_id, days_ahead):
     now = datetime.utcnow()
     end = now + timedelta(days=days_ahead)
     rows = safe_execute(
         "SELECT id,start_dt,end_dt FROM work_intervals "
-        "WHERE project_id=? AND start_dt>=? AND start_dt<=? ORDER BY start_dt",
+        f"WHERE project_id=? AND start_ts>={_TS} AND start_ts<{_TS} ORDER BY start_ts",
         (project_id, now.isoformat(), end.isoformat()),
         DB_PATH
     )
     return [{"id": r[0], "start_dt": r[1], "end_dt": r[2]} for r in rows]
 
+@engine_backed
 def delete_work_interval(interval_id):
     with transaction(DB_PATH) as conn:
         conn.execute("DELETE FROM work_intervals WHERE id=?", (interval_id,))
 
+@engine_backed
 def add_work_exception(project_id, start_iso, end_iso, state):
     with transaction(DB_PATH) as conn:
         cur = conn.execute(
             "INSERT INTO work_exceptions(project_id,start_dt,end_dt,state) VALUES(?,?,?,?)",
             (project_id, start_iso, end_iso, state)
         )
-        return cur.lastrowid
+    exception_index.on_added(project_id, cur.lastrowid, start_iso, end_iso, state, DB_PATH)
+    return cur.lastrowid
 
+@engine_backed
 def get_planned_exceptions(project_id):
     rows = safe_execute(
         "SELECT id,start_dt FROM work_exceptions WHERE project_id=? AND state='planned'",
@@ -397,6 +401,26 @@ def get_planned_exceptions(project_id):
     )
     return [{"id": r[0], "start_dt": r[1]} for r in rows]
 
+@engine_backed
+def get_open_exceptions(project_id, db_path=None):
+    """Активные и запланированные исключения проекта: (id, start_dt, end_dt, state)."""
+    with read_transaction(db_path or DB_PATH) as conn:
+        return conn.execute(
+            "SELECT id,start_dt,end_dt,state FROM work_exceptions "
+            "WHERE project_id=? AND state IN ('active','planned')",
+            (project_id,)
+        ).fetchall()
+
+@engine_backed
+def get_exceptions_rev(project_id, db_path=None) -> int:
+    """Версия исключений проекта (work_exceptions_rev); 0 — правок ещё не было."""
+    with read_transaction(db_path or DB_PATH) as conn:
+        row = conn.execute(
+            "SELECT rev FROM work_exceptions_rev WHERE project_id=?", (project_id,)
+        ).fetchone()
+    return row[0] if row else 0
+
+@engine_backed
 def activate_planned_exception(exception_id):
     with transaction(DB_PATH) as conn:
         conn.execute(
@@ -406,18 +430,21 @@ def activate_planned_exception(exception_id):
         row = conn.execute(
             "SELECT start_dt,end_dt FROM work_exceptions WHERE id=?", (exception_id,)
         ).fetchone()
-        return row
+    exception_index.on_activated(exception_id, DB_PATH)
+    return row
 
+@engine_backed
 def cancel_bookings_in_interval(project_id, start_iso, end_iso):
+    """Отменяет подтверждённые брони, начинающиеся в [start_iso, end_iso)."""
     with transaction(DB_PATH) as conn:
         rows = conn.execute(
             "SELECT id,user_id,service_id,start_dt FROM bookings "
-            "WHERE project_id=? AND status='confirmed' AND start_dt>=? AND start_dt<=?",
+            f"WHERE project_id=? AND status='confirmed' AND start_ts>={_TS} AND start_ts<{_TS}",
             (project_id, start_iso, end_iso)
         ).fetchall()
         conn.execute(
             "UPDATE bookings SET status='cancelled_by_provider' "
-            "WHERE project_id=? AND status='confirmed' AND start_dt>=? AND start_dt<=?",
+            f"WHERE project_id=? AND status='confirmed' AND start_ts>={_TS} AND start_ts<{_TS}",
             (project_id, start_iso, end_iso)
         )
         return [
@@ -425,6 +452,7 @@ def cancel_bookings_in_interval(project_id, start_iso, end_iso):
             for r in rows
         ]
 
+@engine_backed
 def get_setting(key):
     rows = safe_execute(
         "SELECT value FROM settings WHERE key=?",
@@ -433,14 +461,16 @@ def get_setting(key):
     )
     return rows[0][0] if rows else None
 
-def set_setting(key, value):
-    with transaction(DB_PATH) as conn:
+@engine_backed
+def set_setting(key, value, conn=None):
+    with joined_transaction(conn, DB_PATH) as conn:
         conn.execute(
             "INSERT INTO settings(key,value) VALUES(?,?) "
             "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
             (key, value)
         )
 
+@engine_backed
 def ban_user(project_id, user_id):
     with transaction(DB_PATH) as conn:
         conn.execute(
@@ -448,6 +478,7 @@ def ban_user(project_id, user_id):
             (project_id, user_id)
         )
 
+@engine_backed
 def is_banned(project_id, user_id):
     rows = safe_execute(
         "SELECT 1 FROM banned_users WHERE project_id=? AND user_id=?",
@@ -456,32 +487,13 @@ def is_banned(project_id, user_id):
     )
     return bool(rows)
 
-def add_to_cart(project_id, user_id, product_id, quantity=1):
-    with transaction(DB_PATH) as conn:
-        cur = conn.execute(
-            "SELECT id,quantity FROM cart_items WHERE project_id=? AND user_id=? AND product_id=?",
-            (project_id, user_id, product_id)
-        )
-        row = cur.fetchone()
-        if row:
-            conn.execute(
-                "UPDATE cart_items SET quantity=? WHERE id=?",
-                (row[1] + quantity, row[0])
-            )
-        else:
-            conn.execute(
-                "INSERT INTO cart_items(project_id,user_id,product_id,quantity) VALUES(?,?,?,?)",
-                (project_id, user_id, product_id, quantity)
-            )
+_CART_SQL = (
+    "SELECT ci.id,ci.product_id,ci.quantity,p.name,p.full_desc,p.media_path "
+    "FROM cart_items ci JOIN products p ON p.id=ci.product_id "
+    "WHERE ci.project_id=? AND ci.user_id=? ORDER BY ci.id"
+)
 
-def get_cart_items(project_id, user_id):
-    rows = safe_execute(
-        "SELECT ci.id,ci.product_id,ci.quantity,p.name,p.full_desc,p.media_path "
-        "FROM cart_items ci JOIN products p ON p.id=ci.product_id "
-        "WHERE ci.project_id=? AND ci.user_id=? ORDER BY ci.id",
-        (project_id, user_id),
-        DB_PATH
-    )
+def _cart_from_rows(rows) -> list[dict]:
     return [
         {
           "cart_id":   r[0],
@@ -494,27 +506,64 @@ def get_cart_items(project_id, user_id):
         for r in rows
     ]
 
+@engine_backed
+def add_to_cart(project_id, user_id, product_id, quantity=1):
+    """
+    Кладёт товар в корзину одним UPSERT (уникальный индекс из миграции v6):
+    повторное нажатие увеличивает количество, а не теряется в гонке.
+    Возвращает корзину после изменения.
+    """
+    with transaction(DB_PATH) as conn:
+        conn.execute(
+            "INSERT INTO cart_items(project_id,user_id,product_id,quantity) VALUES(?,?,?,?) "
+            "ON CONFLICT(project_id,user_id,product_id) "
+            "DO UPDATE SET quantity=quantity+excluded.quantity",
+            (project_id, user_id, product_id, quantity)
+        )
+        return _cart_from_rows(conn.execute(_CART_SQL, (project_id, user_id)))
+
+@engine_backed
+def get_cart_items(project_id, user_id):
+    return _cart_from_rows(safe_execute(_CART_SQL, (project_id, user_id), DB_PATH))
+
+def _owner_cart(conn, owner) -> list[dict]:
+    """Корзина владельца позиции (строка RETURNING project_id,user_id) или []."""
+    return _cart_from_rows(conn.execute(_CART_SQL, owner)) if owner else []
+
+@engine_backed
 def update_cart_item(cart_id, new_quantity):
+    """Ставит количество (0 и меньше — удаляет позицию); возвращает корзину."""
     with transaction(DB_PATH) as conn:
         if new_quantity > 0:
-            conn.execute(
-                "UPDATE cart_items SET quantity=? WHERE id=?", (new_quantity, cart_id)
-            )
+            owner = conn.execute(
+                "UPDATE cart_items SET quantity=? WHERE id=? RETURNING project_id,user_id",
+                (new_quantity, cart_id)
+            ).fetchone()
         else:
-            conn.execute(
-                "DELETE FROM cart_items WHERE id=?", (cart_id,)
-            )
+            owner = conn.execute(
+                "DELETE FROM cart_items WHERE id=? RETURNING project_id,user_id", (cart_id,)
+            ).fetchone()
+        return _owner_cart(conn, owner)
 
+@engine_backed
 def delete_cart_item(cart_id):
+    """Удаляет позицию; возвращает корзину её владельца."""
     with transaction(DB_PATH) as conn:
-        conn.execute("DELETE FROM cart_items WHERE id=?", (cart_id,))
+        owner = conn.execute(
+            "DELETE FROM cart_items WHERE id=? RETURNING project_id,user_id", (cart_id,)
+        ).fetchone()
+        return _owner_cart(conn, owner)
 
+@engine_backed
 def clear_cart(project_id, user_id):
+    """Очищает корзину; возвращает её (пустую) для единообразия с остальными."""
     with transaction(DB_PATH) as conn:
         conn.execute(
             "DELETE FROM cart_items WHERE project_id=? AND user_id=?", (project_id, user_id)
         )
+        return []
 
+@engine_backed
 def get_faq_entries(project_id):
     rows = safe_execute(
         "SELECT id,question,answer,media_path FROM faq_entries WHERE project_id=? ORDER BY id",
@@ -526,6 +575,7 @@ def get_faq_entries(project_id):
         for r in rows
     ]
 
+@engine_backed
 def add_faq_entry(project_id, question, answer, media_path=""):
     with transaction(DB_PATH) as conn:
         cur = conn.execute(
@@ -534,8 +584,52 @@ def add_faq_entry(project_id, question, answer, media_path=""):
         )
         return cur.lastrowid
 
+@engine_backed
+def add_faq_entries_bulk(project_id, items, conn=None):
+    """Пакетная вставка FAQ. items — кортежи (question, answer, media_path)."""
+    with joined_transaction(conn, DB_PATH) as conn:
+        cur = conn.executemany(
+            "INSERT INTO faq_entries(project_id,question,answer,media_path) VALUES(?,?,?,?)",
+            ((project_id, *item) for item in items)
+        )
+        return cur.rowcount
+
+@engine_backed
+def add_helper_entries_bulk(project_id, items, conn=None):
+    """
+    Пакетная вставка «паст» helper-бота в БД конструктора.
+    items — кортежи (alias, content, media_path, admin_only).
+    """
+    with joined_transaction(conn, DB_PATH) as conn:
+        cur = conn.executemany(
+            "INSERT INTO helper_entries(project_id,alias,content,media_path,admin_only) VALUES(?,?,?,?,?)",
+            ((project_id, *item) for item in items)
+        )
+        return cur.rowcount
+
+@engine_backed
 def delete_faq_entry(project_id, entry_id):
     with transaction(DB_PATH) as conn:
         conn.execute(
             "DELETE FROM faq_entries WHERE project_id=? AND id=?", (project_id, entry_id)
         )
+
+# --- feedback- и moderator-боты: то, что пишет засев -------------------
+# SQL живёт в app/utils (эти модули уезжают в экспортируемых ботов),
+# здесь — точки входа для движков хранения.
+
+@engine_backed
+def block_users_bulk(project_id, user_ids, conn=None):
+    feedback.block_users_bulk(project_id, user_ids, conn=conn)
+
+@engine_backed
+def log_feedback_bulk(project_id, messages, conn=None):
+    return feedback.log_feedback_bulk(project_id, messages, conn=conn)
+
+@engine_backed
+def set_moderation_settings(project_id, values, conn=None):
+    moderation.set_settings(project_id, values, conn=conn)
+
+@engine_backed
+def whitelist_add_bulk(project_id, domains, conn=None):
+    moderation.whitelist_add_bulk(project_id, domains, conn=conn)
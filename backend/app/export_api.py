@@ -0,0 +1,124 @@
+# backend/app/export_api.py
+"""
+Эндпоинты экспорта ботов: синхронный ZIP потоком, фоновые задачи экспорта
+(одиночные и массовые), их статус и скачивание готового архива.
+Вынесены из main.py отдельным роутером, чтобы их можно было подключать
+и проверять без остального приложения.
+"""
+from fastapi import APIRouter, HTTPException, Body
+from fastapi.responses import FileResponse, StreamingResponse
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import quote
+
+from app.database      import get_projects
+from app.export_utils  import iter_export_files, stream_zip
+from app.export_cache  import export_cache_key, get_cached_export, cache_export
+from app.export_jobs   import ExportQueueFull, submit_export, submit_bulk_export, get_job
+
+BASE_DIR = Path(__file__).resolve().parent
+
+router = APIRouter()
+
+
+@router.get("/projects/{project_id}/export")
+def export_bot(project_id: int):
+    """
+    Генерирует исходники бота и отдаёт ZIP потоком (StreamingResponse):
+    файлы пишутся в архив по мере готовности, без временной папки на диске.
+    Повторный экспорт неизменённого проекта отдаётся из кэша exports/.
+    """
+    project = _get_exportable_project(project_id)
+    filename = f"{project['name']}.zip"
+
+    # проект не менялся — отдаём уже собранный архив из кэша
+    key = export_cache_key(project)
+    cached = get_cached_export(key)
+    if cached is not None:
+        return FileResponse(path=str(cached), filename=filename,
+                            media_type="application/zip")
+
+    return StreamingResponse(
+        cache_export(key, stream_zip(iter_export_files(project))),
+        media_type="application/zip",
+        headers={"Content-Disposition": _attachment(filename)},
+    )
+
+
+@router.post("/projects/{project_id}/exports", status_code=202)
+def start_export(project_id: int):
+    """
+    Ставит экспорт в фоновую очередь и сразу возвращает job_id.
+    Прогресс — GET /exports/{job_id}, архив — GET /exports/{job_id}/download.
+    """
+    project = _get_exportable_project(project_id)
+    try:
+        job = submit_export(project)
+    except ExportQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"status": "queued", "job_id": job.id}
+
+@router.get("/exports/{job_id}")
+def export_status(job_id: str):
+    """Текущий этап, записанные байты и ETA задачи экспорта."""
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job.to_dict()
+
+@router.get("/exports/{job_id}/download")
+def export_download(job_id: str):
+    """Отдаёт архив завершённой задачи экспорта."""
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    if job.stage != "done":
+        raise HTTPException(status_code=409, detail=f"Экспорт не готов: {job.stage}")
+    if job.path is None:
+        raise HTTPException(status_code=409,
+                            detail="У массового экспорта нет общего архива, см. GET /exports/{job_id}")
+    # get_cached_export обновляет mtime — архив не вытеснят, пока его отдают
+    path = get_cached_export(job.path.stem)
+    if path is None:
+        raise HTTPException(status_code=410, detail="Архив вытеснен из кэша, повторите экспорт")
+    return FileResponse(path=str(path), filename=f"{job.project['name']}.zip",
+                        media_type="application/zip")
+
+
+@router.post("/exports/bulk", status_code=202)
+def bulk_export(
+    project_ids: Optional[List[int]] = Body(None),
+    template_type: Optional[str] = Body(None),
+    workers: Optional[int] = Body(None),
+):
+    """
+    Массовый экспорт: список project_ids или все проекты template_type.
+    Ставится фоновой задачей и сразу возвращает job_id; прогресс и итог
+    (тайминги и ошибки по каждому проекту) — GET /exports/{job_id}.
+    """
+    if (project_ids is None) == (template_type is None):
+        raise HTTPException(status_code=400,
+                            detail="Укажите либо project_ids, либо template_type")
+    try:
+        job = submit_bulk_export(project_ids, template_type, workers)
+    except ExportQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"status": "queued", "job_id": job.id}
+
+
+def _get_exportable_project(project_id: int) -> dict:
+    project = get_projects(project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Проект не найден")
+    template_path = BASE_DIR / "templates" / project["template_type"]
+    if not template_path.exists():
+        raise HTTPException(status_code=404, detail="Шаблон не найден")
+    return project
+
+
+def _attachment(filename: str) -> str:
+    """Content-Disposition с поддержкой кириллицы (как у FileResponse)."""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
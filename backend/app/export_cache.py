@@ -0,0 +1,161 @@
+# app/export_cache.py
+"""
+Контент-адресуемый кэш готовых ZIP-экспортов.
+Ключ = sha256 от строки проекта, исходников шаблона и BOT_UTILS,
+манифеста медиа и отпечатка проектных строк БД. Если ничего не менялось,
+повторный экспорт отдаёт уже собранный архив из exports/<ключ>.zip.
+Каталог exports/ ограничен по размеру: лишнее вытесняется по LRU (mtime).
+"""
+
+import hashlib
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Iterator
+
+from app.export_utils import (
+    BASE_DIR, BOT_UTILS, ZIP_WORKERS, iter_export_files, project_db_fingerprint, stream_zip,
+)
+
+EXPORTS_DIR = BASE_DIR / "exports"
+# Верхняя граница размера exports/ (по умолчанию 1 ГБ)
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+# Архив, которого касались (mtime) позже этого, не вытесняется: его как раз
+# отдают — FileResponse открывает файл уже после возврата из обработчика
+EVICT_GRACE_S = 300
+# Недописанные .part старше этого — остатки упавших/прерванных потоков
+PART_MAX_AGE_S = 3600
+
+
+def _hash_file(hasher, path: Path) -> None:
+    hasher.update(f"\0{path.as_posix()}\0".encode("utf-8"))
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            hasher.update(chunk)
+
+
+def export_cache_key(project: dict) -> str:
+    """Считает ключ кэша для экспорта проекта."""
+    h = hashlib.sha256()
+    project_id = project["id"]
+    template_type = project["template_type"]
+
+    # 1) строка проекта
+    h.update(json.dumps(project, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+
+    # 2) шаблон, нужные utils и сам генератор экспорта
+    template_dir = BASE_DIR / "templates" / template_type
+    for path in sorted(p for p in template_dir.rglob("*") if p.is_file()):
+        _hash_file(h, path)
+    for rel_path in BOT_UTILS.get(template_type, []):
+        _hash_file(h, BASE_DIR / rel_path)
+    _hash_file(h, BASE_DIR / "export_utils.py")
+
+    # 3) манифест медиа: имя, размер, mtime
+    media_dir = BASE_DIR / "media" / str(project_id)
+    if media_dir.exists():
+        for path in sorted(p for p in media_dir.rglob("*") if p.is_file()):
+            st = path.stat()
+            h.update(f"\0{path.relative_to(media_dir).as_posix()}\0"
+                     f"{st.st_size}\0{st.st_mtime_ns}".encode("utf-8"))
+
+    # 4) проектные строки БД
+    project_db_fingerprint(project_id, h, template_type)
+    return h.hexdigest()
+
+
+def get_cached_export(key: str) -> Path | None:
+    """Возвращает путь к готовому архиву (и отмечает его как свежий) или None."""
+    path = EXPORTS_DIR / f"{key}.zip"
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def cache_export(key: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """
+    Пропускает поток ZIP-байт насквозь, параллельно записывая его во
+    временный файл. Если поток дошёл до конца — файл атомарно становится
+    exports/<ключ>.zip; если прервался — временный файл удаляется.
+    """
+    EXPORTS_DIR.mkdir(parents=True, exist_ok=True)
+    final = EXPORTS_DIR / f"{key}.zip"
+    part = EXPORTS_DIR / f"{key}.zip.{uuid.uuid4().hex}.part"
+    done = False
+    try:
+        with open(part, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+        os.replace(part, final)
+        done = True
+    finally:
+        if not done:
+            part.unlink(missing_ok=True)
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+    evict_exports()
+
+
+def ensure_export(
+    project: dict,
+    on_stage: Callable[[str, int], None] | None = None,
+    on_progress: Callable[[int], None] | None = None,
+    on_chunk: Callable[[bytes], None] | None = None,
+    zip_workers: int = ZIP_WORKERS,
+) -> tuple[Path, bool]:
+    """
+    Возвращает (путь к архиву проекта, взят ли он из кэша).
+    При промахе архив собирается целиком и кладётся в кэш;
+    zip_workers — потоков сжатия (см. stream_zip).
+    """
+    key = export_cache_key(project)
+    cached = get_cached_export(key)
+    if cached is not None:
+        return cached, True
+    chunks = stream_zip(iter_export_files(project, on_stage=on_stage),
+                        on_progress=on_progress, workers=zip_workers)
+    for chunk in cache_export(key, chunks):
+        if on_chunk is not None:
+            on_chunk(chunk)
+    return EXPORTS_DIR / f"{key}.zip", False
+
+
+def evict_exports(max_bytes: int = EXPORT_CACHE_MAX_BYTES) -> int:
+    """
+    Чистит exports/:
+    1) удаляет осиротевшие *.part старше PART_MAX_AGE_S
+    2) вытесняет самые давно использованные архивы, пока суммарный размер
+       не уложится в max_bytes; тронутые за последние EVICT_GRACE_S не трогает
+    Возвращает число удалённых файлов.
+    """
+    now = time.time()
+    removed = 0
+    for path in EXPORTS_DIR.glob("*.part"):
+        try:
+            if now - path.stat().st_mtime > PART_MAX_AGE_S:
+                path.unlink(missing_ok=True)
+                removed += 1
+        except FileNotFoundError:
+            continue
+
+    entries = []
+    for path in EXPORTS_DIR.glob("*.zip"):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for mtime, size, path in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes or now - mtime < EVICT_GRACE_S:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    return removed
@@ -0,0 +1,193 @@
+# app/export_jobs.py
+"""
+Фоновые задачи экспорта: POST ставит проект в очередь и сразу отдаёт
+job_id, ограниченный пул потоков прогоняет конвейер
+(render → media → utils → database), а клиент опрашивает статус
+(этап, записанные байты, ETA) и скачивает готовый архив.
+Массовый экспорт (bulk_export) — такая же задача: статус по тому же
+GET /exports/{job_id}, прогресс — сколько проектов из скольких готово.
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from app.bulk_export import export_many
+from app.export_cache import ensure_export
+
+# Сколько экспортов идёт одновременно и сколько может ждать в очереди
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", 2))
+EXPORT_QUEUE_LIMIT = int(os.getenv("EXPORT_QUEUE_LIMIT", 32))
+# Сколько завершённых задач помнить для опроса статуса
+EXPORT_JOBS_KEEP = 200
+
+_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+_jobs: dict[str, "ExportJob"] = {}
+_lock = threading.Lock()
+
+
+class ExportQueueFull(RuntimeError):
+    """Очередь экспорта переполнена — клиенту стоит повторить позже."""
+
+
+class ExportJob:
+    """Состояние одной задачи экспорта."""
+
+    def __init__(self, project: dict):
+        self.id = uuid.uuid4().hex
+        self.project = project
+        self.stage = "queued"
+        self.bytes_total = 0       # оценка объёма исходных файлов
+        self.bytes_read = 0        # сколько из них уже упаковано
+        self.bytes_written = 0     # размер архива на текущий момент
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.error: str | None = None
+        self.path: Path | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.stage in ("done", "failed")
+
+    def eta_seconds(self) -> float | None:
+        if self.stage == "done":
+            return 0.0
+        if self.started_at is None or not self.bytes_read or self.finished:
+            return None
+        elapsed = time.time() - self.started_at
+        left = max(self.bytes_total - self.bytes_read, 0)
+        return round(elapsed * left / self.bytes_read, 1)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id":        self.id,
+            "project_id":    self.project["id"],
+            "stage":         self.stage,
+            "bytes_written": self.bytes_written,
+            "eta_seconds":   self.eta_seconds(),
+            "error":         self.error,
+        }
+
+    # --- колбэки конвейера ------------------------------------------
+    def _on_stage(self, stage: str, nbytes: int):
+        self.stage = stage
+        self.bytes_total += nbytes
+
+    def _on_progress(self, nbytes: int):
+        self.bytes_read += nbytes
+
+    def _on_chunk(self, chunk: bytes):
+        self.bytes_written += len(chunk)
+
+    def run(self):
+        self.started_at = time.time()
+        try:
+            path, from_cache = ensure_export(
+                self.project,
+                on_stage=self._on_stage,
+                on_progress=self._on_progress,
+                on_chunk=self._on_chunk,
+            )
+            if from_cache:
+                self.bytes_written = path.stat().st_size
+            self.path = path
+            self.stage = "done"
+        except Exception as e:
+            self.error = str(e)
+            self.stage = "failed"
+        finally:
+            self.finished_at = time.time()
+
+
+class BulkExportJob:
+    """Массовый экспорт: список проектов или все проекты шаблона."""
+
+    path = None                # общего архива нет — у каждого проекта свой
+
+    def __init__(self, project_ids: list[int] | None, template_type: str | None,
+                 workers: int | None):
+        self.id = uuid.uuid4().hex
+        self.project_ids = project_ids
+        self.template_type = template_type
+        self.workers = workers
+        self.stage = "queued"
+        self.total: int | None = None
+        self.results: list[dict] = []
+        self.report: dict | None = None
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.error: str | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.stage in ("done", "failed")
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id":    self.id,
+            "kind":      "bulk",
+            "stage":     self.stage,
+            "total":     self.total,
+            "completed": len(self.results),
+            "failed":    sum(1 for r in self.results if r["status"] != "ok"),
+            "error":     self.error,
+            "report":    self.report,
+        }
+
+    def _on_start(self, total: int, workers: int):
+        self.total = total
+        self.workers = workers
+
+    def run(self):
+        self.started_at = time.time()
+        self.stage = "running"
+        try:
+            self.report = export_many(
+                self.project_ids, self.template_type, self.workers,
+                on_start=self._on_start, on_result=self.results.append,
+            )
+            self.stage = "done"
+        except Exception as e:
+            self.error = str(e)
+            self.stage = "failed"
+        finally:
+            self.finished_at = time.time()
+
+
+def _prune_finished():
+    finished = sorted((j for j in _jobs.values() if j.finished),
+                      key=lambda j: j.finished_at)
+    for job in finished[:max(len(finished) - EXPORT_JOBS_KEEP, 0)]:
+        del _jobs[job.id]
+
+
+def _submit(job):
+    with _lock:
+        queued = sum(1 for j in _jobs.values() if j.stage == "queued")
+        if queued >= EXPORT_QUEUE_LIMIT:
+            raise ExportQueueFull("Очередь экспорта переполнена")
+        _prune_finished()
+        _jobs[job.id] = job
+    _executor.submit(job.run)
+    return job
+
+
+def submit_export(project: dict) -> ExportJob:
+    """Ставит экспорт проекта в очередь и возвращает задачу."""
+    return _submit(ExportJob(project))
+
+
+def submit_bulk_export(project_ids: list[int] | None = None,
+                       template_type: str | None = None,
+                       workers: int | None = None) -> BulkExportJob:
+    """Ставит массовый экспорт в очередь и возвращает задачу."""
+    return _submit(BulkExportJob(project_ids, template_type, workers))
+
+
+def get_job(job_id: str) -> ExportJob | None:
+    return _jobs.get(job_id)
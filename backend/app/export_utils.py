@@ -1,10 +1,122 @@
 # backend/app/export_utils.py
 
+import json
 import sqlite3
+import struct
 import tempfile
 import os
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from app.database import init_db, DB_PATH
+from typing import Callable, Iterable, Iterator
+from zipfile import ZIP_DEFLATED, ZIP_STORED
+from app.database import DB_PATH
+from app.migrations import migrate
+from app.template_registry import get_environment, list_template_names
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# Размер блока, которым файлы перекладываются в ZIP-поток
+CHUNK_SIZE = 64 * 1024
+
+# --- политика сжатия ---------------------------------------------------
+# Уже сжатые форматы кладём как есть (STORED), остальное — deflate
+STORED_EXTENSIONS = {
+    ".jpg", ".jpeg", ".png", ".gif", ".webp",
+    ".mp4", ".mov", ".webm", ".mp3", ".ogg", ".m4a",
+    ".zip", ".gz", ".xlsx",
+}
+ZIP_COMPRESSLEVEL = 6
+# Записи от этого размера сжимаются заранее в пуле потоков (zlib отпускает GIL)
+PARALLEL_MIN_SIZE = 256 * 1024
+ZIP_WORKERS = min(4, os.cpu_count() or 1)
+# Размеры и смещения от этого значения не влезают в 32-битные поля ZIP —
+# такие записи и архив получают ZIP64-записи
+ZIP64_LIMIT = 0xFFFFFFFF
+
+# Манифест дубликатов медиа внутри media/<project_id>/ архива:
+# {"имя-дубликат": "имя-оригинал"}; run.py бота восстанавливает их при старте
+MEDIA_ALIASES_NAME = ".aliases.json"
+
+# --- какие utils нужны какому боту ---------------------------------
+BOT_UTILS = {
+    "order_bot": [
+        "utils/order_db.py",
+        "utils/collage.py",
+        "utils/media.py",
+    ],
+    "faq_bot": [
+        "utils/faq_db.py",
+        "utils/media.py",
+    ],
+    "helper_bot": [
+        "utils/helper_db.py",
+        "utils/media.py",
+    ],
+    "feedback_bot": [
+        "utils/feedback_db.py",
+    ],
+    "moderator_bot": [
+        "utils/moderator_db.py",
+    ],
+    "quiz_bot": [                     # у квиза БД нет
+        "utils/media.py",             # только скачивание картинок для вопросов
+    ],
+    "smart_booking_crm": [
+        "utils/booking_db.py",
+        "utils/dp.py",                # DB_PATH и запросы шаблона
+        "utils/inline_calendar.py",
+        "utils/media.py",
+        "utils/outbox.py",
+        "utils/scheduled_jobs.py",
+        "utils/slot_grid.py",         # поиск свободных слотов (utils/dp.py)
+    ],
+}
+
+# --- имя файла БД внутри utils/ для каждого шаблона ------------------
+DB_NAMES = {
+    "order_bot": "order_bot.db",
+    "faq_bot": "faq_bot.db",
+    "helper_bot": "helper_bot.db",
+    "moderator_bot": "moderator_bot.db",
+    "feedback_bot": "feedback_bot.db",
+    "smart_booking_crm": "database.db",   # dp.DB_PATH
+}
+DEFAULT_DB_NAME = "database.db"   # fallback для старых шаблонов
+
+BOT_REQUIREMENTS = ["aiogram", "python-dotenv", "Pillow", "openpyxl", "apscheduler", "aiofiles"]
+
+START_BOT_BAT = r'''@echo off
+pushd %~dp0
+pip install -r requirements.txt
+start "" /B python run.py > bot.log 2>&1
+for /f "tokens=2" %%a in ('
+    tasklist /FI "IMAGENAME eq python.exe" /FO LIST /V 
+    ^| findstr /R /C:"Window Title: run.py"
+') do set BOT_PID=%%a
+echo %BOT_PID% > bot.pid
+echo Bot started. PID=%BOT_PID%, logs→bot.log
+cmd /k rem
+'''
+
+STOP_BOT_BAT = r'''@echo off
+if not exist bot.pid (
+  echo bot.pid not found. Bot may not be running.
+  pause
+  exit /b
+)
+set /p BOT_PID=<bot.pid
+taskkill /PID %BOT_PID% /F >nul 2>&1
+if errorlevel 1 (
+  echo Could not find process %BOT_PID%. It may have already exited.
+) else (
+  echo Process %BOT_PID% stopped.
+)
+del bot.pid
+pause
+'''
 
 PROJECT_TABLES = [
     "projects", "products", "faq_entries", "cart_items", "bookings",
@@ -13,60 +125,525 @@ PROJECT_TABLES = [
     "quiz_questions"
 ]
 
-def build_single_project_db(project_id: int) -> Path:
-    # 1) создаём пустой файл и закрываем дескриптор
+# --- какие таблицы конструктора нужны какому боту --------------------
+TEMPLATE_TABLES = {
+    "order_bot":         ["projects", "products", "cart_items", "banned_users"],
+    "faq_bot":           ["projects", "faq_entries"],
+    "helper_bot":        ["projects", "helper_entries"],
+    "feedback_bot":      ["projects", "feedback_messages", "feedback_blocked"],
+    "moderator_bot":     ["projects", "moderation_settings", "link_whitelist"],
+    "quiz_bot":          ["projects"],
+    "smart_booking_crm": ["projects", "products", "bookings", "work_intervals",
+                          "work_exceptions", "banned_users"],
+}
+
+
+def project_tables(template_type: str | None) -> list[str]:
+    """Таблицы, которые попадают в БД бота (fallback — PROJECT_TABLES)."""
+    return TEMPLATE_TABLES.get(template_type, PROJECT_TABLES)
+
+
+def _project_filter(conn: sqlite3.Connection, schema: str, tbl: str) -> str | None:
+    """Условие отбора строк проекта или None, если таблица не проектная."""
+    cols = [r[1] for r in conn.execute(f"PRAGMA {schema}.table_info({tbl})")]
+    if "project_id" in cols:
+        return "project_id=?"
+    if tbl == "projects" and cols:
+        return "id=?"
+    return None
+
+
+def build_single_project_db(project_id: int, template_type: str | None = None) -> Path:
+    """
+    Собирает отдельную БД проекта целиком внутри SQLite:
+    ATTACH основной БД → CREATE по её же схеме → INSERT … SELECT с фильтром
+    по project_id → миграции (индексы, user_version) → VACUUM INTO
+    компактный файл. Строки через Python не идут.
+    Возвращает путь к временному файлу (удаляет вызывающий).
+    """
+    # 1) пустой файл-приёмник для VACUUM INTO
     tmp_fd, tmp_path_str = tempfile.mkstemp(suffix=".db")
     os.close(tmp_fd)
 
-    # 2) инициализируем в нём схему
-    init_db(Path(tmp_path_str))
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    try:
+        conn.execute("ATTACH DATABASE ? AS src", (str(DB_PATH),))
+        if template_type is None:
+            row = conn.execute(
+                "SELECT template_type FROM src.projects WHERE id=?", (project_id,)
+            ).fetchone()
+            template_type = row[0] if row else None
+
+        conn.execute("BEGIN")
+        # 2) глобальные настройки + таблицы шаблона
+        copied = set()
+        for tbl in ["settings", *project_tables(template_type)]:
+            ddl = conn.execute(
+                "SELECT sql FROM src.sqlite_master WHERE type='table' AND name=?",
+                (tbl,)
+            ).fetchone()
+            if ddl is None:
+                continue          # таблицы нет в БД конструктора
+            conn.execute(ddl[0])
+            copied.add(tbl)
+
+            # 3) данные: settings целиком, остальное — только строки проекта
+            if tbl == "settings":
+                conn.execute("INSERT INTO main.settings SELECT * FROM src.settings")
+                continue
+            where = _project_filter(conn, "src", tbl)
+            if where is not None:
+                # table_info не показывает генерируемые колонки — их не вставляем
+                cols = ",".join(r[1] for r in conn.execute(f"PRAGMA src.table_info({tbl})"))
+                conn.execute(
+                    f"INSERT INTO main.{tbl}({cols}) SELECT {cols} FROM src.{tbl} WHERE {where}",
+                    (project_id,)
+                )
+        conn.execute("COMMIT")
+        conn.execute("DETACH DATABASE src")
+
+        # 4) индексы и user_version — теми же миграциями, что и у конструктора,
+        #    уже по загруженным данным
+        migrate(conn, tables=copied)
+
+        # 5) компактный файл без свободных страниц
+        conn.execute("VACUUM INTO ?", (tmp_path_str,))
+    except Exception:
+        Path(tmp_path_str).unlink(missing_ok=True)
+        raise
+    finally:
+        conn.close()
 
-    # 3) копируем данные
+    return Path(tmp_path_str)
+
+
+def project_db_fingerprint(project_id: int, hasher,
+                           template_type: str | None = None) -> None:
+    """
+    Подмешивает в hasher все строки, которые попадут в БД проекта
+    (глобальные settings + таблицы шаблона).
+    Строки читаются курсором по одной, список целиком не собирается.
+    """
     src = sqlite3.connect(DB_PATH)
-    dst = sqlite3.connect(tmp_path_str)
-    sc, dc = src.cursor(), dst.cursor()
-
-    # 3.1 глобальные настройки
-
-    for key, val in sc.execute("SELECT key,value FROM settings"):
-        dc.execute(
-            "INSERT OR REPLACE INTO settings(key,value) VALUES(?,?)",
-            (key, val)
-        )
-
-    # 3.2 проектно-специфичные таблицы
-    # export_utils.py  (фрагмент цикла)
-    for tbl in PROJECT_TABLES:
-        cols = [r[1] for r in sc.execute(f"PRAGMA table_info({tbl})")]
-        collist = ",".join(cols)
-
-        # --- выбираем правильное поле фильтрации ---------------
-        if "project_id" in cols:
-            rows = sc.execute(
-                f"SELECT {collist} FROM {tbl} WHERE project_id=?",
-                (project_id,)
-            ).fetchall()
-        elif tbl == "projects":
-            rows = sc.execute(
-                f"SELECT {collist} FROM projects WHERE id=?",
-                (project_id,)
-            ).fetchall()
+    try:
+        for row in src.execute("SELECT key,value FROM settings ORDER BY key"):
+            hasher.update(repr(row).encode("utf-8"))
+        for tbl in project_tables(template_type):
+            where = _project_filter(src, "main", tbl)
+            if where is None:
+                continue
+            hasher.update(f"\0{tbl}\0".encode("utf-8"))
+            for row in src.execute(
+                f"SELECT * FROM {tbl} WHERE {where} ORDER BY rowid", (project_id,)
+            ):
+                hasher.update(repr(row).encode("utf-8"))
+    finally:
+        src.close()
+
+
+_RESTORE_MEDIA_ALIASES = f'''
+def restore_media_aliases():
+    """Восстанавливает дубликаты медиа по media/*/{MEDIA_ALIASES_NAME}."""
+    media_root = Path(__file__).resolve().parent / "media"
+    for manifest in media_root.glob("*/{MEDIA_ALIASES_NAME}"):
+        aliases = json.loads(manifest.read_text(encoding="utf-8"))
+        for alias, original in aliases.items():
+            dst, src = manifest.parent / alias, manifest.parent / original
+            if dst.exists():
+                continue
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(src, dst)
+            except OSError:
+                shutil.copy2(src, dst)
+
+restore_media_aliases()
+'''
+
+
+def _render_run_py(template_type: str, media_aliases: bool = False) -> str:
+    """
+    run.py — единый entry-point для всех шаблонов.
+    media_aliases=True — в архиве есть манифест дубликатов медиа,
+    и run.py перед запуском бота раскладывает их по местам.
+    """
+    restore = []
+    if media_aliases:
+        restore = [
+            "import json",
+            "import os",
+            "import shutil",
+            "from pathlib import Path",
+            _RESTORE_MEDIA_ALIASES,
+        ]
+    return "\n".join([
+        "#!/usr/bin/env python3",
+        "import logging",
+        "import asyncio",
+        "from dotenv import load_dotenv",
+        *restore,
+        "",
+        f"from {template_type} import bot, dp, setup_bot_commands",
+        "try:",
+        "    # фоновые задачи шаблона (напоминания и т. п.) — в цикле событий бота",
+        f"    from {template_type} import start_background",
+        "except ImportError:",
+        "    start_background = None",
+        "",
+        "# 1) Логирование — формат даты через datefmt",
+        'logging.basicConfig(',
+        '    level=logging.INFO,',
+        '    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",',
+        '    datefmt="%Y-%m-%d %H:%M:%S"',
+        ')',
+        'logging.getLogger("aiogram").setLevel(logging.DEBUG)',
+        "",
+        "async def main():",
+        "    load_dotenv()",
+        "    await setup_bot_commands(bot)",
+        "    if start_background is not None:",
+        "        start_background()",
+        "    await dp.start_polling(bot, skip_updates=True)",
+        "",
+        "if __name__ == '__main__':",
+        "    asyncio.run(main())",
+    ])
+
+
+def collect_media(project_id: int) -> tuple[list[tuple[str, Path]], dict[str, str]]:
+    """
+    Файлы media/<project_id>/ для экспорта: ([(относительное имя, путь)], алиасы).
+    Имена, ссылающиеся на один и тот же блоб (одна inode), попадают в список
+    один раз, остальные — в алиасы {"дубликат": "оригинал"}.
+    """
+    media_src = BASE_DIR / "media" / str(project_id)
+    unique: list[tuple[str, Path]] = []
+    aliases: dict[str, str] = {}
+    if not media_src.exists():
+        return unique, aliases
+    seen: dict[tuple[int, int], str] = {}
+    for path in sorted(p for p in media_src.rglob("*") if p.is_file()):
+        rel = path.relative_to(media_src).as_posix()
+        st = path.stat()
+        original = seen.get((st.st_dev, st.st_ino))
+        if original is not None:
+            aliases[rel] = original
         else:
-            # таблица глобальная или не привязана к проекту
-            rows = []
-        # --------------------------------------------------------
+            seen[(st.st_dev, st.st_ino)] = rel
+            unique.append((rel, path))
+    return unique, aliases
 
-        if not rows:
-            continue
 
-        placeholders = ",".join("?" * len(cols))
-        dc.executemany(
-            f"INSERT INTO {tbl}({collist}) VALUES ({placeholders})",
-            rows
-        )
+def iter_export_files(
+    project: dict,
+    on_stage: Callable[[str, int], None] | None = None,
+) -> Iterator[tuple[str, bytes | Path]]:
+    """
+    Отдаёт файлы экспорта по мере их готовности: (имя в архиве, данные).
+    Данные — либо bytes (сгенерированный файл), либо Path (файл на диске,
+    который копируется в архив блоками без промежуточной папки).
+    on_stage(stage, nbytes) вызывается при переходе к очередному этапу
+    («render», «media», «utils», «database»); nbytes — сколько байт
+    исходных файлов этот этап добавит в архив.
+    """
+    project_id = project["id"]
+    template_type = project["template_type"]
+    if on_stage is None:
+        on_stage = lambda stage, nbytes: None
 
-    dst.commit()
-    src.close()
-    dst.close()
+    # 1) Рендерим все *.j2 → *.py (шаблоны уже скомпилированы в реестре)
+    on_stage("render", 0)
+    env = get_environment(template_type)
+    jinja_ctx = {
+        "project_id": project_id,
+        "admin_chat_id": project["content"].get("admin_chat_id", 0),
+        "project": project,
+    }
+    for name in list_template_names(template_type):
+        rendered = env.get_template(name).render(**jinja_ctx)
+        yield Path(name).stem, rendered.encode("utf-8")
 
-    return Path(tmp_path_str)
+    # 2) .env
+    yield ".env", f"TOKEN={project['token']}\n".encode("utf-8")
+
+    # 3) requirements.txt
+    yield "requirements.txt", "\n".join(BOT_REQUIREMENTS).encode("utf-8")
+
+    # 4) README.md
+    yield "README.md", (
+        f"# {project['name']}\n\n"
+        f"{project.get('description','')}\n\n"
+        "## Как запустить бота:\n"
+        "```bash\n"
+        "pip install -r requirements.txt\n"
+        "python run.py\n"
+        "```\n"
+    ).encode("utf-8")
+
+    # 5) run.py
+    media_files, media_aliases = collect_media(project_id)
+    yield "run.py", _render_run_py(template_type, bool(media_aliases)).encode("utf-8")
+
+    # 6) Медиа — прямо из media/<project_id>/, без copytree; каждый блоб
+    #    один раз, дубликаты — записями в манифесте
+    on_stage("media", sum(path.stat().st_size for _, path in media_files))
+    for rel, path in media_files:
+        yield f"media/{project_id}/{rel}", path
+    if media_aliases:
+        yield (f"media/{project_id}/{MEDIA_ALIASES_NAME}",
+               json.dumps(media_aliases, ensure_ascii=False, indent=2).encode("utf-8"))
+
+    # 7) Windows-скрипты
+    yield "start_bot.bat", START_BOT_BAT.encode("utf-8")
+    yield "stop_bot.bat", STOP_BOT_BAT.encode("utf-8")
+
+    # 8) Утилиты конструктора — только нужные файлы
+    utils_files = BOT_UTILS.get(template_type, [])
+    on_stage("utils", sum((BASE_DIR / rel).stat().st_size for rel in utils_files))
+    for rel_path in utils_files:
+        yield rel_path, BASE_DIR / rel_path
+
+    # 9) Отдельная БД только для этого проекта; временный файл сразу
+    #    удаляем, в архив уходит его содержимое
+    tmp_db = build_single_project_db(project_id, template_type)
+    try:
+        db_bytes = tmp_db.read_bytes()
+    finally:
+        tmp_db.unlink(missing_ok=True)
+    on_stage("database", len(db_bytes))
+    yield f"utils/{DB_NAMES.get(template_type, DEFAULT_DB_NAME)}", db_bytes
+
+
+def compression_for(arcname: str) -> int:
+    """ZIP_STORED для уже сжатых медиа, ZIP_DEFLATED для текста, кода и .db."""
+    return ZIP_STORED if Path(arcname).suffix.lower() in STORED_EXTENSIONS else ZIP_DEFLATED
+
+
+class _ZipSink:
+    """
+    Приёмник ZIP-байт: всё записанное копится в памяти,
+    пока генератор stream_zip не заберёт очередную порцию.
+    """
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+class _ZipStreamWriter:
+    """
+    Минимальный потоковый ZIP-писатель: локальный заголовок → данные →
+    data descriptor, в конце — центральный каталог. В отличие от ZipFile
+    умеет дописать заранее сжатые данные (нужно для параллельного сжатия).
+    Размеры записи неизвестны до её конца, поэтому ZIP64 для записи
+    решается в start() по верхней оценке размера (zip64=True); смещения
+    и конец каталога переходят на ZIP64 сами, когда перерастут ZIP64_LIMIT.
+    """
+
+    # бит 3 — размеры/CRC в data descriptor, бит 11 — имена в UTF-8
+    FLAGS = 0x0008 | 0x0800
+
+    def __init__(self, sink: _ZipSink):
+        self._sink = sink
+        self._offset = 0
+        self._central: list[bytes] = []
+        self._entry = None
+
+    @staticmethod
+    def needs_zip64(size: int, method: int) -> bool:
+        """Может ли запись из size байт (после сжатия method) перерасти 32 бита."""
+        # верхняя граница deflate (как deflateBound в zlib) с запасом
+        bound = size if method == ZIP_STORED else size + (size >> 8) + 64
+        return bound >= ZIP64_LIMIT
+
+    def _put(self, data: bytes):
+        self._sink.write(data)
+        self._offset += len(data)
+
+    @staticmethod
+    def _dos_datetime(ts: float) -> tuple[int, int]:
+        t = time.localtime(ts)
+        year = max(t.tm_year, 1980)
+        date = (year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday
+        dtime = t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2
+        return date, dtime
+
+    def start(self, arcname: str, method: int, mtime: float, mode: int,
+              zip64: bool = False):
+        name = arcname.encode("utf-8")
+        date, dtime = self._dos_datetime(mtime)
+        self._entry = [name, method, date, dtime, mode, self._offset, 0, zip64]
+        if zip64:
+            # размеры — в ZIP64 extra (заполнит data descriptor), в полях 0xFFFFFFFF
+            extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0)
+            header = struct.pack("<IHHHHHIIIHH", 0x04034B50, 45, self.FLAGS, method,
+                                 dtime, date, 0, 0xFFFFFFFF, 0xFFFFFFFF, len(name), len(extra))
+            self._put(header + name + extra)
+        else:
+            self._put(struct.pack("<IHHHHHIIIHH", 0x04034B50, 20, self.FLAGS,
+                                  method, dtime, date, 0, 0, 0, len(name), 0) + name)
+
+    def write(self, data: bytes):
+        if data:
+            self._put(data)
+            self._entry[6] += len(data)
+
+    def finish(self, crc: int, size: int):
+        name, method, date, dtime, mode, offset, csize, zip64 = self._entry
+        if zip64:
+            self._put(struct.pack("<IIQQ", 0x08074B50, crc, csize, size))
+        elif max(size, csize) >= ZIP64_LIMIT:
+            # оценка в start() не сработала (файл вырос во время экспорта) —
+            # заголовок уже отдан, исправить запись нельзя
+            raise ValueError(f"{name.decode()}: запись выросла больше 4 ГБ во время упаковки")
+        else:
+            self._put(struct.pack("<IIII", 0x08074B50, crc, csize, size))
+
+        # ZIP64 extra центрального каталога: только переполненные поля, в этом порядке
+        values = []
+        if zip64:
+            values += [size, csize]
+            size = csize = 0xFFFFFFFF
+        if offset >= ZIP64_LIMIT:
+            values.append(offset)
+            offset = 0xFFFFFFFF
+        extra = struct.pack(f"<HH{len(values)}Q", 0x0001, 8 * len(values), *values) if values else b""
+        version = 45 if values else 20
+        self._central.append(struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | version, version, self.FLAGS,
+            method, dtime, date, crc, csize, size, len(name), len(extra), 0, 0, 0,
+            (mode & 0xFFFF) << 16, offset) + name + extra)
+        self._entry = None
+
+    def close(self):
+        cd_offset = self._offset
+        for record in self._central:
+            self._put(record)
+        count = len(self._central)
+        cd_size = self._offset - cd_offset
+        if count >= 0xFFFF or max(cd_offset, cd_size) >= ZIP64_LIMIT:
+            # ZIP64 end of central directory + locator, в обычной записи — маркеры
+            eocd64_offset = self._offset
+            self._put(struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, (3 << 8) | 45, 45,
+                                  0, 0, count, count, cd_size, cd_offset))
+            self._put(struct.pack("<IIQI", 0x07064B50, 0, eocd64_offset, 1))
+            count = min(count, 0xFFFF)
+            cd_size, cd_offset = min(cd_size, 0xFFFFFFFF), min(cd_offset, 0xFFFFFFFF)
+        self._put(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, count, count,
+                              cd_size, cd_offset, 0))
+
+
+def _deflate(raw: bytes) -> tuple[int, bytes]:
+    """Сжимает запись целиком (raw deflate); выполняется в пуле потоков."""
+    comp = zlib.compressobj(ZIP_COMPRESSLEVEL, zlib.DEFLATED, -15)
+    return zlib.crc32(raw), comp.compress(raw) + comp.flush()
+
+
+_compress_pool: ThreadPoolExecutor | None = None
+
+
+def _get_compress_pool() -> ThreadPoolExecutor:
+    global _compress_pool
+    if _compress_pool is None:
+        _compress_pool = ThreadPoolExecutor(max_workers=ZIP_WORKERS,
+                                            thread_name_prefix="zip")
+    return _compress_pool
+
+
+def stream_zip(files: Iterable[tuple[str, bytes | Path]],
+               chunk_size: int = CHUNK_SIZE,
+               on_progress: Callable[[int], None] | None = None,
+               workers: int = ZIP_WORKERS) -> Iterator[bytes]:
+    """
+    Упаковывает файлы в ZIP «на лету» и отдаёт архив порциями байт.
+    Медиа пишутся без сжатия, остальное — deflate (см. compression_for).
+    Крупные deflate-записи сжимаются заранее в пуле потоков: пока одна
+    запись ждёт своей очереди, следующие уже сжимаются параллельно.
+    Пиковая память — порядка окна из `workers` крупных записей.
+    on_progress(nbytes) получает число упакованных байт исходных файлов.
+    """
+    sink = _ZipSink()
+    zw = _ZipStreamWriter(sink)
+    pool = _get_compress_pool() if workers > 1 else None
+    pending: deque = deque()
+
+    def enqueue(arcname, data):
+        method = compression_for(arcname)
+        size = data.stat().st_size if isinstance(data, Path) else len(data)
+        future = None
+        if pool is not None and method == ZIP_DEFLATED and size >= PARALLEL_MIN_SIZE:
+            raw = data.read_bytes() if isinstance(data, Path) else data
+            future = pool.submit(_deflate, raw)
+        pending.append((arcname, data, method, size, future))
+
+    def write_entry(arcname, data, method, size, future):
+        zip64 = zw.needs_zip64(size, method)
+        if isinstance(data, Path):
+            st = data.stat()
+            zw.start(arcname, method, st.st_mtime, st.st_mode, zip64)
+        else:
+            zw.start(arcname, method, time.time(), 0o100644, zip64)
+
+        if future is not None:
+            crc, compressed = future.result()
+            zw.write(compressed)
+            zw.finish(crc, size)
+            if on_progress is not None:
+                on_progress(size)
+            yield sink.drain()
+            return
+
+        crc, total = 0, 0
+        comp = (zlib.compressobj(ZIP_COMPRESSLEVEL, zlib.DEFLATED, -15)
+                if method == ZIP_DEFLATED else None)
+        for chunk in _iter_chunks(data, chunk_size):
+            crc = zlib.crc32(chunk, crc)
+            total += len(chunk)
+            zw.write(comp.compress(chunk) if comp else chunk)
+            if on_progress is not None:
+                on_progress(len(chunk))
+            if out := sink.drain():
+                yield out
+        if comp is not None:
+            zw.write(comp.flush())
+        zw.finish(crc, total)
+        if out := sink.drain():
+            yield out
+
+    try:
+        for arcname, data in files:
+            enqueue(arcname, data)
+            # голову очереди пишем сразу, если она не ждёт сжатия;
+            # иначе набираем следующие записи, пока окно не заполнится
+            while pending and (pending[0][4] is None or len(pending) > workers):
+                yield from write_entry(*pending.popleft())
+        while pending:
+            yield from write_entry(*pending.popleft())
+        zw.close()
+        if out := sink.drain():
+            yield out
+    finally:
+        for *_, future in pending:
+            if future is not None:
+                future.cancel()
+        close = getattr(files, "close", None)
+        if close is not None:
+            close()
+
+
+def _iter_chunks(data: bytes | Path, chunk_size: int) -> Iterator[bytes]:
+    if isinstance(data, Path):
+        with open(data, "rb") as src:
+            while chunk := src.read(chunk_size):
+                yield chunk
+    else:
+        for i in range(0, len(data), chunk_size):
+            yield data[i:i + chunk_size]
@@ -1,22 +1,26 @@
 # backend/app/main.py
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from jinja2 import Environment, FileSystemLoader
+from fastapi.responses import Response
 from pathlib import Path
-from zipfile import ZipFile
 from typing import List
-from app.seeders import apply_seed
-from app.database      import init_db, create_project, get_projects, DB_PATH
-from app.export_utils  import build_single_project_db
+from app import async_db
+from app.database      import init_db, get_projects
+from app.export_api    import router as export_router
+from app.projects_api  import router as projects_router
+from app.template_registry import preload_templates
+from app.metrics       import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_metrics
 from app.schemas       import ProjectCreate
-from app.utils.media   import save_media_file, list_media_files
+from app.utils.media   import (
+    FileTooLarge, save_upload_stream, list_media_files, discard_media_file, gc_blobs,
+)
 import logging
 import traceback
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 
 logger = logging.getLogger("uvicorn.error")
+import asyncio
 import shutil
 import os
 import json
@@ -25,37 +29,6 @@ import json
 from app.utils         import order_db as db
 from app.utils.collage import generate_collage
 
-# --- какие utils нужны какому боту ---------------------------------
-BOT_UTILS = {
-    "order_bot": [
-        "utils/order_db.py",
-        "utils/collage.py",
-        "utils/media.py",
-    ],
-    "faq_bot": [
-        "utils/faq_db.py",
-        "utils/media.py",
-    ],
-    "helper_bot": [
-        "utils/helper_db.py",
-        "utils/media.py",
-    ],
-    "feedback_bot": [
-        "utils/feedback_db.py",
-    ],
-    "moderator_bot": [
-        "utils/moderator_db.py",
-    ],
-    "quiz_bot": [                     # у квиза БД нет
-        "utils/media.py",             # только скачивание картинок для вопросов
-    ],
-    "smart_booking_crm": [
-        "utils/booking_db.py",
-        "utils/inline_calendar.py",
-        "utils/media.py",
-    ],
-}
-
 BASE_DIR = Path(__file__).resolve().parent
 
 app = FastAPI(debug=False)
@@ -70,8 +43,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# экспорт ботов: /projects/{id}/export, /projects/{id}/exports, /exports/...
+app.include_router(export_router)
+# постраничный список проектов: GET /projects
+app.include_router(projects_router)
+
+# Как часто убирать из media/.blobs содержимое, на которое не ссылается ни один проект
+MEDIA_GC_INTERVAL_S = int(os.getenv("MEDIA_GC_INTERVAL_S", 6 * 3600))
+
 # инициализируем основную БД конструктора
 init_db()
+# компилируем все шаблоны ботов заранее: ошибки синтаксиса — при старте
+preload_templates()
 @app.exception_handler(Exception)
 async def all_exception_handler(request: Request, exc: Exception):
     # Логируем полный traceback
@@ -86,6 +69,14 @@ async def all_exception_handler(request: Request, exc: Exception):
 def root():
     return {"message": "Сервер конструктора Telegram-ботов запущен"}
 
+@app.get("/metrics")
+def metrics():
+    """
+    Метрики в формате Prometheus: время и строки SQL-запросов, ожидание
+    блокировок (при DB_METRICS=1), счётчики кэша проектов.
+    """
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 @app.post("/projects")
 async def create_new_project(project: str = Form(...)):
     """
@@ -98,42 +89,59 @@ async def create_new_project(project: str = Form(...)):
         raise HTTPException(status_code=400,
                             detail=f"Ошибка парсинга проекта: {e}")
 
-    # 1) создаём запись и получаем ID
-    project_id = create_project(bot_project)
-
-    # 2) если seed передан — применяем его
-    if bot_project.seed is not None:
-        apply_seed(project_id, bot_project.seed)
+    # создаём запись и применяем seed (если передан) одной транзакцией;
+    # запись идёт в пуле БД, event loop тем временем обслуживает другие запросы
+    project_id = await async_db.create_seeded_project(bot_project)
 
     return {"status": "created", "project_id": project_id}
 
+@app.on_event("startup")
+async def schedule_media_gc():
+    """Фоновая уборка хранилища блобов раз в MEDIA_GC_INTERVAL_S (в потоке, не в event loop)."""
+    async def gc_loop():
+        while True:
+            await asyncio.sleep(MEDIA_GC_INTERVAL_S)
+            try:
+                removed = await asyncio.to_thread(gc_blobs, BASE_DIR / "media")
+                if removed:
+                    logger.info(f"media gc: удалено блобов {removed}")
+            except Exception:
+                logger.exception("media gc: ошибка уборки")
+    asyncio.create_task(gc_loop())
+
 @app.post("/projects/{project_id}/media")
 async def upload_media(
     project_id: int,
     files: List[UploadFile] = File(...)
 ):
     """
-    Загружает медиа-файлы для проекта через save_media_file.
-    Кладёт их в media/{project_id}/, возвращает список имён.
+    Загружает медиа-файлы для проекта: каждый файл потоково пишется
+    в media/{project_id}/ (файлы запроса — параллельно), размер ограничен
+    MAX_FILE_SIZE. Если хоть один файл отклонён — не сохраняется ни один.
+    Возвращает список имён.
     """
-    project = get_projects(project_id)
+    project = await async_db.get_projects(project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Проект не найден")
 
-    saved = []
-    for upload in files:
-        data = await upload.read()
-        try:
-            path = save_media_file(
-                project_id=project_id,
-                file_bytes=data,
-                original_filename=upload.filename,
-                media_root=BASE_DIR / "media"
-            )
-        except ValueError as e:
-            raise HTTPException(status_code=400, detail=str(e))
-        saved.append(path.name)
-
+    results = await asyncio.gather(
+        *(save_upload_stream(project_id, upload, media_root=BASE_DIR / "media")
+          for upload in files),
+        return_exceptions=True,
+    )
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        for r in results:
+            if isinstance(r, Path):
+                discard_media_file(r, media_root=BASE_DIR / "media")
+        err = errors[0]
+        if isinstance(err, FileTooLarge):
+            raise HTTPException(status_code=413, detail=str(err))
+        if isinstance(err, ValueError):
+            raise HTTPException(status_code=400, detail=str(err))
+        raise err
+
+    saved = [path.name for path in results]
     return {"status": "media_uploaded", "files": saved}
 
 @app.get("/projects/{project_id}/media")
@@ -146,163 +154,3 @@ def list_media(project_id: int):
         raise HTTPException(status_code=404, detail="Проект не найден")
     files = list_media_files(project_id, media_root=BASE_DIR / "media")
     return {"files": [f.name for f in files]}
-
-@app.get("/projects/{project_id}/export")
-def export_bot(project_id: int):
-    """
-    Генерирует исходники бота, запаковывает в ZIP и возвращает FileResponse.
-    """
-    project = get_projects(project_id)
-    if not project:
-        raise HTTPException(status_code=404, detail="Проект не найден")
-
-    template_type = project["template_type"]
-    template_path = BASE_DIR / "templates" / template_type
-    if not template_path.exists():
-        raise HTTPException(status_code=404, detail="Шаблон не найден")
-
-    # временная папка для сборки
-    export_dir = BASE_DIR / "exports" / f"project_{project_id}"
-    if export_dir.exists():
-        shutil.rmtree(export_dir)
-    export_dir.mkdir(parents=True)
-
-    # 1) Рендерим все *.j2 → *.py
-    env = Environment(loader=FileSystemLoader(str(template_path)))
-    jinja_ctx = {
-        "project_id": project_id,
-        "admin_chat_id": project["content"].get("admin_chat_id", 0),
-        "project": project,
-    }
-    for tpl in template_path.glob("*.j2"):
-        rendered = env.get_template(tpl.name).render(**jinja_ctx)
-        (export_dir / tpl.stem).write_text(rendered, encoding="utf-8")
-
-
-    # 2) .env
-    (export_dir / ".env").write_text(f"TOKEN={project['token']}\n", encoding="utf-8")
-
-    # 3) requirements.txt
-    deps = ["aiogram", "python-dotenv", "Pillow", "openpyxl", "apscheduler"]
-    (export_dir / "requirements.txt").write_text("\n".join(deps), encoding="utf-8")
-
-    # 4) README.md
-    (export_dir / "README.md").write_text(
-        f"# {project['name']}\n\n"
-        f"{project.get('description','')}\n\n"
-        "## Как запустить бота:\n"
-        "```bash\n"
-        "pip install -r requirements.txt\n"
-        "python run.py\n"
-        "```\n",
-        encoding="utf-8"
-    )
-
-    # 5) run.py — единый entry-point для всех шаблонов
-    run_py = export_dir / "run.py"
-    run_py.write_text(
-        "\n".join([
-    "#!/usr/bin/env python3",
-    "import logging",
-    "import asyncio",
-    "from dotenv import load_dotenv",
-    "",
-    f"from {template_type} import bot, dp, setup_bot_commands",
-    "",
-    "# 1) Логирование — формат даты через datefmt",
-    'logging.basicConfig(',
-    '    level=logging.INFO,',
-    '    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",',
-    '    datefmt="%Y-%m-%d %H:%M:%S"',
-    ')',
-    'logging.getLogger("aiogram").setLevel(logging.DEBUG)',
-    "",
-    "async def main():",
-    "    load_dotenv()",
-    "    await setup_bot_commands(bot)",
-    "    await dp.start_polling(bot, skip_updates=True)",
-    "",
-    "if __name__ == '__main__':",
-    "    asyncio.run(main())",
-]
-),
-        encoding="utf-8"
-    )
-
-    # 6) Копируем медиа
-    media_src = BASE_DIR / "media" / str(project_id)
-    if media_src.exists():
-        shutil.copytree(media_src, export_dir / "media"/ str(project_id))
-
-    # 7) Генерируем Windows-скрипты
-    # 7.1) start_bot.bat
-    (export_dir / "start_bot.bat").write_text(r'''@echo off
-pushd %~dp0
-pip install -r requirements.txt
-start "" /B python run.py > bot.log 2>&1
-for /f "tokens=2" %%a in ('
-    tasklist /FI "IMAGENAME eq python.exe" /FO LIST /V 
-    ^| findstr /R /C:"Window Title: run.py"
-') do set BOT_PID=%%a
-echo %BOT_PID% > bot.pid
-echo Bot started. PID=%BOT_PID%, logs→bot.log
-cmd /k rem
-''', encoding="utf-8")
-
-    # 7.2) stop_bot.bat
-    (export_dir / "stop_bot.bat").write_text(r'''@echo off
-if not exist bot.pid (
-  echo bot.pid not found. Bot may not be running.
-  pause
-  exit /b
-)
-set /p BOT_PID=<bot.pid
-taskkill /PID %BOT_PID% /F >nul 2>&1
-if errorlevel 1 (
-  echo Could not find process %BOT_PID%. It may have already exited.
-) else (
-  echo Process %BOT_PID% stopped.
-)
-del bot.pid
-pause
-''', encoding="utf-8")
-
-    # 8) Копируем утилиты конструктора только нужные файлы
-    bot_name = template_type  # или project["template_name"], если ты действительно так называешь
-    utils_dir = export_dir / "utils"
-    utils_dir.mkdir(parents=True, exist_ok=True)
-
-    for rel_path in BOT_UTILS.get(bot_name, []):
-        src = BASE_DIR / rel_path
-        dst = export_dir / rel_path
-        dst.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copy(src, dst)
-
-    # 9) Генерируем отдельную БД только для этого проекта
-    tmp_db = build_single_project_db(project_id)
-
-    db_name = {
-        "order_bot": "order_bot.db",
-        "faq_bot": "faq_bot.db",
-        "helper_bot": "helper_bot.db",
-        "moderator_bot": "moderator_bot.db",
-        "feedback_bot": "feedback_bot.db",
-        "smart_booking_crm": "booking_bot.db",
-    }.get(template_type, "database.db")  # fallback для старых шаблонов
-
-    shutil.copy(tmp_db, export_dir / "utils" / db_name)
-    tmp_db.unlink()
-
-    # 10) Упаковываем в ZIP и возвращаем
-    zip_path = BASE_DIR / "exports" / f"project_{project_id}.zip"
-    with ZipFile(zip_path, "w") as zipf:
-        for file in export_dir.rglob("*"):
-            zipf.write(file, arcname=file.relative_to(export_dir))
-
-    shutil.rmtree(export_dir)
-
-    return FileResponse(
-        path=str(zip_path),
-        filename=f"{project['name']}.zip",
-        media_type="application/zip"
-    )
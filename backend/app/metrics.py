@@ -0,0 +1,75 @@
+# app/metrics.py
+"""
+Метрики конструктора в текстовом формате Prometheus (GET /metrics):
+замеры SQL из db_safe (если включены, см. DB_METRICS) и счётчики кэша проектов.
+"""
+
+from app.database import project_cache_stats
+from app.utils.db_safe import LATENCY_BUCKETS, metrics_snapshot
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram(lines: list[str], name: str, hist: dict, labels: str = "") -> None:
+    sep = "," if labels else ""
+    cumulative = 0
+    for bound, n in zip((*LATENCY_BUCKETS, "+Inf"), hist["buckets"]):
+        cumulative += n
+        lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{suffix} {hist['sum']:.6f}")
+    lines.append(f"{name}_count{suffix} {hist['count']}")
+
+
+def render_metrics() -> str:
+    snap = metrics_snapshot()
+    lines = [
+        "# HELP db_metrics_enabled Включены ли замеры SQL (DB_METRICS).",
+        "# TYPE db_metrics_enabled gauge",
+        f"db_metrics_enabled {int(snap['enabled'])}",
+    ]
+
+    # 1) время выражений по нормализованному SQL
+    lines += [
+        "# HELP db_statement_duration_seconds Время выполнения выражения SQL.",
+        "# TYPE db_statement_duration_seconds histogram",
+    ]
+    for sql, hist in sorted(snap["statements"].items()):
+        _histogram(lines, "db_statement_duration_seconds", hist, f'sql="{_label(sql)}"')
+
+    # 2) строки: изменённые (DML) и прочитанные (fetch*)
+    lines += [
+        "# HELP db_statement_rows_total Строки, изменённые или прочитанные выражением.",
+        "# TYPE db_statement_rows_total counter",
+    ]
+    for sql, hist in sorted(snap["statements"].items()):
+        lines.append(f'db_statement_rows_total{{sql="{_label(sql)}"}} {hist["rows"]}')
+
+    # 3) ожидание блокировки записи (BEGIN IMMEDIATE)
+    lines += [
+        "# HELP db_lock_wait_seconds Ожидание блокировки записи в transaction().",
+        "# TYPE db_lock_wait_seconds histogram",
+    ]
+    _histogram(lines, "db_lock_wait_seconds", snap["lock_wait"])
+    lines += [
+        "# HELP db_lock_timeouts_total Транзакции, не дождавшиеся блокировки записи.",
+        "# TYPE db_lock_timeouts_total counter",
+        f"db_lock_timeouts_total {snap['lock_timeouts']}",
+    ]
+
+    # 4) кэш проектов
+    cache = project_cache_stats()
+    for key in ("hits", "misses", "invalidations"):
+        lines += [
+            f"# TYPE project_cache_{key}_total counter",
+            f"project_cache_{key}_total {cache[key]}",
+        ]
+    lines += [
+        "# TYPE project_cache_size gauge",
+        f"project_cache_size {cache['size']}",
+    ]
+    return "\n".join(lines) + "\n"
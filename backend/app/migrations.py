@@ -0,0 +1,377 @@
+# app/migrations.py
+"""
+Версионированные миграции схемы БД конструктора.
+Номер применённой миграции хранится в PRAGMA user_version; при старте
+выполняются только миграции новее него, а актуальная БД не трогается вовсе.
+Каждое выражение помечено таблицей, к которой относится, — так те же
+миграции применяются и к урезанным БД проектов (build_single_project_db).
+"""
+
+import re
+import sqlite3
+
+# (версия, описание, [(таблица, SQL), …]) — строго по возрастанию версии.
+# Уже выпущенные миграции не меняем: новые правки схемы — новой версией.
+MIGRATIONS: list[tuple[int, str, list[tuple[str, str]]]] = [
+    (1, "базовая схема", [
+        # Проекты
+        ("projects", """
+        CREATE TABLE IF NOT EXISTS projects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            template_type TEXT,
+            description TEXT,
+            token TEXT,
+            content TEXT
+        )
+        """),
+        # Каталог товаров/услуг
+        ("products", """
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER,
+            name TEXT,
+            short_desc TEXT,
+            full_desc TEXT,
+            media_path TEXT
+        )
+        """),
+        # Бронирования
+        ("bookings", """
+        CREATE TABLE IF NOT EXISTS bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER,
+            user_id INTEGER,
+            service_id INTEGER,
+            start_dt TEXT,
+            duration_cells INTEGER,
+            client_name TEXT,
+            client_phone TEXT,
+            status TEXT DEFAULT 'pending',
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """),
+        # Бан-лист
+        ("banned_users", """
+        CREATE TABLE IF NOT EXISTS banned_users (
+            project_id INTEGER,
+            user_id INTEGER,
+            PRIMARY KEY(project_id, user_id)
+        )
+        """),
+        # Корзина
+        ("cart_items", """
+        CREATE TABLE IF NOT EXISTS cart_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER,
+            user_id INTEGER,
+            product_id INTEGER,
+            quantity INTEGER DEFAULT 1
+        )
+        """),
+        # Окна работы
+        ("work_intervals", """
+        CREATE TABLE IF NOT EXISTS work_intervals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER,
+            start_dt TEXT,
+            end_dt TEXT
+        )
+        """),
+        # Исключения (паника)
+        ("work_exceptions", """
+        CREATE TABLE IF NOT EXISTS work_exceptions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER,
+            start_dt TEXT,
+            end_dt TEXT,
+            state TEXT
+        )
+        """),
+        # Настройки рассылки
+        ("settings", """
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        """),
+        ("settings", """
+        INSERT OR IGNORE INTO settings(key,value) VALUES
+            ('summary_enabled', 'true'),
+            ('summary_time',    '07:00'),
+            ('summary_timezone','Europe/Bucharest')
+        """),
+        # FAQ
+        ("faq_entries", """
+        CREATE TABLE IF NOT EXISTS faq_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER,
+            question TEXT,
+            answer TEXT,
+            media_path TEXT
+        )
+        """),
+        # Helper-bot: «пасты»
+        ("helper_entries", """
+        CREATE TABLE IF NOT EXISTS helper_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER,
+            alias TEXT UNIQUE,
+            content TEXT,
+            media_path TEXT,
+            admin_only BOOLEAN DEFAULT 0
+        )
+        """),
+        # Moderator-bot: настройки
+        ("moderation_settings", """
+        CREATE TABLE IF NOT EXISTS moderation_settings (
+            project_id    INTEGER PRIMARY KEY,
+            allow_media    INTEGER DEFAULT 0,
+            allow_stickers INTEGER DEFAULT 0,
+            censor_enabled INTEGER DEFAULT 1,
+            flood_max      INTEGER DEFAULT 3,
+            flood_window_s INTEGER DEFAULT 600
+        )
+        """),
+        # Moderator-bot: белый список доменов
+        ("link_whitelist", """
+        CREATE TABLE IF NOT EXISTS link_whitelist (
+            project_id INTEGER,
+            domain     TEXT,
+            PRIMARY KEY(project_id, domain)
+        )
+        """),
+        # Moderator-bot: предупреждения (страйки)
+        ("user_warnings", """
+        CREATE TABLE IF NOT EXISTS user_warnings (
+            project_id INTEGER,
+            chat_id    INTEGER,
+            user_id    INTEGER,
+            strikes    INTEGER DEFAULT 0,
+            last_ts    INTEGER,
+            PRIMARY KEY(project_id, chat_id, user_id)
+        )
+        """),
+        # Moderator-bot: логирование нарушений
+        ("moderation_logs", """
+        CREATE TABLE IF NOT EXISTS moderation_logs (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER,
+            chat_id    INTEGER,
+            user_id    INTEGER,
+            message_id INTEGER,
+            violation  TEXT,
+            text       TEXT,
+            ts         INTEGER
+        )
+        """),
+        # Anonymous-Feedback: лог и бан-лист
+        ("feedback_messages", """
+        CREATE TABLE IF NOT EXISTS feedback_messages (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id  INTEGER,
+            user_id     INTEGER,
+            direction   TEXT,          -- 'in' | 'out'
+            text        TEXT,
+            ts          INTEGER
+        )
+        """),
+        ("feedback_blocked", """
+        CREATE TABLE IF NOT EXISTS feedback_blocked (
+            project_id INTEGER,
+            user_id    INTEGER,
+            PRIMARY KEY(project_id, user_id)
+        )
+        """),
+    ]),
+    (2, "индексы под частые выборки", [
+        ("projects",
+         "CREATE INDEX IF NOT EXISTS idx_projects_template ON projects(template_type)"),
+        ("products",
+         "CREATE INDEX IF NOT EXISTS idx_products_project ON products(project_id)"),
+        ("faq_entries",
+         "CREATE INDEX IF NOT EXISTS idx_faq_entries_project ON faq_entries(project_id)"),
+        ("helper_entries",
+         "CREATE INDEX IF NOT EXISTS idx_helper_entries_project ON helper_entries(project_id)"),
+        ("cart_items",
+         "CREATE INDEX IF NOT EXISTS idx_cart_items_user "
+         "ON cart_items(project_id, user_id, product_id)"),
+        ("bookings",
+         "CREATE INDEX IF NOT EXISTS idx_bookings_status_start "
+         "ON bookings(project_id, status, start_dt)"),
+        ("work_intervals",
+         "CREATE INDEX IF NOT EXISTS idx_work_intervals_start "
+         "ON work_intervals(project_id, start_dt)"),
+        ("work_exceptions",
+         "CREATE INDEX IF NOT EXISTS idx_work_exceptions_state "
+         "ON work_exceptions(project_id, state)"),
+        ("moderation_logs",
+         "CREATE INDEX IF NOT EXISTS idx_moderation_logs_chat "
+         "ON moderation_logs(project_id, chat_id, ts)"),
+        ("feedback_messages",
+         "CREATE INDEX IF NOT EXISTS idx_feedback_messages_user "
+         "ON feedback_messages(project_id, user_id, ts)"),
+    ]),
+    (3, "start_ts: время начала в секундах эпохи для диапазонных выборок", [
+        # виртуальная колонка: считается из start_dt, места не занимает,
+        # а индекс по ней позволяет искать полуинтервалами [от, до)
+        ("bookings",
+         "ALTER TABLE bookings ADD COLUMN start_ts INTEGER "
+         "GENERATED ALWAYS AS (CAST(strftime('%s', start_dt) AS INTEGER)) VIRTUAL"),
+        ("bookings", "DROP INDEX IF EXISTS idx_bookings_status_start"),
+        ("bookings",
+         "CREATE INDEX IF NOT EXISTS idx_bookings_status_ts "
+         "ON bookings(project_id, status, start_ts)"),
+        ("work_intervals",
+         "ALTER TABLE work_intervals ADD COLUMN start_ts INTEGER "
+         "GENERATED ALWAYS AS (CAST(strftime('%s', start_dt) AS INTEGER)) VIRTUAL"),
+        ("work_intervals", "DROP INDEX IF EXISTS idx_work_intervals_start"),
+        ("work_intervals",
+         "CREATE INDEX IF NOT EXISTS idx_work_intervals_ts "
+         "ON work_intervals(project_id, start_ts)"),
+    ]),
+    (4, "projects.rev: счётчик версии строки для кэша проектов", [
+        ("projects",
+         "ALTER TABLE projects ADD COLUMN rev INTEGER NOT NULL DEFAULT 0"),
+        # rev растёт при любой правке проекта — из любого процесса
+        ("projects", """
+        CREATE TRIGGER IF NOT EXISTS projects_bump_rev
+        AFTER UPDATE OF name, template_type, description, token, content ON projects
+        BEGIN
+            UPDATE projects SET rev = rev + 1 WHERE id = NEW.id;
+        END
+        """),
+    ]),
+    (5, "helper_entries: alias уникален в пределах проекта, а не глобально", [
+        # SQLite не умеет менять ограничения — пересобираем таблицу
+        ("helper_entries", """
+        CREATE TABLE helper_entries_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER,
+            alias TEXT,
+            content TEXT,
+            media_path TEXT,
+            admin_only BOOLEAN DEFAULT 0,
+            UNIQUE(project_id, alias)
+        )
+        """),
+        ("helper_entries",
+         "INSERT INTO helper_entries_new(id,project_id,alias,content,media_path,admin_only) "
+         "SELECT id,project_id,alias,content,media_path,admin_only FROM helper_entries"),
+        ("helper_entries", "DROP TABLE helper_entries"),
+        # idx_helper_entries_project ушёл вместе с таблицей; UNIQUE(project_id, alias)
+        # сам по себе индекс с project_id в начале
+        ("helper_entries", "ALTER TABLE helper_entries_new RENAME TO helper_entries"),
+    ]),
+    (6, "cart_items: одна позиция на (проект, пользователь, товар) — под UPSERT", [
+        # дубли, накопленные гонкой SELECT→INSERT, склеиваем в позицию с меньшим id
+        ("cart_items", """
+        UPDATE cart_items SET quantity = (
+            SELECT SUM(d.quantity) FROM cart_items d
+             WHERE d.project_id=cart_items.project_id
+               AND d.user_id=cart_items.user_id
+               AND d.product_id=cart_items.product_id)
+         WHERE id IN (SELECT MIN(id) FROM cart_items
+                       GROUP BY project_id, user_id, product_id HAVING COUNT(*) > 1)
+        """),
+        ("cart_items", """
+        DELETE FROM cart_items WHERE id NOT IN (
+            SELECT MIN(id) FROM cart_items GROUP BY project_id, user_id, product_id)
+        """),
+        # уникальный индекс заменяет обычный idx_cart_items_user с теми же колонками
+        ("cart_items", "DROP INDEX IF EXISTS idx_cart_items_user"),
+        ("cart_items",
+         "CREATE UNIQUE INDEX IF NOT EXISTS uq_cart_items_user_product "
+         "ON cart_items(project_id, user_id, product_id)"),
+    ]),
+    (7, "work_exceptions: start_ts/end_ts для проверки пересечения по индексу", [
+        # исключение бывает длиннее суток (паника на N часов), поэтому, в отличие
+        # от броней, кандидатов ищем по концу: end_ts > начала слота — это только
+        # текущие и будущие исключения, сколько бы ни длились
+        ("work_exceptions",
+         "ALTER TABLE work_exceptions ADD COLUMN start_ts INTEGER "
+         "GENERATED ALWAYS AS (CAST(strftime('%s', start_dt) AS INTEGER)) VIRTUAL"),
+        ("work_exceptions",
+         "ALTER TABLE work_exceptions ADD COLUMN end_ts INTEGER "
+         "GENERATED ALWAYS AS (CAST(strftime('%s', end_dt) AS INTEGER)) VIRTUAL"),
+        # (project_id, state) — префикс нового индекса, старый не нужен
+        ("work_exceptions", "DROP INDEX IF EXISTS idx_work_exceptions_state"),
+        ("work_exceptions",
+         "CREATE INDEX IF NOT EXISTS idx_work_exceptions_ts "
+         "ON work_exceptions(project_id, state, end_ts)"),
+    ]),
+    (8, "work_exceptions_rev: версия исключений проекта для индекса в памяти", [
+        # как projects.rev: любая правка work_exceptions из любого процесса
+        # поднимает версию проекта, а exception_index сверяет её одним SELECT
+        ("work_exceptions", """
+        CREATE TABLE IF NOT EXISTS work_exceptions_rev (
+            project_id INTEGER PRIMARY KEY,
+            rev INTEGER NOT NULL DEFAULT 0
+        )
+        """),
+        *[("work_exceptions", f"""
+        CREATE TRIGGER IF NOT EXISTS work_exceptions_bump_rev_{event.lower()}
+        AFTER {event} ON work_exceptions
+        BEGIN
+            INSERT INTO work_exceptions_rev(project_id, rev) VALUES ({row}.project_id, 1)
+            ON CONFLICT(project_id) DO UPDATE SET rev = rev + 1;
+        END
+        """) for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD"))],
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+_ADD_COLUMN = re.compile(r"^\s*ALTER\s+TABLE\s+(\w+)\s+ADD\s+COLUMN\s+(\w+)", re.IGNORECASE)
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _already_applied(conn: sqlite3.Connection, sql: str) -> bool:
+    """
+    ADD COLUMN не бывает IF NOT EXISTS: пропускаем его, если колонка уже есть
+    (например, схема таблицы скопирована из уже обновлённой БД).
+    """
+    m = _ADD_COLUMN.match(sql)
+    if m is None:
+        return False
+    table, column = m.groups()
+    return any(r[1] == column for r in conn.execute(f"PRAGMA table_xinfo({table})"))
+
+
+def migrate(conn: sqlite3.Connection, tables: set[str] | None = None) -> int:
+    """
+    Применяет к conn все миграции новее PRAGMA user_version.
+    tables — если задано, выполняются только выражения для этих таблиц
+    (урезанная БД проекта); версия всё равно поднимается до последней.
+    Если conn уже в транзакции — миграции идут в ней, иначе в своей.
+    Возвращает итоговую версию схемы.
+    """
+    current = schema_version(conn)
+    if current >= LATEST_VERSION:
+        return current
+
+    own_tx = not conn.in_transaction
+    if own_tx:
+        conn.execute("BEGIN IMMEDIATE")
+    try:
+        current = schema_version(conn)      # могли обновить, пока ждали блокировку
+        for version, _, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            for table, sql in statements:
+                if tables is not None and table not in tables:
+                    continue
+                if not _already_applied(conn, sql):
+                    conn.execute(sql)
+            conn.execute(f"PRAGMA user_version={version}")
+        if own_tx:
+            conn.execute("COMMIT")
+    except Exception:
+        if own_tx:
+            conn.execute("ROLLBACK")
+        raise
+    return LATEST_VERSION
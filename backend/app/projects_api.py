@@ -0,0 +1,50 @@
+# backend/app/projects_api.py
+"""
+Постраничный список проектов (GET /projects). Отдельный роутер, чтобы
+листинг можно было подключать и проверять без остального приложения.
+"""
+import asyncio
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+
+from app import async_db
+from app.database import PROJECT_LIST_FIELDS
+
+router = APIRouter()
+
+# Поля, которые можно запросить в листинге (token не отдаём никогда)
+LISTABLE_PROJECT_FIELDS = {"id", "name", "template_type", "description", "content"}
+
+@router.get("/projects")
+async def list_projects(
+    after_id: int = 0,
+    limit: int = Query(50, ge=1, le=500),
+    fields: Optional[str] = None,
+    template_type: Optional[str] = None,
+):
+    """
+    Постраничный список проектов: id > after_id, не больше limit.
+    fields — поля через запятую (по умолчанию без content).
+    next_after_id — курсор следующей страницы (None, если это последняя).
+    """
+    if fields is None:
+        wanted = set(PROJECT_LIST_FIELDS)
+    else:
+        wanted = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = wanted - LISTABLE_PROJECT_FIELDS
+        if unknown:
+            raise HTTPException(status_code=400,
+                                detail=f"Неизвестные поля: {', '.join(sorted(unknown))}")
+
+    # берём на одну строку больше, чтобы понять, есть ли следующая страница
+    items, total = await asyncio.gather(
+        async_db.list_projects(after_id, limit + 1, wanted, template_type),
+        async_db.count_projects(template_type),
+    )
+    has_more = len(items) > limit
+    items = items[:limit]
+    return {
+        "items":         items,
+        "total":         total,
+        "next_after_id": items[-1]["id"] if has_more else None,
+    }
@@ -8,7 +8,6 @@ app/seeders.py
 import json
 from typing import Any
 from app.utils.media import save_media_file, MEDIA_ROOT
-from app.utils.order_db import add_product
 # --- Pydantic-модели сидов --------------------------------------------
 from app.schemas import (
     SeedUnion,
@@ -23,129 +22,151 @@ from app.schemas import (
 
 # --- CRUD-функции из app.database --------------------------------------
 from app.database import (
-    get_projects,
+    create_project,
+    get_project_content,
     update_project_content,
-    add_product,
-    add_faq_entry,
-    add_work_interval,
-    create_booking,
+    add_products_bulk,
+    add_faq_entries_bulk,
+    add_helper_entries_bulk,
+    add_work_intervals_bulk,
+    create_bookings_bulk,
     set_setting,
-    add_product as add_service,   # для услуг Smart-Booking
+    block_users_bulk,
+    log_feedback_bulk,
+    set_moderation_settings,
+    whitelist_add_bulk,
+    add_products_bulk as add_services_bulk,   # для услуг Smart-Booking
 )
 
 # --- Утилиты ------------------------------------------------------------
-from app.utils.helper_db import add_helper_entry
-from app.utils.feedback import log_feedback, block_user as fb_block_user
-from app.utils.moderation import toggle_setting as mod_toggle_setting, whitelist_add
+# транзакции активного движка хранения (SQLite или память, см. app/storage.py)
+from app.storage import joined_transaction, transaction
 
+# Каждый сидер пишет пакетами (executemany) в транзакцию conn,
+# поэтому весь засев — один коммит, а сбой не оставляет полпроекта.
 
-# 1) Order-bot: товары ---------------------------------------------------
-def seed_order_bot(pid: int, seed: OrderBotSeed) -> None:
-    for item in seed.products:
-        add_product(
-            pid,
-            item.name,
-            item.short_descr,
-            item.full_descr,
-            item.photo_file or ""   # уже оригинальное имя
-        )
 
+# 1) Order-bot: товары ---------------------------------------------------
+def seed_order_bot(pid: int, seed: OrderBotSeed, conn) -> None:
+    add_products_bulk(pid, (
+        (item.name,
+         item.short_descr,
+         item.full_descr,
+         item.photo_file or "")     # уже оригинальное имя
+        for item in seed.products
+    ), conn=conn)
 
 
 # 2) FAQ-bot: вопросы-ответы ---------------------------------------------
-def seed_faq_bot(pid: int, seed: FAQBotSeed) -> None:
-    for qa in seed.faq_items:
-        add_faq_entry(pid, qa.question, qa.answer, "")
+def seed_faq_bot(pid: int, seed: FAQBotSeed, conn) -> None:
+    add_faq_entries_bulk(pid, (
+        (qa.question, qa.answer, "") for qa in seed.faq_items
+    ), conn=conn)
 
 
 # 3) Helper-bot: alias-пасты ---------------------------------------------
-def seed_helper_bot(pid: int, seed: HelperBotSeed) -> None:
-    for entry in seed.entries:
-        add_helper_entry(pid,
-                         entry.alias,
-                         entry.content,
-                         entry.photo_file or "")
+def seed_helper_bot(pid: int, seed: HelperBotSeed, conn) -> None:
+    add_helper_entries_bulk(pid, (
+        (entry.alias, entry.content, entry.photo_file or "", 0)
+        for entry in seed.entries
+    ), conn=conn)
 
 
 # 4) Feedback-bot: треды и блок-лист ------------------------------------
-def seed_feedback_bot(pid: int, seed: FeedbackBotSeed) -> None:
+def seed_feedback_bot(pid: int, seed: FeedbackBotSeed, conn) -> None:
     # предполагаем, что все сообщения — входящие
     if seed.messages:
-        for msg in seed.messages:
-            log_feedback(pid,
-                         msg.from_user_id,  # <- правильно
-                         "in",              # жёстко «in», или расширить схему
-                         msg.text)
+        log_feedback_bulk(pid, (
+            (msg.from_user_id, "in", msg.text) for msg in seed.messages
+        ), conn=conn)
     if seed.blocked:
-        for uid in seed.blocked:
-            fb_block_user(pid, uid)
+        block_users_bulk(pid, seed.blocked, conn=conn)
 
 
 # 5) Moderator-bot: настройки и whitelist -------------------------------
-def seed_moderator_bot(pid: int, seed: ModeratorBotSeed) -> None:
+def seed_moderator_bot(pid: int, seed: ModeratorBotSeed, conn) -> None:
     s = seed.settings
-    mod_toggle_setting(pid, "allow_media",     int(s.allow_media))
-    mod_toggle_setting(pid, "allow_stickers",   int(s.allow_stickers))
-    mod_toggle_setting(pid, "censor_enabled",   int(s.censor_enabled))
-    mod_toggle_setting(pid, "flood_max",        s.flood_max)
-    mod_toggle_setting(pid, "flood_window_s",   s.flood_window_s)
+    set_moderation_settings(pid, {
+        "allow_media":    int(s.allow_media),
+        "allow_stickers": int(s.allow_stickers),
+        "censor_enabled": int(s.censor_enabled),
+        "flood_max":      s.flood_max,
+        "flood_window_s": s.flood_window_s,
+    }, conn=conn)
 
     if seed.whitelist:
-        for w in seed.whitelist:
-            whitelist_add(pid, w.domain)
+        whitelist_add_bulk(pid, (w.domain for w in seed.whitelist), conn=conn)
 
 
 # 6) Smart-Booking CRM: услуги, интервалы, брони, сводка ------------------
-def seed_smart_booking(pid: int, seed: SmartBookingSeed) -> None:
+def seed_smart_booking(pid: int, seed: SmartBookingSeed, conn) -> None:
     # 6.1 услуги
-    for svc in seed.services:
-        add_service(pid, svc.name, svc.duration_cells, svc.price or 0)
+    add_services_bulk(pid, (
+        (svc.name, svc.duration_cells, svc.price or 0, "") for svc in seed.services
+    ), conn=conn)
     # 6.2 интервалы
     if seed.work_intervals:
-        for iv in seed.work_intervals:
-            add_work_interval(pid, iv["start"], iv["end"])
+        add_work_intervals_bulk(pid, (
+            (iv["start"], iv["end"]) for iv in seed.work_intervals
+        ), conn=conn)
     # 6.3 начальные брони
     if seed.initial_bookings:
-        for bk in seed.initial_bookings:
-            create_booking(pid,
-                           bk.user_id,
-                           bk.service_id,
-                           bk.start_dt,
-                           bk.duration_cells,
-                           bk.client_name,
-                           bk.client_phone)
-    # 6.4 сводка
+        create_bookings_bulk(pid, (
+            (bk.user_id,
+             bk.service_id,
+             bk.start_dt,
+             bk.duration_cells,
+             bk.client_name,
+             bk.client_phone)
+            for bk in seed.initial_bookings
+        ), conn=conn)
+    # 6.4 сводка (настройки глобальные, см. таблицу settings)
     summary = seed.summary
-    set_setting(pid, "summary_enabled",
-                "true" if summary.enabled else "false")
-    set_setting(pid, "summary_time", summary.time)
-    set_setting(pid, "summary_timezone", summary.timezone)
+    set_setting("summary_enabled",
+                "true" if summary.enabled else "false", conn=conn)
+    set_setting("summary_time", summary.time, conn=conn)
+    set_setting("summary_timezone", summary.timezone, conn=conn)
 
 
 # 7) Quiz-bot: просто кладём вопросы в content ---------------------------
-def seed_quiz_bot(pid: int, seed: QuizBotSeed) -> None:
-    proj = get_projects(pid)
-    content = proj["content"] or {}
+def seed_quiz_bot(pid: int, seed: QuizBotSeed, conn) -> None:
+    # читаем через conn: проект может быть ещё не закоммичен
+    content = get_project_content(pid, conn=conn) or {}
     content["questions"] = [q.dict() for q in seed.questions]
-    update_project_content(pid, content)
+    update_project_content(pid, content, conn=conn)
 
 
 # Универсальная точка входа ---------------------------------------------
-def apply_seed(project_id: int, seed: SeedUnion) -> None:
-    t = seed.type
-    if t == "order_bot":
-        seed_order_bot(project_id, seed)
-    elif t == "faq_bot":
-        seed_faq_bot(project_id, seed)
-    elif t == "helper_bot":
-        seed_helper_bot(project_id, seed)
-    elif t == "feedback_bot":
-        seed_feedback_bot(project_id, seed)
-    elif t == "moderator_bot":
-        seed_moderator_bot(project_id, seed)
-    elif t == "smart_booking_crm":
-        seed_smart_booking(project_id, seed)
-    elif t == "quiz_bot":
-        seed_quiz_bot(project_id, seed)
-    else:
-        raise ValueError(f"Неизвестный тип сидов: {t}")
+_SEEDERS = {
+    "order_bot":         seed_order_bot,
+    "faq_bot":           seed_faq_bot,
+    "helper_bot":        seed_helper_bot,
+    "feedback_bot":      seed_feedback_bot,
+    "moderator_bot":     seed_moderator_bot,
+    "smart_booking_crm": seed_smart_booking,
+    "quiz_bot":          seed_quiz_bot,
+}
+
+
+def apply_seed(project_id: int, seed: SeedUnion, conn=None) -> None:
+    """
+    Засевает проект одной транзакцией. С conn — внутри транзакции
+    вызывающего (см. create_seeded_project).
+    """
+    seeder = _SEEDERS.get(seed.type)
+    if seeder is None:
+        raise ValueError(f"Неизвестный тип сидов: {seed.type}")
+    with joined_transaction(conn) as conn:
+        seeder(project_id, seed, conn)
+
+
+def create_seeded_project(project) -> int:
+    """
+    Создаёт проект и применяет его seed (если есть) одним коммитом:
+    при ошибке засева не остаётся ни проекта, ни части данных.
+    """
+    with transaction() as conn:
+        project_id = create_project(project, conn=conn)
+        if project.seed is not None:
+            apply_seed(project_id, project.seed, conn=conn)
+    return project_id
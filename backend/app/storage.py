@@ -0,0 +1,753 @@
+# app/storage.py
+"""
+Движки хранения за CRUD-функциями app.database.
+
+Функция app.database, помеченная @engine_backed, — это одновременно
+реализация для SQLite и точка входа: вызов уходит в активный движок.
+    sqlite — по умолчанию, файл app/database.db;
+    memory — словари и индексы в памяти процесса (нагрузочные прогоны, CI).
+Движок выбирается переменной STORAGE_ENGINE или set_engine().
+
+    set_engine("memory")
+    with transaction() as conn:
+        pid = create_project(project, conn=conn)
+        add_products_bulk(pid, items, conn=conn)
+"""
+
+import abc
+import bisect
+import calendar
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import wraps
+
+from app.utils import db_safe
+
+# имя функции → реализация для SQLite (заполняется при импорте app.database)
+_sqlite_impl: dict = {}
+
+
+def engine_backed(fn):
+    """Регистрирует fn как SQLite-реализацию и перенаправляет вызов в активный движок."""
+    name = fn.__name__
+    _sqlite_impl[name] = fn
+
+    @wraps(fn)
+    def dispatch(*args, **kwargs):
+        engine = _engine or get_engine()
+        if engine is _sqlite:
+            return fn(*args, **kwargs)
+        return getattr(engine, name)(*args, **kwargs)
+    return dispatch
+
+
+class StorageEngine(abc.ABC):
+    """
+    Контракт движка: методы с именами и сигнатурами функций app.database,
+    помеченных @engine_backed (список — contract()), и transaction().
+    conn в методах — то, что отдаёт transaction() этого же движка.
+    """
+    name = "base"
+
+    @abc.abstractmethod
+    def transaction(self):
+        """Контекст-менеджер транзакции; отдаёт conn для методов движка."""
+
+    def missing(self) -> list[str]:
+        """Методы контракта, которых у движка нет."""
+        return sorted(n for n in _sqlite_impl if not callable(getattr(self, n, None)))
+
+
+class SQLiteEngine(StorageEngine):
+    """Функции app.database как есть: SQL поверх пула соединений db_safe."""
+    name = "sqlite"
+
+    def transaction(self):
+        return db_safe.transaction(db_safe.DB_PATH)
+
+    def __getattr__(self, name):
+        try:
+            return _sqlite_impl[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+# --- движок в памяти ---------------------------------------------------
+
+def iso_epoch(value):
+    """Как CAST(strftime('%s', value) AS INTEGER): время без зоны считается UTC."""
+    try:
+        dt = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is not None:
+        return int(dt.timestamp())
+    return calendar.timegm(dt.timetuple())
+
+
+def _insort(items: list, item) -> None:
+    # id и start_ts обычно растут — дописываем в конец без бинпоиска
+    if not items or items[-1] < item:
+        items.append(item)
+    else:
+        bisect.insort(items, item)
+
+
+def _remove(items: list, item) -> None:
+    i = bisect.bisect_left(items, item)
+    if i < len(items) and items[i] == item:
+        del items[i]
+
+
+class _Table:
+    """
+    Строки по id и индексы к ним:
+    unique — ключ уникальности (колонки) → id;
+    group  — ключ группы (обычно project_id) → отсортированные id;
+    order  — внутри группы отсортированные пары (значение колонки, id),
+             для диапазонов по start_ts.
+    Индексируемые колонки после вставки не меняются.
+    """
+
+    def __init__(self, unique=None, group=None, order=None):
+        self.rows: dict[int, dict] = {}
+        self.ids: list[int] = []
+        self.last_id = 0
+        self.unique, self.group, self.order = unique, group, order
+        self.by_unique: dict[tuple, int] = {}
+        self.by_group: dict[tuple, list[int]] = defaultdict(list)
+        self.by_order: dict[tuple, list[tuple]] = defaultdict(list)
+
+    @staticmethod
+    def key(row: dict, cols) -> tuple:
+        return tuple(row[c] for c in cols)
+
+    def add(self, row: dict) -> None:
+        rid = row["id"]
+        self.rows[rid] = row
+        _insort(self.ids, rid)
+        if self.unique:
+            self.by_unique[self.key(row, self.unique)] = rid
+        if self.group:
+            g = self.key(row, self.group)
+            _insort(self.by_group[g], rid)
+            if self.order and row[self.order] is not None:
+                _insort(self.by_order[g], (row[self.order], rid))
+
+    def discard(self, rid: int) -> dict:
+        row = self.rows.pop(rid)
+        _remove(self.ids, rid)
+        if self.unique:
+            self.by_unique.pop(self.key(row, self.unique), None)
+        if self.group:
+            g = self.key(row, self.group)
+            _remove(self.by_group[g], rid)
+            if self.order and row[self.order] is not None:
+                _remove(self.by_order[g], (row[self.order], rid))
+        return row
+
+    def find(self, *key) -> dict | None:
+        rid = self.by_unique.get(key)
+        return None if rid is None else self.rows[rid]
+
+    def group_rows(self, *key) -> list[dict]:
+        return [self.rows[i] for i in self.by_group.get(key, ())]
+
+    def range(self, group_key: tuple, lo=None, hi=None) -> list[dict]:
+        """Строки группы с lo <= order < hi (None — без границы), по возрастанию."""
+        pairs = self.by_order.get(group_key, [])
+        start = 0 if lo is None else bisect.bisect_left(pairs, (lo,))
+        stop = len(pairs) if hi is None else bisect.bisect_left(pairs, (hi,))
+        return [self.rows[rid] for _, rid in pairs[start:stop]]
+
+
+class MemoryEngine(StorageEngine):
+    """
+    Все таблицы app.database в словарях процесса. Одна блокировка на движок;
+    транзакция копит журнал отмен и при исключении откатывает его.
+    Повторный transaction() в том же потоке присоединяется к открытой.
+    Ошибки уникальности — sqlite3.IntegrityError, как у SQLite-движка.
+    """
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._undo: list | None = None
+        self._exceptions_rev: dict[int, int] = {}   # как work_exceptions_rev
+        self.tables = {
+            "projects":            _Table(group=("template_type",)),
+            "products":            _Table(group=("project_id",)),
+            "bookings":            _Table(group=("project_id",), order="start_ts"),
+            "work_intervals":      _Table(group=("project_id",), order="start_ts"),
+            "work_exceptions":     _Table(group=("project_id",)),
+            "settings":            _Table(unique=("key",)),
+            "banned_users":        _Table(unique=("project_id", "user_id")),
+            "cart_items":          _Table(unique=("project_id", "user_id", "product_id"),
+                                          group=("project_id", "user_id")),
+            "faq_entries":         _Table(group=("project_id",)),
+            "helper_entries":      _Table(unique=("project_id", "alias"),
+                                          group=("project_id",)),
+            "feedback_blocked":    _Table(unique=("project_id", "user_id")),
+            "feedback_messages":   _Table(group=("project_id", "user_id")),
+            "moderation_settings": _Table(unique=("project_id",)),
+            "link_whitelist":      _Table(unique=("project_id", "domain")),
+        }
+        # те же значения по умолчанию, что засевает миграция v1
+        with self.transaction():
+            for key, value in (("summary_enabled", "true"),
+                               ("summary_time", "07:00"),
+                               ("summary_timezone", "Europe/Bucharest")):
+                self._insert("settings", key=key, value=value)
+
+    # --- транзакции и примитивы записи ---------------------------------
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            if self._undo is not None:
+                yield self
+                return
+            self._undo = []
+            try:
+                yield self
+            except BaseException:
+                for undo in reversed(self._undo):
+                    undo()
+                raise
+            finally:
+                self._undo = None
+
+    def _insert(self, table: str, **values) -> int:
+        t = self.tables[table]
+        if t.unique and t.key(values, t.unique) in t.by_unique:
+            raise sqlite3.IntegrityError(
+                f"UNIQUE constraint failed: {table}.{', '.join(t.unique)}")
+        t.last_id += 1
+        row = {"id": t.last_id, **values}
+        t.add(row)
+        self._undo.append(lambda: t.discard(row["id"]))
+        return row["id"]
+
+    def _insert_or_ignore(self, table: str, **values) -> None:
+        t = self.tables[table]
+        if t.key(values, t.unique) not in t.by_unique:
+            self._insert(table, **values)
+
+    def _delete(self, table: str, rid: int) -> None:
+        t = self.tables[table]
+        if rid in t.rows:
+            row = t.discard(rid)
+            self._undo.append(lambda: t.add(row))
+
+    def _update(self, table: str, rid: int, **changes) -> None:
+        row = self.tables[table].rows.get(rid)
+        if row is None:
+            return
+        old = {k: row[k] for k in changes}
+        row.update(changes)
+        self._undo.append(lambda: row.update(old))
+
+    # --- проекты -------------------------------------------------------
+
+    def init_db(self, db_path=None):
+        pass
+
+    def create_project(self, project, conn=None):
+        with self.transaction():
+            return self._insert(
+                "projects",
+                name=project.name,
+                template_type=project.template_type,
+                description=project.description,
+                token=project.token,
+                content=json.dumps(project.content),
+            )
+
+    def update_project_content(self, project_id, content, conn=None):
+        with self.transaction():
+            self._update("projects", project_id, content=json.dumps(content))
+
+    def get_project_content(self, project_id, conn=None):
+        with self._lock:
+            row = self.tables["projects"].rows.get(project_id)
+            return json.loads(row["content"]) if row else None
+
+    def get_projects(self, project_id=None):
+        from app.database import PROJECT_FIELDS
+        if project_id is None:
+            return list(self.iter_projects(fields=PROJECT_FIELDS))
+        with self._lock:
+            row = self.tables["projects"].rows.get(project_id)
+            if row is None:
+                return None
+            return {**{f: row[f] for f in PROJECT_FIELDS}, "content": json.loads(row["content"])}
+
+    def iter_projects(self, after_id=0, limit=None, fields=None, template_type=None):
+        from app.database import PROJECT_FIELDS, PROJECT_LIST_FIELDS
+        if fields is None:
+            fields = PROJECT_LIST_FIELDS
+        cols = [f for f in PROJECT_FIELDS if f == "id" or f in fields]
+        t = self.tables["projects"]
+        with self._lock:
+            ids = t.ids if template_type is None else t.by_group.get((template_type,), [])
+            start = bisect.bisect_right(ids, after_id)
+            stop = None if limit is None else start + limit
+            rows = [t.rows[rid] for rid in ids[start:stop]]
+        for row in rows:
+            project = {c: row[c] for c in cols}
+            if "content" in project:
+                project["content"] = json.loads(project["content"])
+            yield project
+
+    def count_projects(self, template_type=None):
+        t = self.tables["projects"]
+        with self._lock:
+            if template_type is None:
+                return len(t.ids)
+            return len(t.by_group.get((template_type,), ()))
+
+    def get_project_ids(self, template_type=None):
+        t = self.tables["projects"]
+        with self._lock:
+            if template_type is None:
+                return list(t.ids)
+            return list(t.by_group.get((template_type,), ()))
+
+    # --- каталог -------------------------------------------------------
+
+    def get_products_list(self, project_id):
+        with self._lock:
+            return [
+                {"id": r["id"], "name": r["name"], "short_desc": r["short_desc"],
+                 "full_desc": r["full_desc"], "media": r["media_path"] or ""}
+                for r in self.tables["products"].group_rows(project_id)
+            ]
+
+    def add_product(self, project_id, name, short_desc, full_desc, media_path=""):
+        with self.transaction():
+            return self._insert("products", project_id=project_id, name=name,
+                                short_desc=short_desc, full_desc=full_desc,
+                                media_path=media_path)
+
+    def add_products_bulk(self, project_id, items, conn=None):
+        with self.transaction():
+            n = 0
+            for name, short_desc, full_desc, media_path in items:
+                self._insert("products", project_id=project_id, name=name,
+                             short_desc=short_desc, full_desc=full_desc,
+                             media_path=media_path)
+                n += 1
+            return n
+
+    def delete_product(self, project_id, product_id):
+        with self.transaction():
+            row = self.tables["products"].rows.get(product_id)
+            if row and row["project_id"] == project_id:
+                self._delete("products", product_id)
+
+    # --- брони ---------------------------------------------------------
+
+    def _insert_booking(self, project_id, user_id, service_id, start_dt,
+                        duration_cells, client_name, client_phone) -> int:
+        return self._insert(
+            "bookings", project_id=project_id, user_id=user_id, service_id=service_id,
+            start_dt=start_dt, duration_cells=duration_cells, client_name=client_name,
+            client_phone=client_phone, status="pending",
+            timestamp=datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+            start_ts=iso_epoch(start_dt),
+        )
+
+    def create_booking(self, project_id, user_id, service_id, start_dt,
+                       duration_cells, client_name, client_phone):
+        with self.transaction():
+            return self._insert_booking(project_id, user_id, service_id, start_dt,
+                                        duration_cells, client_name, client_phone)
+
+    def create_bookings_bulk(self, project_id, items, conn=None):
+        with self.transaction():
+            n = 0
+            for item in items:
+                self._insert_booking(project_id, *item)
+                n += 1
+            return n
+
+    def get_booking(self, booking_id):
+        with self._lock:
+            r = self.tables["bookings"].rows.get(booking_id)
+            if r is None:
+                return None
+            return {k: r[k] for k in ("project_id", "user_id", "service_id", "start_dt",
+                                      "duration_cells", "client_name", "client_phone",
+                                      "status")}
+
+    def update_booking_status(self, booking_id, status):
+        with self.transaction():
+            self._update("bookings", booking_id, status=status)
+
+    def get_bookings_by_date(self, project_id, date_str, status="confirmed"):
+        lo = iso_epoch(date_str)
+        if lo is None:
+            return []
+        with self._lock:
+            rows = self.tables["bookings"].range((project_id,), lo, lo + 86400)
+            return [
+                {k: r[k] for k in ("id", "user_id", "service_id", "start_dt",
+                                   "duration_cells", "client_name", "client_phone")}
+                for r in rows if r["status"] == status
+            ]
+
+    def get_confirmed_future_bookings(self, project_id):
+        now = iso_epoch(datetime.utcnow().isoformat())
+        with self._lock:
+            rows = self.tables["bookings"].range((project_id,), now + 1)
+            return [
+                {k: r[k] for k in ("id", "start_dt", "duration_cells", "service_id",
+                                   "client_name")}
+                for r in rows if r["status"] == "confirmed"
+            ]
+
+    def get_all_bookings(self, project_id):
+        with self._lock:
+            return [
+                {k: r[k] for k in ("id", "service_id", "start_dt", "client_name", "status")}
+                for r in self.tables["bookings"].group_rows(project_id)
+            ]
+
+    def cancel_bookings_in_interval(self, project_id, start_iso, end_iso):
+        lo, hi = iso_epoch(start_iso), iso_epoch(end_iso)
+        if lo is None or hi is None:
+            return []
+        with self.transaction():
+            rows = [r for r in self.tables["bookings"].range((project_id,), lo, hi)
+                    if r["status"] == "confirmed"]
+            for r in rows:
+                self._update("bookings", r["id"], status="cancelled_by_provider")
+            return [
+                {"id": r["id"], "user_id": r["user_id"], "service_id": r["service_id"],
+                 "start_dt": r["start_dt"]}
+                for r in rows
+            ]
+
+    # --- расписание ----------------------------------------------------
+
+    def add_work_interval(self, project_id, start_iso, end_iso):
+        with self.transaction():
+            self._insert("work_intervals", project_id=project_id, start_dt=start_iso,
+                         end_dt=end_iso, start_ts=iso_epoch(start_iso))
+
+    def add_work_intervals_bulk(self, project_id, items, conn=None):
+        with self.transaction():
+            n = 0
+            for start_iso, end_iso in items:
+                self._insert("work_intervals", project_id=project_id, start_dt=start_iso,
+                             end_dt=end_iso, start_ts=iso_epoch(start_iso))
+                n += 1
+            return n
+
+    def get_work_intervals(self, project_id, days_ahead):
+        now = datetime.utcnow()
+        lo = iso_epoch(now.isoformat())
+        hi = iso_epoch((now + timedelta(days=days_ahead)).isoformat())
+        with self._lock:
+            return [
+                {"id": r["id"], "start_dt": r["start_dt"], "end_dt": r["end_dt"]}
+                for r in self.tables["work_intervals"].range((project_id,), lo, hi)
+            ]
+
+    def delete_work_interval(self, interval_id):
+        with self.transaction():
+            self._delete("work_intervals", interval_id)
+
+    def add_work_exception(self, project_id, start_iso, end_iso, state):
+        from app.utils import exception_index
+        with self.transaction():
+            exception_id = self._insert("work_exceptions", project_id=project_id,
+                                        start_dt=start_iso, end_dt=end_iso, state=state)
+            self._bump_exceptions_rev(project_id)
+        exception_index.on_added(project_id, exception_id, start_iso, end_iso, state)
+        return exception_id
+
+    def get_planned_exceptions(self, project_id):
+        with self._lock:
+            return [
+                {"id": r["id"], "start_dt": r["start_dt"]}
+                for r in self.tables["work_exceptions"].group_rows(project_id)
+                if r["state"] == "planned"
+            ]
+
+    def _bump_exceptions_rev(self, project_id):
+        old = self._exceptions_rev.get(project_id, 0)
+        self._exceptions_rev[project_id] = old + 1
+        self._undo.append(lambda: self._exceptions_rev.__setitem__(project_id, old))
+
+    def get_exceptions_rev(self, project_id, db_path=None):
+        with self._lock:
+            return self._exceptions_rev.get(project_id, 0)
+
+    def get_open_exceptions(self, project_id, db_path=None):
+        with self._lock:
+            return [
+                (r["id"], r["start_dt"], r["end_dt"], r["state"])
+                for r in self.tables["work_exceptions"].group_rows(project_id)
+                if r["state"] in ("active", "planned")
+            ]
+
+    def activate_planned_exception(self, exception_id):
+        from app.utils import exception_index
+        with self.transaction():
+            self._update("work_exceptions", exception_id, state="active")
+            row = self.tables["work_exceptions"].rows.get(exception_id)
+            if row is not None:
+                self._bump_exceptions_rev(row["project_id"])
+        exception_index.on_activated(exception_id)
+        return (row["start_dt"], row["end_dt"]) if row else None
+
+    # --- слоты (app.utils.slots) ---------------------------------------
+
+    def _busy_bookings(self, project_id, lo, hi):
+        from app.utils.slots import BUSY_STATUSES, LOOKBACK_S
+        return [(r["start_ts"], r["duration_cells"])
+                for r in self.tables["bookings"].range((project_id,), lo - LOOKBACK_S, hi)
+                if r["status"] in BUSY_STATUSES]
+
+    def create_booking_safe(self, project_id, user_id, service_id, start_dt, duration_cells,
+                            client_name, client_phone, db_path=None, slot_size_min=None):
+        from app.utils import slots
+        slot_size_min = slot_size_min or slots.SLOT_SIZE_MIN
+        try:
+            start, end = slots._interval(start_dt, duration_cells, slot_size_min)
+        except ValueError:
+            raise ValueError(f"❗ Некорректное время: {start_dt}") from None
+        cell_s = slot_size_min * 60
+        with self.transaction():
+            for r in self.tables["work_exceptions"].group_rows(project_id):
+                ex_start, ex_end = iso_epoch(r["start_dt"]), iso_epoch(r["end_dt"])
+                if (r["state"] == "active" and ex_start is not None and ex_end is not None
+                        and ex_end > start and ex_start < end):
+                    raise ValueError("⛔ Слот заблокирован администратором")
+            if any(b_start + (cells or 0) * cell_s > start
+                   for b_start, cells in self._busy_bookings(project_id, start, end)):
+                raise ValueError("❌ Этот слот уже занят")
+            return self._insert_booking(project_id, user_id, service_id, start_dt,
+                                        duration_cells, client_name, client_phone)
+
+    def schedule_rows(self, project_id, lo, hi, db_path=None):
+        from app.utils.slot_grid import LOOKBACK_S
+        with self._lock:
+            intervals = [(r["start_ts"], iso_epoch(r["end_dt"]))
+                         for r in self.tables["work_intervals"].range(
+                             (project_id,), lo - LOOKBACK_S, hi)]
+            return intervals, self._busy_bookings(project_id, lo, hi)
+
+    # --- настройки и бан-лист ------------------------------------------
+
+    def get_setting(self, key):
+        with self._lock:
+            row = self.tables["settings"].find(key)
+            return row["value"] if row else None
+
+    def set_setting(self, key, value, conn=None):
+        with self.transaction():
+            row = self.tables["settings"].find(key)
+            if row:
+                self._update("settings", row["id"], value=value)
+            else:
+                self._insert("settings", key=key, value=value)
+
+    def ban_user(self, project_id, user_id):
+        with self.transaction():
+            self._insert_or_ignore("banned_users", project_id=project_id, user_id=user_id)
+
+    def is_banned(self, project_id, user_id):
+        with self._lock:
+            return self.tables["banned_users"].find(project_id, user_id) is not None
+
+    # --- корзина -------------------------------------------------------
+
+    def add_to_cart(self, project_id, user_id, product_id, quantity=1):
+        with self.transaction():
+            row = self.tables["cart_items"].find(project_id, user_id, product_id)
+            if row:
+                self._update("cart_items", row["id"], quantity=row["quantity"] + quantity)
+            else:
+                self._insert("cart_items", project_id=project_id, user_id=user_id,
+                             product_id=product_id, quantity=quantity)
+            return self.get_cart_items(project_id, user_id)
+
+    def get_cart_items(self, project_id, user_id):
+        with self._lock:
+            products = self.tables["products"].rows
+            return [
+                {"cart_id": ci["id"], "product_id": ci["product_id"],
+                 "quantity": ci["quantity"], "name": p["name"],
+                 "full_desc": p["full_desc"], "media": p["media_path"] or ""}
+                for ci in self.tables["cart_items"].group_rows(project_id, user_id)
+                if (p := products.get(ci["product_id"])) is not None
+            ]
+
+    def update_cart_item(self, cart_id, new_quantity):
+        if new_quantity <= 0:
+            return self.delete_cart_item(cart_id)
+        with self.transaction():
+            row = self.tables["cart_items"].rows.get(cart_id)
+            if row is None:
+                return []
+            self._update("cart_items", cart_id, quantity=new_quantity)
+            return self.get_cart_items(row["project_id"], row["user_id"])
+
+    def delete_cart_item(self, cart_id):
+        with self.transaction():
+            row = self.tables["cart_items"].rows.get(cart_id)
+            if row is None:
+                return []
+            self._delete("cart_items", cart_id)
+            return self.get_cart_items(row["project_id"], row["user_id"])
+
+    def clear_cart(self, project_id, user_id):
+        with self.transaction():
+            for ci in self.tables["cart_items"].group_rows(project_id, user_id):
+                self._delete("cart_items", ci["id"])
+            return []
+
+    # --- FAQ и helper-пасты --------------------------------------------
+
+    def get_faq_entries(self, project_id):
+        with self._lock:
+            return [
+                {"id": r["id"], "question": r["question"], "answer": r["answer"],
+                 "media": r["media_path"] or ""}
+                for r in self.tables["faq_entries"].group_rows(project_id)
+            ]
+
+    def add_faq_entry(self, project_id, question, answer, media_path=""):
+        with self.transaction():
+            return self._insert("faq_entries", project_id=project_id, question=question,
+                                answer=answer, media_path=media_path)
+
+    def add_faq_entries_bulk(self, project_id, items, conn=None):
+        with self.transaction():
+            n = 0
+            for question, answer, media_path in items:
+                self._insert("faq_entries", project_id=project_id, question=question,
+                             answer=answer, media_path=media_path)
+                n += 1
+            return n
+
+    def delete_faq_entry(self, project_id, entry_id):
+        with self.transaction():
+            row = self.tables["faq_entries"].rows.get(entry_id)
+            if row and row["project_id"] == project_id:
+                self._delete("faq_entries", entry_id)
+
+    def add_helper_entries_bulk(self, project_id, items, conn=None):
+        with self.transaction():
+            n = 0
+            for alias, content, media_path, admin_only in items:
+                self._insert("helper_entries", project_id=project_id, alias=alias,
+                             content=content, media_path=media_path, admin_only=admin_only)
+                n += 1
+            return n
+
+    # --- feedback- и moderator-боты (то, что пишет засев) ---------------
+
+    def block_users_bulk(self, project_id, user_ids, conn=None):
+        with self.transaction():
+            for uid in user_ids:
+                self._insert_or_ignore("feedback_blocked", project_id=project_id, user_id=uid)
+
+    def log_feedback_bulk(self, project_id, messages, conn=None):
+        ts = int(time.time())
+        with self.transaction():
+            n = 0
+            for uid, direction, text in messages:
+                self._insert("feedback_messages", project_id=project_id, user_id=uid,
+                             direction=direction, text=text, ts=ts)
+                n += 1
+            return n
+
+    def set_moderation_settings(self, project_id, values, conn=None):
+        from app.utils.moderation import SETTING_KEYS
+        changes = {k: values[k] for k in SETTING_KEYS if k in values}
+        if not changes:
+            return
+        with self.transaction():
+            row = self.tables["moderation_settings"].find(project_id)
+            if row:
+                self._update("moderation_settings", row["id"], **changes)
+            else:
+                self._insert("moderation_settings", project_id=project_id,
+                             **{"allow_media": 0, "allow_stickers": 0, "censor_enabled": 1,
+                                "flood_max": 3, "flood_window_s": 600, **changes})
+
+    def whitelist_add_bulk(self, project_id, domains, conn=None):
+        with self.transaction():
+            for domain in domains:
+                self._insert_or_ignore("link_whitelist", project_id=project_id, domain=domain)
+
+
+# --- выбор движка ------------------------------------------------------
+
+ENGINES = {"sqlite": SQLiteEngine, "memory": MemoryEngine}
+
+_sqlite = SQLiteEngine()
+_engine: StorageEngine | None = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> StorageEngine:
+    """Активный движок; при первом обращении — из STORAGE_ENGINE (по умолчанию sqlite)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                name = os.getenv("STORAGE_ENGINE", "sqlite")
+                _engine = _sqlite if name == "sqlite" else ENGINES[name]()
+    return _engine
+
+
+def set_engine(engine: StorageEngine | str) -> StorageEngine | None:
+    """
+    Делает engine (экземпляр или имя из ENGINES) активным и возвращает
+    прежний. Движок без части методов контракта не принимается.
+    """
+    global _engine
+    if isinstance(engine, str):
+        engine = _sqlite if engine == "sqlite" else ENGINES[engine]()
+    missing = engine.missing()
+    if missing:
+        raise TypeError(f"Движок {engine.name} не реализует: {', '.join(missing)}")
+    with _engine_lock:
+        previous, _engine = _engine, engine
+    # индекс исключений читается через движок — построенный по прежнему не годится
+    from app.utils import exception_index
+    exception_index.invalidate()
+    return previous
+
+
+def contract() -> list[str]:
+    """
+    Имена функций, которые обязан реализовать движок: @engine_backed
+    из app.database и app.utils.slots.
+    """
+    return sorted(_sqlite_impl)
+
+
+def transaction():
+    """Транзакция активного движка; её conn передаётся в функции app.database."""
+    return get_engine().transaction()
+
+
+@contextmanager
+def joined_transaction(conn=None):
+    """Как db_safe.joined_transaction, но для активного движка."""
+    if conn is not None:
+        yield conn
+        return
+    with get_engine().transaction() as own:
+        yield own
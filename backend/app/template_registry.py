@@ -0,0 +1,64 @@
+# app/template_registry.py
+"""
+Долгоживущие Jinja-окружения по типам шаблонов.
+Шаблоны компилируются один раз (байткод кладётся в .jinja_cache/),
+при изменении *.j2 на диске перечитываются по mtime (auto_reload).
+"""
+
+from pathlib import Path
+from threading import Lock
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+BASE_DIR = Path(__file__).resolve().parent
+TEMPLATES_DIR = BASE_DIR / "templates"
+BYTECODE_CACHE_DIR = BASE_DIR / ".jinja_cache"
+
+_environments: dict[str, Environment] = {}
+_lock = Lock()
+_bytecode_cache: FileSystemBytecodeCache | None = None
+
+
+def _get_bytecode_cache() -> FileSystemBytecodeCache:
+    global _bytecode_cache
+    if _bytecode_cache is None:
+        BYTECODE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        _bytecode_cache = FileSystemBytecodeCache(str(BYTECODE_CACHE_DIR))
+    return _bytecode_cache
+
+
+def get_environment(template_type: str) -> Environment:
+    """Возвращает (и при первом обращении создаёт) окружение для шаблона."""
+    env = _environments.get(template_type)
+    if env is not None:
+        return env
+    with _lock:
+        env = _environments.get(template_type)
+        if env is None:
+            env = Environment(
+                loader=FileSystemLoader(str(TEMPLATES_DIR / template_type)),
+                bytecode_cache=_get_bytecode_cache(),
+                auto_reload=True,
+            )
+            _environments[template_type] = env
+    return env
+
+
+def list_template_names(template_type: str) -> list[str]:
+    """Имена всех *.j2 шаблона в стабильном порядке."""
+    return get_environment(template_type).list_templates(extensions=["j2"])
+
+
+def preload_templates() -> int:
+    """
+    Компилирует все шаблоны из app/templates/* при старте приложения.
+    Синтаксические ошибки всплывают здесь, а не на первом экспорте.
+    Возвращает число скомпилированных шаблонов.
+    """
+    count = 0
+    for tpl_dir in sorted(p for p in TEMPLATES_DIR.iterdir() if p.is_dir()):
+        env = get_environment(tpl_dir.name)
+        for name in list_template_names(tpl_dir.name):
+            env.get_template(name)
+            count += 1
+    return count
@@ -9,6 +9,13 @@ conn.row_factory = sqlite3.Row
 cur = conn.cursor()
 cur.execute("PRAGMA foreign_keys = ON")
 
+# start_ts — начало брони в секундах эпохи: виртуальная колонка по date+time
+# с индексом, чтобы выборки по дате/интервалу шли диапазоном [от, до)
+_START_TS_COL = ("start_ts INTEGER GENERATED ALWAYS AS "
+                 "(CAST(strftime('%s', date || ' ' || time) AS INTEGER)) VIRTUAL")
+_TS = "CAST(strftime('%s', ?) AS INTEGER)"
+_TS_NEXT_DAY = "CAST(strftime('%s', ?, '+1 day') AS INTEGER)"
+
 def init_db():
     """Инициализировать таблицы для бота бронирования."""
     cur.execute("""
@@ -38,7 +45,7 @@ def init_db():
             end        TEXT
         )
     """)
-    cur.execute("""
+    cur.execute(f"""
         CREATE TABLE IF NOT EXISTS bookings (
             id         INTEGER PRIMARY KEY AUTOINCREMENT,
             project_id INTEGER,
@@ -48,6 +55,7 @@ def init_db():
             date       TEXT,
             time       TEXT,
             details    TEXT,
+            {_START_TS_COL},
             UNIQUE(project_id, slot_id),
             FOREIGN KEY(slot_id) REFERENCES work_intervals(id)
         )
@@ -67,6 +75,11 @@ def init_db():
             PRIMARY KEY(project_id, key)
         )
     """)
+    # старые БД получают start_ts через ALTER
+    cols = [r["name"] for r in cur.execute("PRAGMA table_xinfo(bookings)").fetchall()]
+    if "start_ts" not in cols:
+        cur.execute(f"ALTER TABLE bookings ADD COLUMN {_START_TS_COL}")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_bookings_ts ON bookings(project_id, start_ts)")
     conn.commit()
 
 def safe_execute(query: str, params: tuple = ()):
@@ -130,7 +143,7 @@ def delete_work_interval(project_id: int, date: str, time: str):
     slot = safe_execute("SELECT id FROM work_intervals WHERE project_id=? AND date=? AND time=?", (project_id, date, time))
     if slot and len(slot) > 0:
         slot_id = slot[0]["id"]
-        cancel_bookings_in_interval(project_id, date + " " + time, date + " " + time)
+        safe_execute("DELETE FROM bookings WHERE project_id=? AND slot_id=?", (project_id, slot_id))
         safe_execute("DELETE FROM work_intervals WHERE project_id=? AND id=?", (project_id, slot_id))
         return True
     return False
@@ -143,9 +156,9 @@ def add_work_exception(project_id: int, start: str, end: str):
     )
 
 def cancel_bookings_in_interval(project_id: int, start: str, end: str):
-    """Отменить (удалить) все брони в заданном интервале времени [start, end]."""
+    """Отменить (удалить) все брони в заданном интервале времени [start, end)."""
     return safe_execute(
-        "DELETE FROM bookings WHERE project_id=? AND (date || ' ' || time) >= ? AND (date || ' ' || time) <= ?",
+        f"DELETE FROM bookings WHERE project_id=? AND start_ts>={_TS} AND start_ts<{_TS}",
         (project_id, start, end)
     )
 
@@ -159,7 +172,7 @@ def get_confirmed_future_bookings(project_id: int):
     import datetime
     now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
     res = safe_execute(
-        "SELECT * FROM bookings WHERE project_id=? AND (date || ' ' || time) >= ?",
+        f"SELECT * FROM bookings WHERE project_id=? AND start_ts>={_TS}",
         (project_id, now)
     )
     return res if res is not None else []
@@ -210,7 +223,10 @@ def get_booking(booking_id: int):
 
 def get_bookings_by_date(project_id: int, date: str):
     """Получить все брони на указанную дату."""
-    res = safe_execute("SELECT * FROM bookings WHERE project_id=? AND date=?", (project_id, date))
+    res = safe_execute(
+        f"SELECT * FROM bookings WHERE project_id=? AND start_ts>={_TS} AND start_ts<{_TS_NEXT_DAY}",
+        (project_id, date, date)
+    )
     return res if res is not None else []
 
 def get_all_clients(project_id: int):
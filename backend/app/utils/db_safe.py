@@ -1,12 +1,317 @@
 # app/utils/db_safe.py
 
+import bisect
+import logging
+import os
+import re
 import sqlite3
+import threading
+import time
+from functools import lru_cache
 from pathlib import Path
 from contextlib import contextmanager
 
 # Путь к файлу базы данных (при необходимости скорректируйте)
 DB_PATH = Path(__file__).resolve().parent.parent / "database.db"
 
+# Сколько простаивающих соединений держать на один файл БД
+# (0 — пул выключен: соединение на каждый вызов, как раньше)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 8))
+# Сколько ждать чужую блокировку записи, прежде чем отдать «database is locked»
+BUSY_TIMEOUT_MS = 5000
+# Размер кэша подготовленных выражений на соединение
+STATEMENT_CACHE_SIZE = 256
+# WAL: читатели не ждут писателя; NORMAL в WAL не теряет целостность,
+# fsync делается на чекпойнтах, а не на каждом коммите
+JOURNAL_MODE = "WAL"
+SYNCHRONOUS = "NORMAL"
+
+# --- инструментирование SQL ---------------------------------------------
+# Выключено по умолчанию: соединения — обычные sqlite3.Connection, замеров нет.
+# DB_METRICS=1 (или enable_metrics()) — соединения, которые замеряют каждое
+# выражение: гистограмма времени и число строк по нормализованному SQL,
+# ожидание блокировки записи в transaction(), лог медленных запросов.
+METRICS_ENABLED = os.getenv("DB_METRICS", "0") == "1"
+# Порог медленного запроса (мс): такие попадают в лог app.sql.slow
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 200))
+# Верхние границы корзин гистограмм, секунды
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+slow_log = logging.getLogger("app.sql.slow")
+
+
+class Histogram:
+    """Счётчики по корзинам LATENCY_BUCKETS (не накопительные) + сумма и число."""
+    __slots__ = ("buckets", "count", "sum", "rows")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)     # последняя — +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.rows = 0
+
+    def observe(self, seconds: float) -> None:
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+
+_metrics_lock = threading.Lock()
+_statements: dict[str, Histogram] = {}
+_lock_wait = Histogram()
+_lock_timeouts = 0
+
+_SQL_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SQL_PLACEHOLDERS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SQL_SPACES = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql: str) -> str:
+    """Ключ запроса: литералы → ?, списки (?,?,…) → (?), пробелы схлопнуты."""
+    sql = _SQL_LITERAL.sub("?", sql)
+    sql = _SQL_PLACEHOLDERS.sub("(?)", sql)
+    return _SQL_SPACES.sub(" ", sql).strip().rstrip(";")
+
+
+def _observe(sql: str, seconds: float, rows: int = 0) -> None:
+    key = normalize_sql(sql)
+    with _metrics_lock:
+        hist = _statements.get(key)
+        if hist is None:
+            hist = _statements[key] = Histogram()
+        hist.observe(seconds)
+        if rows > 0:
+            hist.rows += rows
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        slow_log.warning("медленный запрос %.1f мс, строк %d: %s",
+                         seconds * 1000, max(rows, 0), key)
+
+
+def _count_rows(sql: str, rows: int) -> None:
+    key = normalize_sql(sql)
+    with _metrics_lock:
+        hist = _statements.get(key)
+        if hist is not None:
+            hist.rows += rows
+
+
+class _TimedCursor(sqlite3.Cursor):
+    """Курсор, который замеряет execute/executemany и считает прочитанные строки."""
+
+    _sql = ""
+
+    def execute(self, sql, parameters=()):
+        self._sql = sql
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _observe(sql, time.perf_counter() - started, self.rowcount)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._sql = sql
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _observe(sql, time.perf_counter() - started, self.rowcount)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            _count_rows(self._sql, 1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        _count_rows(self._sql, len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        _count_rows(self._sql, len(rows))
+        return rows
+
+
+class _TimedConnection(sqlite3.Connection):
+    """Соединение, чьи execute/executemany/commit идут через _TimedCursor."""
+
+    def execute(self, sql, parameters=()):
+        return self.cursor(_TimedCursor).execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor(_TimedCursor).executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            _observe("COMMIT", time.perf_counter() - started)
+
+
+def enable_metrics(enabled: bool = True) -> None:
+    """
+    Включает/выключает замеры. Простаивающие соединения закрываются,
+    чтобы новые создавались уже нужного класса.
+    """
+    global METRICS_ENABLED
+    METRICS_ENABLED = enabled
+    close_pool()
+
+
+def metrics_snapshot() -> dict:
+    """Копия накопленных замеров (для /metrics и отладки)."""
+    def dump(h: Histogram) -> dict:
+        return {"buckets": list(h.buckets), "count": h.count, "sum": h.sum, "rows": h.rows}
+    with _metrics_lock:
+        return {
+            "enabled":       METRICS_ENABLED,
+            "statements":    {sql: dump(h) for sql, h in _statements.items()},
+            "lock_wait":     dump(_lock_wait),
+            "lock_timeouts": _lock_timeouts,
+        }
+
+
+def reset_metrics() -> None:
+    global _lock_wait, _lock_timeouts
+    with _metrics_lock:
+        _statements.clear()
+        _lock_wait = Histogram()
+        _lock_timeouts = 0
+
+
+def _begin_immediate(conn: sqlite3.Connection) -> None:
+    """BEGIN IMMEDIATE; при включённых замерах — с учётом ожидания блокировки."""
+    if not METRICS_ENABLED:
+        conn.execute("BEGIN IMMEDIATE;")
+        return
+    global _lock_timeouts
+    started = time.perf_counter()
+    try:
+        conn.execute("BEGIN IMMEDIATE;")
+    except sqlite3.OperationalError:
+        with _metrics_lock:
+            _lock_timeouts += 1
+        raise
+    waited = time.perf_counter() - started
+    with _metrics_lock:
+        _lock_wait.observe(waited)
+    if waited * 1000 >= SLOW_QUERY_MS:
+        slow_log.warning("ожидание блокировки записи %.1f мс", waited * 1000)
+
+
+# Запрос только читает: SELECT или WITH … SELECT без изменяющих слов
+_READ_PREFIX = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_WRITE_WORD = re.compile(r"\b(INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+
+
+def is_read_only(sql: str) -> bool:
+    """True, если выражение можно выполнить на read-only соединении."""
+    if not _READ_PREFIX.match(sql):
+        return False
+    return not (sql.lstrip()[:4].upper() == "WITH" and _WRITE_WORD.search(sql))
+
+
+class ConnectionPool:
+    """
+    Пул соединений к одному файлу SQLite.
+    Соединение выдаётся в монопольное пользование на время одного
+    transaction()/safe_execute() — то есть одному потоку/задаче за раз —
+    и затем возвращается в пул вместе со своим кэшем выражений и страниц.
+    PRAGMA применяются один раз, при создании соединения.
+    readonly=True — пул соединений mode=ro для запросов на чтение.
+    """
+
+    def __init__(self, db_path: Path | str, size: int = POOL_SIZE,
+                 readonly: bool = False):
+        self.db_path = str(db_path)
+        self.size = size
+        self.readonly = readonly
+        self._idle: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.readonly:
+            # файл должен существовать и уже быть в WAL — это делает пул записи
+            get_pool(self.db_path).release(get_pool(self.db_path).acquire())
+            target, uri = f"{Path(self.db_path).as_uri()}?mode=ro", True
+        else:
+            target, uri = self.db_path, False
+        conn = sqlite3.connect(
+            target,
+            uri=uri,
+            factory=_TimedConnection if METRICS_ENABLED else sqlite3.Connection,
+            check_same_thread=False,        # соединение переходит между потоками пула
+            isolation_level=None,           # транзакциями управляем сами
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        if not self.readonly:
+            # journal_mode хранится в самом файле, synchronous — в соединении
+            conn.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+            conn.execute(f"PRAGMA synchronous={SYNCHRONOUS}")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()     # LIFO: самое «тёплое» соединение
+        return self._connect()
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pools: dict[tuple[str, bool], ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: Path | str = DB_PATH, readonly: bool = False) -> ConnectionPool:
+    """Возвращает (и при первом обращении создаёт) пул для файла БД."""
+    key = (os.path.abspath(db_path), readonly)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(key, ConnectionPool(key[0], readonly=readonly))
+    return pool
+
+
+def close_pool(db_path: Path | str | None = None) -> None:
+    """
+    Закрывает простаивающие соединения пула db_path (или всех пулов).
+    Нужно, например, перед удалением или подменой файла БД.
+    """
+    with _pools_lock:
+        if db_path is None:
+            pools = list(_pools.values())
+            _pools.clear()
+        else:
+            path = os.path.abspath(db_path)
+            pools = [p for p in (_pools.pop((path, True), None),
+                                 _pools.pop((path, False), None)) if p]
+    for pool in pools:
+        pool.close()
+
+
 @contextmanager
 def transaction(db_path: Path | str = DB_PATH):
     """
@@ -14,17 +319,49 @@ def transaction(db_path: Path | str = DB_PATH):
     - BEGIN IMMEDIATE: блокировка БД на запись
     - commit при успешном выходе
     - rollback при ошибке
+    Соединение берётся из пула и после выхода возвращается в него.
     """
-    conn = sqlite3.connect(str(db_path))
+    pool = get_pool(db_path)
+    conn = pool.acquire()
     try:
-        conn.execute("BEGIN IMMEDIATE;")
+        _begin_immediate(conn)
         yield conn
         conn.commit()
     except:
         conn.rollback()
         raise
     finally:
-        conn.close()
+        pool.release(conn)
+
+@contextmanager
+def joined_transaction(conn: sqlite3.Connection | None = None,
+                       db_path: Path | str = DB_PATH):
+    """
+    Транзакция для функций с необязательным conn: если conn передан,
+    работаем внутри транзакции вызывающего (commit/rollback — его забота),
+    иначе открываем свою через transaction().
+    """
+    if conn is not None:
+        yield conn
+        return
+    with transaction(db_path) as own:
+        yield own
+
+@contextmanager
+def read_transaction(db_path: Path | str = DB_PATH):
+    """
+    Контекст-менеджер для чтения:
+    - read-only соединение из отдельного пула
+    - BEGIN (DEFERRED): согласованный снимок без блокировки записи;
+      в WAL читатели не мешают писателю и друг другу
+    """
+    pool = get_pool(db_path, readonly=True)
+    conn = pool.acquire()
+    try:
+        conn.execute("BEGIN;")
+        yield conn
+    finally:
+        pool.release(conn)              # release откатит открытую транзакцию
 
 def safe_execute(
     sql: str,
@@ -33,8 +370,28 @@ def safe_execute(
 ) -> list[tuple]:
     """
     Выполняет произвольный SQL в рамках транзакции и возвращает результаты.
-    Использует transaction() для защиты от гонок и неконсистентности.
+    Чтение (SELECT) идёт через read_transaction(), всё остальное —
+    через transaction() с блокировкой на запись.
     """
+    if is_read_only(sql):
+        with read_transaction(db_path) as conn:
+            return conn.execute(sql, params).fetchall()
     with transaction(db_path) as conn:
         cur = conn.execute(sql, params)
         return cur.fetchall()
+
+def iter_execute(
+    sql: str,
+    params: tuple = (),
+    db_path: Path | str = DB_PATH,
+    batch_size: int = 256
+):
+    """
+    Как safe_execute для SELECT, но отдаёт строки по мере чтения
+    (fetchmany по batch_size), не собирая весь результат в список.
+    Соединение занято, пока генератор не исчерпан или не закрыт.
+    """
+    with read_transaction(db_path) as conn:
+        cur = conn.execute(sql, params)
+        while rows := cur.fetchmany(batch_size):
+            yield from rows
@@ -5,9 +5,18 @@ from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime, timedelta
 
+from .slot_grid import LOOKBACK_S, day_epoch, fitting_starts, free_cells, parse_day, slot_names
+
 DB_PATH = Path(__file__).resolve().parent / "database.db"
 SLOT_SIZE_MIN = 15  # минута «ячейки» для Smart-Booking
 
+# start_ts — время начала в секундах эпохи: виртуальная колонка по start_dt
+# с индексом, чтобы выборки по дате/интервалу шли диапазоном [от, до)
+_START_TS_COL = ("start_ts INTEGER GENERATED ALWAYS AS "
+                 "(CAST(strftime('%s', start_dt) AS INTEGER)) VIRTUAL")
+_TS = "CAST(strftime('%s', ?) AS INTEGER)"
+_TS_NEXT_DAY = "CAST(strftime('%s', ?, '+1 day') AS INTEGER)"
+
 @contextmanager
 def _conn():
     conn = sqlite3.connect(DB_PATH)
@@ -137,7 +146,7 @@ def init_db():
             duration_cells INTEGER,
             price REAL
         )""")
-        db.execute("""
+        db.execute(f"""
         CREATE TABLE IF NOT EXISTS bookings (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             project_id INTEGER,
@@ -148,14 +157,16 @@ def init_db():
             client_name TEXT,
             client_phone TEXT,
             status TEXT DEFAULT 'pending',
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            {_START_TS_COL}
         )""")
-        db.execute("""
+        db.execute(f"""
         CREATE TABLE IF NOT EXISTS work_intervals (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             project_id INTEGER,
             start_dt TEXT,
-            end_dt TEXT
+            end_dt TEXT,
+            {_START_TS_COL}
         )""")
         db.execute("""
         CREATE TABLE IF NOT EXISTS work_exceptions (
@@ -165,6 +176,22 @@ def init_db():
             end_dt TEXT,
             status TEXT
         )""")
+        # --- уведомления к отправке (utils/outbox.py); пишутся в одной
+        #     транзакции с изменением, о котором сообщают ---
+        db.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER,
+            user_id INTEGER,
+            text TEXT,
+            batch TEXT,
+            state TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            next_ts INTEGER DEFAULT 0,
+            last_error TEXT
+        )""")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(state, next_ts)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_outbox_batch ON outbox(batch, state)")
         # --- Settings (для SmartBooking summary) ---
         db.execute("""
         CREATE TABLE IF NOT EXISTS settings (
@@ -181,6 +208,32 @@ def init_db():
             text TEXT,
             options_json TEXT
         )""")
+        # --- индексы по start_ts (старые БД получают колонку через ALTER) ---
+        for table in ("bookings", "work_intervals"):
+            cols = [r["name"] for r in db.execute(f"PRAGMA table_xinfo({table})")]
+            if "start_ts" not in cols:
+                db.execute(f"ALTER TABLE {table} ADD COLUMN {_START_TS_COL}")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_bookings_status_ts "
+                   "ON bookings(project_id, status, start_ts)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_work_intervals_ts "
+                   "ON work_intervals(project_id, start_ts)")
+        # --- корзина: одна позиция на (проект, пользователь, товар) под UPSERT;
+        #     дубли из старых версий склеиваем в позицию с меньшим id ---
+        if not db.execute("SELECT 1 FROM sqlite_master WHERE type='index' "
+                          "AND name='uq_cart_items_user_product'").fetchone():
+            db.execute("""
+            UPDATE cart_items SET quantity = (
+                SELECT SUM(d.quantity) FROM cart_items d
+                 WHERE d.project_id=cart_items.project_id
+                   AND d.user_id=cart_items.user_id
+                   AND d.product_id=cart_items.product_id)
+             WHERE id IN (SELECT MIN(id) FROM cart_items
+                           GROUP BY project_id, user_id, product_id HAVING COUNT(*) > 1)""")
+            db.execute("""
+            DELETE FROM cart_items WHERE id NOT IN (
+                SELECT MIN(id) FROM cart_items GROUP BY project_id, user_id, product_id)""")
+            db.execute("CREATE UNIQUE INDEX uq_cart_items_user_product "
+                       "ON cart_items(project_id, user_id, product_id)")
 
 # ----------------------------------------------------------------------------
 # 1) OrderBot CRUD
@@ -216,55 +269,61 @@ def delete_product(project_id: int, product_id: int):
             (project_id, product_id)
         )
 
+_CART_SQL = (
+    "SELECT ci.id AS cart_id, ci.product_id, ci.quantity, "
+    "       p.name, p.full_desc, p.media_path "
+    "FROM cart_items ci "
+    "JOIN products p ON p.id=ci.product_id "
+    "WHERE ci.project_id=? AND ci.user_id=? ORDER BY ci.id"
+)
+
+def _cart(db, project_id: int, user_id: int):
+    return [
+        {"cart_id": r["cart_id"], "product_id": r["product_id"],
+         "quantity": r["quantity"], "name": r["name"],
+         "full_desc": r["full_desc"], "media": r["media_path"] or ""}
+        for r in db.execute(_CART_SQL, (project_id, user_id)).fetchall()
+    ]
+
 def add_to_cart(project_id: int, user_id: int, product_id: int, quantity: int = 1):
+    """UPSERT позиции (без гонки SELECT→INSERT); возвращает корзину."""
     with _conn() as db:
-        row = db.execute(
-            "SELECT id,quantity FROM cart_items "
-            "WHERE project_id=? AND user_id=? AND product_id=?",
-            (project_id, user_id, product_id)
-        ).fetchone()
-        if row:
-            db.execute(
-                "UPDATE cart_items SET quantity=? WHERE id=?",
-                (row["quantity"]+quantity, row["id"])
-            )
-        else:
-            db.execute(
-                "INSERT INTO cart_items(project_id,user_id,product_id,quantity) "
-                "VALUES(?,?,?,?)",
-                (project_id, user_id, product_id, quantity)
-            )
+        db.execute(
+            "INSERT INTO cart_items(project_id,user_id,product_id,quantity) "
+            "VALUES(?,?,?,?) "
+            "ON CONFLICT(project_id,user_id,product_id) "
+            "DO UPDATE SET quantity=quantity+excluded.quantity",
+            (project_id, user_id, product_id, quantity)
+        )
+        return _cart(db, project_id, user_id)
 
 def get_cart_items(project_id: int, user_id: int):
     with _conn() as db:
-        cur = db.execute(
-            "SELECT ci.id AS cart_id, ci.product_id, ci.quantity, "
-            "       p.name, p.full_desc, p.media_path "
-            "FROM cart_items ci "
-            "JOIN products p ON p.id=ci.product_id "
-            "WHERE ci.project_id=? AND ci.user_id=? ORDER BY ci.id",
-            (project_id, user_id)
-        )
-        return [
-            {"cart_id": r["cart_id"], "product_id": r["product_id"],
-             "quantity": r["quantity"], "name": r["name"],
-             "full_desc": r["full_desc"], "media": r["media_path"] or ""}
-            for r in cur.fetchall()
-        ]
+        return _cart(db, project_id, user_id)
 
 def update_cart_item(cart_id: int, new_qty: int):
+    """Количество (0 — удалить позицию); возвращает корзину владельца."""
     with _conn() as db:
         if new_qty > 0:
-            db.execute(
-                "UPDATE cart_items SET quantity=? WHERE id=?",
+            owner = db.execute(
+                "UPDATE cart_items SET quantity=? WHERE id=? "
+                "RETURNING project_id,user_id",
                 (new_qty, cart_id)
-            )
+            ).fetchone()
         else:
-            db.execute("DELETE FROM cart_items WHERE id=?", (cart_id,))
+            owner = db.execute(
+                "DELETE FROM cart_items WHERE id=? RETURNING project_id,user_id",
+                (cart_id,)
+            ).fetchone()
+        return _cart(db, *owner) if owner else []
 
 def delete_cart_item(cart_id: int):
     with _conn() as db:
-        db.execute("DELETE FROM cart_items WHERE id=?", (cart_id,))
+        owner = db.execute(
+            "DELETE FROM cart_items WHERE id=? RETURNING project_id,user_id",
+            (cart_id,)
+        ).fetchone()
+        return _cart(db, *owner) if owner else []
 
 def clear_cart(project_id: int, user_id: int):
     with _conn() as db:
@@ -272,6 +331,7 @@ def clear_cart(project_id: int, user_id: int):
             "DELETE FROM cart_items WHERE project_id=? AND user_id=?",
             (project_id, user_id)
         )
+        return []
 
 def save_order(o: dict):
     with _conn() as db:
@@ -461,8 +521,8 @@ def get_bookings_by_date(project_id: int, date_str: str, status: str="pending"):
             for r in db.execute(
                 "SELECT id,user_id,service_id,start_dt,duration_cells,client_name,client_phone "
                 "FROM bookings WHERE project_id=? AND status=? AND "
-                "substr(start_dt,1,10)=? ORDER BY start_dt",
-                (project_id, status, date_str)
+                f"start_ts>={_TS} AND start_ts<{_TS_NEXT_DAY} ORDER BY start_ts",
+                (project_id, status, date_str, date_str)
             ).fetchall()
         ]
 
@@ -482,7 +542,7 @@ def get_confirmed_future_bookings(project_id: int):
              "service_id": r["service_id"], "client_name": r["client_name"]}
             for r in db.execute(
                 "SELECT id,start_dt,duration_cells,service_id,client_name "
-                "FROM bookings WHERE project_id=? AND status='confirmed' AND start_dt>? ",
+                f"FROM bookings WHERE project_id=? AND status='confirmed' AND start_ts>{_TS}",
                 (project_id, cutoff)
             ).fetchall()
         ]
@@ -501,7 +561,7 @@ def get_work_intervals(project_id: int):
             {"id": r["id"], "start_dt": r["start_dt"], "end_dt": r["end_dt"]}
             for r in db.execute(
                 "SELECT id,start_dt,end_dt FROM work_intervals "
-                "WHERE project_id=? ORDER BY start_dt",
+                "WHERE project_id=? ORDER BY start_ts",
                 (project_id,)
             ).fetchall()
         ]
@@ -530,18 +590,74 @@ def get_planned_exceptions(project_id: int):
             ).fetchall()
         ]
 
-def cancel_bookings_in_interval(project_id: int, start_dt: str, end_dt: str):
+def activate_planned_exception(exception_id: int):
     with _conn() as db:
-        affected = db.execute(
-            "SELECT id FROM bookings WHERE project_id=? AND start_dt>=? AND start_dt<=? AND status='confirmed'",
-            (project_id, start_dt, end_dt)
-        ).fetchall()
         db.execute(
-            "UPDATE bookings SET status='cancelled_by_provider' "
-            "WHERE project_id=? AND start_dt>=? AND start_dt<=? AND status='confirmed'",
-            (project_id, start_dt, end_dt)
+            "UPDATE work_exceptions SET status='active' WHERE id=? AND status='planned'",
+            (exception_id,)
         )
-        return [r["id"] for r in affected]
+
+def cancel_bookings_in_interval(project_id: int, start_dt: str, end_dt: str,
+                                message: str | None = None, batch: str = ""):
+    """
+    Отменяет брони (pending/confirmed), пересекающиеся с [start_dt, end_dt),
+    одним UPDATE … RETURNING. Если задан message — в той же транзакции
+    кладёт каждому клиенту уведомление в outbox: message.format(**бронь),
+    с меткой batch для сводки. Возвращает отменённые брони.
+    """
+    with _conn() as db:
+        rows = db.execute(
+            "UPDATE bookings SET status='cancelled_by_provider' "
+            "WHERE project_id=? AND status IN ('pending','confirmed') "
+            # кандидаты по индексу: начались не раньше чем за сутки до окна
+            f"AND start_ts>={_TS}-86400 AND start_ts<{_TS} "
+            f"AND start_ts + COALESCE(duration_cells, 1)*?>{_TS} "
+            "RETURNING id,user_id,service_id,start_dt",
+            (project_id, start_dt, end_dt, SLOT_SIZE_MIN * 60, start_dt)
+        ).fetchall()
+        cancelled = [dict(r) for r in rows]
+        if message is not None:
+            db.executemany(
+                "INSERT INTO outbox(project_id,user_id,text,batch) VALUES(?,?,?,?)",
+                [(project_id, b["user_id"], message.format(**b), batch) for b in cancelled]
+            )
+        return cancelled
+
+def find_free_slots(project_id: int, date_str: str, duration_cells: int,
+                    days: int = 1, slot_size_min: int = SLOT_SIZE_MIN) -> list[str]:
+    """
+    Начала, куда помещается услуга длиной duration_cells ячеек, на days
+    дней от date_str ('YYYYMMDD' или 'YYYY-MM-DD'). Три запроса на весь
+    диапазон (окна работы, брони pending/confirmed, активные исключения),
+    дальше — битовая карта ячеек из slot_grid.py.
+    Возвращает 'YYYYMMDD_HHMM' по возрастанию.
+    """
+    day = parse_day(date_str)
+    lo = day_epoch(day)
+    hi = lo + days * 86400
+    cell_s = slot_size_min * 60
+    with _conn() as db:
+        intervals = db.execute(
+            "SELECT start_ts, CAST(strftime('%s', end_dt) AS INTEGER) FROM work_intervals "
+            "WHERE project_id=? AND start_ts>=? AND start_ts<?",
+            (project_id, lo - LOOKBACK_S, hi)
+        ).fetchall()
+        bookings = db.execute(
+            "SELECT start_ts, duration_cells FROM bookings "
+            "WHERE project_id=? AND status IN ('pending','confirmed') "
+            "AND start_ts>=? AND start_ts<?",
+            (project_id, lo - LOOKBACK_S, hi)
+        ).fetchall()
+        exceptions = db.execute(
+            "SELECT CAST(strftime('%s', start_dt) AS INTEGER), "
+            "       CAST(strftime('%s', end_dt) AS INTEGER) FROM work_exceptions "
+            "WHERE project_id=? AND status='active' "
+            "AND CAST(strftime('%s', end_dt) AS INTEGER)>? "
+            "AND CAST(strftime('%s', start_dt) AS INTEGER)<?",
+            (project_id, lo, hi)
+        ).fetchall()
+    free = free_cells(lo, days, cell_s, intervals, bookings, exceptions)
+    return slot_names(day, cell_s, fitting_starts(free, duration_cells))
 
 def set_setting(project_id: int, key: str, value: str):
     with _conn() as db:
@@ -0,0 +1,219 @@
+# app/utils/exception_index.py
+"""
+Индекс исключений расписания (work_exceptions) в памяти процесса.
+По каждому проекту: активные интервалы, отсортированные по началу,
+их объединение в непересекающиеся отрезки и запланированные исключения.
+Проект загружается из БД при первом обращении (холодный старт — один
+запрос); add_work_exception и activate_planned_exception из app.database
+обновляют индекс на месте. Каждое обращение сверяет версию исключений
+проекта (work_exceptions_rev, миграция v8) — один SELECT по ключу; правка
+из другого процесса её меняет, и индекс перечитывается. Индексы разных
+файлов БД не смешиваются: ключ — (путь к БД, проект); у движка в памяти
+(app.storage) вместо пути его имя, и читается он через тот же движок.
+"""
+
+import bisect
+import os
+import threading
+from pathlib import Path
+
+from app import storage
+from app.storage import iso_epoch
+from app.utils.db_safe import DB_PATH
+
+
+class ProjectExceptions:
+    """Исключения одного проекта; времена — секунды эпохи."""
+
+    def __init__(self, rev: int = 0):
+        self.rev = rev                                     # версия, с которой сверяемся
+        self.active: list[tuple[int, int, int]] = []       # (start, end, id) по start
+        self.planned: dict[int, tuple[int, int]] = {}      # id → (start, end)
+        self._merged: tuple[list[int], list[int]] | None = None
+
+    def add(self, exception_id: int, start, end, state: str) -> None:
+        if start is None or end is None or end <= start:
+            return
+        if state == "active":
+            item = (start, end, exception_id)
+            i = bisect.bisect_left(self.active, item)
+            if i < len(self.active) and self.active[i] == item:
+                return      # уже есть: загрузка из БД успела его увидеть
+            self.active.insert(i, item)
+            self._merged = None
+        elif state == "planned":
+            self.planned[exception_id] = (start, end)
+
+    def activate(self, exception_id: int) -> None:
+        interval = self.planned.pop(exception_id, None)
+        if interval is not None:
+            self.add(exception_id, *interval, "active")
+
+    def merged(self) -> tuple[list[int], list[int]]:
+        """Объединение активных интервалов: параллельные списки начал и концов."""
+        if self._merged is None:
+            starts, ends = [], []
+            for start, end, _ in self.active:
+                if ends and start <= ends[-1]:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            self._merged = (starts, ends)
+        return self._merged
+
+    def segments(self, lo: int, hi: int) -> list[tuple[int, int]]:
+        """Отрезки объединения, пересекающие [lo, hi): бинарный поиск + k штук."""
+        starts, ends = self.merged()
+        i = bisect.bisect_right(ends, lo)
+        j = bisect.bisect_left(starts, hi, lo=i)
+        return list(zip(starts[i:j], ends[i:j]))
+
+    def blocked(self, intervals: list[tuple[int, int]]) -> list[bool]:
+        """
+        Для каждого [start, end) из intervals — пересекается ли он с активным
+        исключением. Один проход по слотам и отрезкам: O(N + k), если слоты
+        уже по возрастанию начала (иначе они сортируются).
+        """
+        starts, ends = self.merged()
+        order = range(len(intervals))
+        if any(intervals[i][0] > intervals[i + 1][0] for i in range(len(intervals) - 1)):
+            order = sorted(order, key=lambda i: intervals[i][0])
+        result = [False] * len(intervals)
+        j = 0
+        for i in order:
+            start, end = intervals[i]
+            while j < len(ends) and ends[j] <= start:
+                j += 1
+            result[i] = j < len(starts) and starts[j] < end
+        return result
+
+
+_Key = tuple[str, int]                      # (абсолютный путь к БД, проект)
+
+_projects: dict[_Key, ProjectExceptions] = {}
+_owner: dict[tuple[str, int], _Key] = {}    # (БД, id исключения) → ключ проекта
+# Счётчик событий по файлу БД: on_added/on_activated/invalidate увеличивают
+# его, даже если проект не загружен. get() сверяет его до и после загрузки:
+# если изменился, событие могло прийти между SELECT и записью в _projects —
+# тогда загрузка повторяется.
+_generation: dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def _db_key(db_path: Path | str) -> str:
+    engine = storage.get_engine()
+    if engine.name != "sqlite":
+        return engine.name      # файла нет; при смене движка индексы сбрасываются
+    return os.path.abspath(db_path)
+
+
+def _load(project_id: int, db_path: Path | str) -> ProjectExceptions:
+    # app.database импортирует этот модуль
+    from app.database import get_exceptions_rev, get_open_exceptions
+    # версия — до строк: правка между ними даст лишнюю перезагрузку, а не пропуск
+    index = ProjectExceptions(get_exceptions_rev(project_id, db_path))
+    for exception_id, start_dt, end_dt, state in get_open_exceptions(project_id, db_path):
+        index.add(exception_id, iso_epoch(start_dt), iso_epoch(end_dt), state)
+    return index
+
+
+def _current_rev(project_id: int, db_path: Path | str) -> int:
+    from app.database import get_exceptions_rev
+    return get_exceptions_rev(project_id, db_path)
+
+
+def get(project_id: int, db_path: Path | str = DB_PATH) -> ProjectExceptions:
+    """
+    Индекс проекта; загрузка из БД — при первом обращении и после чужих правок:
+    1) запоминаем счётчик событий файла БД (до SELECT)
+    2) индекс уже есть — сверяем его rev с work_exceptions_rev; совпал — отдаём
+    3) иначе читаем исключения проекта без блокировки
+    4) под блокировкой: счётчик не изменился — кладём индекс в _projects,
+       изменился — событие могло потеряться, читаем заново
+    """
+    db = _db_key(db_path)
+    key = (db, project_id)
+    while True:
+        with _lock:
+            index = _projects.get(key)
+            seen = _generation.get(db, 0)
+        if index is not None and index.rev == _current_rev(project_id, db_path):
+            return index
+        index = _load(project_id, db_path)
+        with _lock:
+            if _generation.get(db, 0) != seen:
+                continue
+            old = _projects.get(key)
+            if old is not None and old.rev >= index.rev:
+                # пока грузили, проект мог загрузить другой поток — берём его индекс
+                return old
+            _projects[key] = index
+            for owned in [o for o, k in _owner.items() if k == key]:
+                del _owner[owned]
+            for exception_id, *_ in index.active:
+                _owner[(db, exception_id)] = key
+            for exception_id in index.planned:
+                _owner[(db, exception_id)] = key
+        return index
+
+
+def blocked(project_id: int, intervals: list[tuple[int, int]],
+            db_path: Path | str = DB_PATH) -> list[bool]:
+    """Какие из интервалов [start, end) (секунды эпохи) задевают активное исключение."""
+    index = get(project_id, db_path)
+    with _lock:
+        return index.blocked(intervals)
+
+
+def segments(project_id: int, lo: int, hi: int,
+             db_path: Path | str = DB_PATH) -> list[tuple[int, int]]:
+    """Непересекающиеся отрезки активных исключений, задевающие [lo, hi)."""
+    index = get(project_id, db_path)
+    with _lock:
+        return index.segments(lo, hi)
+
+
+def on_added(project_id: int, exception_id: int, start_iso: str, end_iso: str,
+             state: str, db_path: Path | str = DB_PATH) -> None:
+    """Новое исключение (после коммита). Незагруженный проект не трогаем."""
+    db = _db_key(db_path)
+    key = (db, project_id)
+    with _lock:
+        _generation[db] = _generation.get(db, 0) + 1
+        index = _projects.get(key)
+        if index is not None:
+            index.add(exception_id, iso_epoch(start_iso), iso_epoch(end_iso), state)
+            index.rev += 1      # своя правка: версия в БД выросла на столько же
+            _owner[(db, exception_id)] = key
+
+
+def on_activated(exception_id: int, db_path: Path | str = DB_PATH) -> None:
+    """Запланированное исключение стало активным (после коммита)."""
+    db = _db_key(db_path)
+    with _lock:
+        _generation[db] = _generation.get(db, 0) + 1
+        key = _owner.get((db, exception_id))
+        if key is not None and key in _projects:
+            _projects[key].activate(exception_id)
+            _projects[key].rev += 1
+
+
+def invalidate(project_id: int | None = None, db_path: Path | str = DB_PATH) -> None:
+    """
+    Сбрасывает индекс проекта в db_path (или все индексы всех БД) —
+    следующее обращение перечитает БД; идущая загрузка тоже повторится.
+    """
+    with _lock:
+        if project_id is None:
+            _projects.clear()
+            _owner.clear()
+            for db in _generation:
+                _generation[db] += 1
+        else:
+            db = _db_key(db_path)
+            key = (db, project_id)
+            _generation[db] = _generation.get(db, 0) + 1
+            _projects.pop(key, None)
+            for owned in [o for o, k in _owner.items() if k == key]:
+                del _owner[owned]
@@ -1,9 +1,9 @@
 # app/utils/feedback.py
 import time
 from pathlib import Path
-from app.utils.db_safe import transaction, safe_execute
+from app.utils.db_safe import transaction, joined_transaction, safe_execute
 
-DB_PATH = Path(__file__).resolve().parent.parent / "app" / "database.db"
+DB_PATH = Path(__file__).resolve().parent.parent / "database.db"
 
 # ── CRUD блок‑листа ──────────────────────────────
 def block_user(project_id: int, user_id: int):
@@ -13,6 +13,13 @@ def block_user(project_id: int, user_id: int):
             (project_id, user_id)
         )
 
+def block_users_bulk(project_id: int, user_ids, conn=None):
+    with joined_transaction(conn, DB_PATH) as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO feedback_blocked(project_id,user_id) VALUES(?,?)",
+            ((project_id, uid) for uid in user_ids)
+        )
+
 def is_blocked(project_id: int, user_id: int) -> bool:
     rows = safe_execute(
         "SELECT 1 FROM feedback_blocked WHERE project_id=? AND user_id=?",
@@ -30,3 +37,14 @@ def log_feedback(project_id:int, user_id:int, direction:str, text:str):
             "VALUES(?,?,?,?,?)",
             (project_id, user_id, direction, text, ts)
         )
+
+def log_feedback_bulk(project_id: int, messages, conn=None) -> int:
+    """Пакетная запись сообщений; messages — кортежи (user_id, direction, text)."""
+    ts = int(time.time())
+    with joined_transaction(conn, DB_PATH) as conn:
+        cur = conn.executemany(
+            "INSERT INTO feedback_messages(project_id,user_id,direction,text,ts) "
+            "VALUES(?,?,?,?,?)",
+            ((project_id, uid, direction, text, ts) for uid, direction, text in messages)
+        )
+        return cur.rowcount
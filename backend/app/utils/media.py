@@ -1,14 +1,31 @@
 # app/utils/media.py
+import hashlib
 import os
+import uuid
 from pathlib import Path
 from typing import Union, List
 
+import aiofiles
+
 # Разрешённые расширения и максимальный размер (при желании)
 ALLOWED_EXTENSIONS: set[str] = {'.jpg', '.jpeg', '.png', '.gif', '.mp4', '.mp3'}
 MAX_FILE_SIZE = 5 * 1024 * 1024   # 5 МБ
 
+# Загрузки читаются и пишутся кусками такого размера
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
 # Корень, где лежат media/<project_id>/
 MEDIA_ROOT = Path(__file__).resolve().parent.parent / "media"
+# Недокачанные загрузки: внутри MEDIA_ROOT (та же ФС — link атомарен),
+# но вне папок проектов, чтобы их не видели листинг и экспорт
+INCOMING_DIR_NAME = ".incoming"
+# Общее хранилище содержимого: .blobs/ab/<sha256><ext>. Файлы проектов —
+# жёсткие ссылки на блобы, поэтому одинаковые загрузки занимают место один раз
+BLOBS_DIR_NAME = ".blobs"
+
+
+class FileTooLarge(ValueError):
+    """Загрузка превысила MAX_FILE_SIZE."""
 
 
 def is_extension_allowed(filename: str) -> bool:
@@ -36,21 +53,109 @@ def save_media_file(
     """
     Сохраняет файл в media/<project_id>/ под *оригинальным* именем.
     При коллизии дописывает «_1», «_2»…
+    Содержимое кладётся в общее хранилище блобов, в папке проекта — ссылка.
     Возвращает Path к сохранённому файлу.
     """
-    ext = Path(original_filename).suffix.lower()
-    if not is_extension_allowed(original_filename):
+    name = Path(original_filename).name
+    ext = Path(name).suffix.lower()
+    if not is_extension_allowed(name):
         raise ValueError(f"Недопустимое расширение файла: {ext}")
 
-    dest_dir = media_root / str(project_id)
+    tmp_path = _incoming_path(media_root)
+    try:
+        tmp_path.write_bytes(file_bytes)
+        digest = hashlib.sha256(file_bytes).hexdigest()
+        return _store(tmp_path, digest, project_id, name, media_root)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def _incoming_path(media_root: Path) -> Path:
+    incoming = Path(media_root) / INCOMING_DIR_NAME
+    incoming.mkdir(parents=True, exist_ok=True)
+    return incoming / f"{uuid.uuid4().hex}.part"
+
+
+def blob_path(digest: str, ext: str, media_root: Path = MEDIA_ROOT) -> Path:
+    """Путь блоба с данным sha256 в хранилище."""
+    return Path(media_root) / BLOBS_DIR_NAME / digest[:2] / f"{digest}{ext.lower()}"
+
+
+def _store(tmp_path: Path, digest: str, project_id: int, name: str,
+           media_root: Path) -> Path:
+    """
+    Кладёт готовый временный файл в хранилище блобов (если такого
+    содержимого там ещё нет) и публикует ссылку на блоб в папке проекта.
+    """
+    blob = blob_path(digest, Path(name).suffix, media_root)
+    blob.parent.mkdir(parents=True, exist_ok=True)
+    dest_dir = Path(media_root) / str(project_id)
     dest_dir.mkdir(parents=True, exist_ok=True)
+    while True:
+        try:
+            os.link(tmp_path, blob)
+        except FileExistsError:
+            pass                      # такое содержимое уже хранится
+        try:
+            return _publish(blob, dest_dir, name)
+        except FileNotFoundError:
+            continue                  # блоб только что убрал gc_blobs — кладём заново
+
+
+def _publish(src: Path, dest_dir: Path, name: str) -> Path:
+    """
+    Атомарно публикует файл src жёсткой ссылкой в dest_dir под именем name
+    (при коллизии — «_1», «_2»…). os.link не перезаписывает существующий
+    файл, поэтому параллельные загрузки с одним именем не затирают друг друга.
+    """
+    stem, ext = os.path.splitext(name)
+    counter = 0
+    while True:
+        candidate = dest_dir / (name if counter == 0 else f"{stem}_{counter}{ext}")
+        try:
+            os.link(src, candidate)
+            return candidate
+        except FileExistsError:
+            counter += 1
 
-    # если имя занято — аккуратно делаем уникальное
-    final_name = _resolve_collision(dest_dir, original_filename)
-    dest_file = dest_dir / final_name
-    dest_file.write_bytes(file_bytes)
 
-    return dest_file
+async def save_upload_stream(
+        project_id: int,
+        upload,
+        media_root: Path = MEDIA_ROOT,
+        max_size: int = MAX_FILE_SIZE,
+        chunk_size: int = UPLOAD_CHUNK_SIZE) -> Path:
+    """
+    Потоково сохраняет UploadFile в media/<project_id>/ под оригинальным именем.
+    Файл читается кусками по chunk_size во временный файл, sha256 считается
+    на лету; как только размер превысил max_size — загрузка прерывается
+    (FileTooLarge). Содержимое попадает в хранилище блобов один раз,
+    в папке проекта атомарно появляется ссылка на него.
+    Возвращает Path к сохранённому файлу.
+    """
+    # 1) имя без каталогов и проверка расширения
+    name = Path(upload.filename or "").name
+    if not is_extension_allowed(name):
+        raise ValueError(f"Недопустимое расширение файла: {Path(name).suffix.lower()}")
+
+    tmp_path = _incoming_path(media_root)
+    try:
+        # 2) копируем кусками, считая размер и хэш на лету
+        size = 0
+        hasher = hashlib.sha256()
+        async with aiofiles.open(tmp_path, "wb") as out:
+            while chunk := await upload.read(chunk_size):
+                size += len(chunk)
+                if size > max_size:
+                    raise FileTooLarge(
+                        f"Файл {name} больше {max_size // (1024 * 1024)} МБ")
+                hasher.update(chunk)
+                await out.write(chunk)
+
+        # 3) блоб в хранилище + ссылка под свободным именем
+        return _store(tmp_path, hasher.hexdigest(), project_id, name, media_root)
+    finally:
+        tmp_path.unlink(missing_ok=True)
 
 
 def list_media_files(project_id: Union[int, str],
@@ -58,7 +163,8 @@ def list_media_files(project_id: Union[int, str],
     project_dir = Path(media_root) / str(project_id)
     if not project_dir.is_dir():
         return []
-    return [p for p in project_dir.iterdir() if p.is_file()]
+    return [p for p in project_dir.iterdir()
+            if p.is_file() and not p.name.startswith(".")]
 
 
 def delete_media_file(path: Union[str, Path]) -> None:
@@ -66,3 +172,46 @@ def delete_media_file(path: Union[str, Path]) -> None:
         Path(path).unlink(missing_ok=True)
     except Exception:
         pass
+
+
+def discard_media_file(path: Union[str, Path],
+                       media_root: Union[str, Path] = MEDIA_ROOT) -> None:
+    """
+    Откатывает сохранённую загрузку: удаляет файл проекта и его блоб,
+    если на блоб больше никто не ссылается. Трогает только этот блоб,
+    без обхода хранилища (полная уборка — gc_blobs).
+    """
+    path = Path(path)
+    hasher = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(UPLOAD_CHUNK_SIZE):
+                hasher.update(chunk)
+        inode = path.stat().st_ino
+    except FileNotFoundError:
+        return
+    blob = blob_path(hasher.hexdigest(), path.suffix, media_root)
+    delete_media_file(path)
+    try:
+        st = blob.stat()
+        if st.st_ino == inode and st.st_nlink == 1:
+            blob.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def gc_blobs(media_root: Union[str, Path] = MEDIA_ROOT) -> int:
+    """
+    Удаляет блобы, на которые не ссылается ни один файл проекта
+    (у таких осталась единственная ссылка — сам блоб).
+    Возвращает число удалённых блобов.
+    """
+    removed = 0
+    for blob in (Path(media_root) / BLOBS_DIR_NAME).glob("*/*"):
+        try:
+            if blob.stat().st_nlink == 1:
+                blob.unlink()
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
@@ -5,10 +5,10 @@ import time
 from collections import defaultdict
 from pathlib import Path
 
-from app.utils.db_safe import transaction, safe_execute
+from app.utils.db_safe import transaction, joined_transaction, safe_execute
 
 # Путь к БД
-DB_PATH = Path(__file__).resolve().parent.parent / "app" / "database.db"
+DB_PATH = Path(__file__).resolve().parent.parent / "database.db"
 
 # Регулярки
 MAT_RE   = re.compile(r"(?:хрен|жоп|shit|fuck)", re.IGNORECASE)
@@ -51,6 +51,25 @@ def toggle_setting(project_id: int, key: str, value: int):
             (project_id, value)
         )
 
+# Колонки moderation_settings, которые можно менять
+SETTING_KEYS = ("allow_media", "allow_stickers", "censor_enabled", "flood_max", "flood_window_s")
+
+def set_settings(project_id: int, values: dict, conn=None):
+    """Записывает несколько настроек одним UPSERT (вместо toggle_setting на каждую)."""
+    keys = [k for k in SETTING_KEYS if k in values]
+    if not keys:
+        return
+    with joined_transaction(conn, DB_PATH) as conn:
+        conn.execute(
+            "INSERT INTO moderation_settings(project_id, {}) VALUES(?{}) "
+            "ON CONFLICT(project_id) DO UPDATE SET {}".format(
+                ", ".join(keys),
+                ",?" * len(keys),
+                ", ".join(f"{k}=excluded.{k}" for k in keys),
+            ),
+            (project_id, *(values[k] for k in keys))
+        )
+
 # ── Белый список доменов ────────────────────
 def whitelist_add(project_id: int, domain: str):
     with transaction(DB_PATH) as conn:
@@ -59,6 +78,13 @@ def whitelist_add(project_id: int, domain: str):
             (project_id, domain)
         )
 
+def whitelist_add_bulk(project_id: int, domains, conn=None):
+    with joined_transaction(conn, DB_PATH) as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO link_whitelist(project_id,domain) VALUES(?,?)",
+            ((project_id, d) for d in domains)
+        )
+
 def whitelist_del(project_id: int, domain: str):
     with transaction(DB_PATH) as conn:
         conn.execute(
@@ -43,6 +43,28 @@ def init_db():
                 quantity   INTEGER DEFAULT 1
             )
         """)
+        # Одна позиция на (проект, пользователь, товар): нужна для UPSERT в add_to_cart.
+        # Дубли из старых версий склеиваем в позицию с меньшим id.
+        if not db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='index' AND name='uq_cart_items_user_product'"
+        ).fetchone():
+            db.execute("""
+                UPDATE cart_items SET quantity = (
+                    SELECT SUM(d.quantity) FROM cart_items d
+                     WHERE d.project_id=cart_items.project_id
+                       AND d.user_id=cart_items.user_id
+                       AND d.product_id=cart_items.product_id)
+                 WHERE id IN (SELECT MIN(id) FROM cart_items
+                               GROUP BY project_id, user_id, product_id HAVING COUNT(*) > 1)
+            """)
+            db.execute("""
+                DELETE FROM cart_items WHERE id NOT IN (
+                    SELECT MIN(id) FROM cart_items GROUP BY project_id, user_id, product_id)
+            """)
+            db.execute(
+                "CREATE UNIQUE INDEX uq_cart_items_user_product "
+                "ON cart_items(project_id, user_id, product_id)"
+            )
         # Таблица заказов
         db.execute("""
             CREATE TABLE IF NOT EXISTS orders (
@@ -107,60 +129,122 @@ def delete_product(project_id: int, product_id: int):
     with _conn() as db:
         db.execute("DELETE FROM products WHERE project_id=? AND id=?", (project_id, product_id))
 
-def add_to_cart(project_id: int, user_id: int, product_id: int, quantity: int = 1):
-    """Добавляет товар в корзину пользователя. Если товар уже есть, увеличивает количество."""
+_CART_SQL = (
+    "SELECT ci.id AS cart_id, ci.product_id, ci.quantity, p.name, p.full_desc, p.media_path "
+    "FROM cart_items ci JOIN products p ON p.id = ci.product_id "
+    "WHERE ci.project_id=? AND ci.user_id=? ORDER BY ci.id"
+)
+
+def _cart(db, project_id: int, user_id: int) -> list[dict]:
+    """Корзина пользователя, прочитанная на уже открытом соединении db."""
+    return [
+        {
+            "cart_id": r["cart_id"], "product_id": r["product_id"],
+            "quantity": r["quantity"],
+            "name": r["name"], "full_desc": r["full_desc"],
+            "media": r["media_path"] or ""
+        }
+        for r in db.execute(_CART_SQL, (project_id, user_id)).fetchall()
+    ]
+
+def add_to_cart(project_id: int, user_id: int, product_id: int, quantity: int = 1) -> list[dict]:
+    """
+    Добавляет товар в корзину одним UPSERT: если позиция уже есть, количество
+    увеличивается атомарно (параллельные нажатия не теряются).
+    Возвращает корзину после изменения.
+    """
     with _conn() as db:
-        row = db.execute(
-            "SELECT id, quantity FROM cart_items WHERE project_id=? AND user_id=? AND product_id=?",
-            (project_id, user_id, product_id)
-        ).fetchone()
-        if row:
-            # Товар уже в корзине – обновляем количество
-            new_qty = row["quantity"] + quantity
-            db.execute("UPDATE cart_items SET quantity=? WHERE id=?", (new_qty, row["id"]))
-        else:
-            # Добавляем новую позицию в корзину
-            db.execute(
-                "INSERT INTO cart_items(project_id, user_id, product_id, quantity) VALUES (?, ?, ?, ?)",
-                (project_id, user_id, product_id, quantity)
-            )
+        db.execute(
+            "INSERT INTO cart_items(project_id, user_id, product_id, quantity) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(project_id, user_id, product_id) "
+            "DO UPDATE SET quantity = quantity + excluded.quantity",
+            (project_id, user_id, product_id, quantity)
+        )
+        return _cart(db, project_id, user_id)
 
 def get_cart_items(project_id: int, user_id: int) -> list[dict]:
     """Возвращает содержимое корзины пользователя (список словарей с данными по каждому товару)."""
     with _conn() as db:
-        cur = db.execute(
-            "SELECT ci.id AS cart_id, ci.product_id, ci.quantity, p.name, p.full_desc, p.media_path "
-            "FROM cart_items ci JOIN products p ON p.id = ci.product_id "
-            "WHERE ci.project_id=? AND ci.user_id=? ORDER BY ci.id",
-            (project_id, user_id)
-        )
-        return [
-            {
-                "cart_id": r["cart_id"], "product_id": r["product_id"],
-                "quantity": r["quantity"],
-                "name": r["name"], "full_desc": r["full_desc"],
-                "media": r["media_path"] or ""
-            }
-            for r in cur.fetchall()
-        ]
+        return _cart(db, project_id, user_id)
 
-def update_cart_item(cart_id: int, new_qty: int):
-    """Обновляет количество товара в корзине (или удаляет, если количество стало 0)."""
+def change_cart_item(project_id: int, user_id: int, cart_id: int, delta: int | None = None):
+    """
+    Меняет количество позиции cart_id в корзине пользователя на delta
+    (None — удаляет позицию); при количестве 0 и меньше позиция удаляется.
+    Возвращает корзину после изменения или None, если такой позиции
+    у пользователя нет.
+    """
+    owner = (cart_id, project_id, user_id)
+    with _conn() as db:
+        if delta is None:
+            cur = db.execute(
+                "DELETE FROM cart_items WHERE id=? AND project_id=? AND user_id=?", owner
+            )
+        else:
+            cur = db.execute(
+                "UPDATE cart_items SET quantity = quantity + ? "
+                "WHERE id=? AND project_id=? AND user_id=?",
+                (delta, *owner)
+            )
+            db.execute(
+                "DELETE FROM cart_items WHERE id=? AND project_id=? AND user_id=? AND quantity <= 0",
+                owner
+            )
+        if cur.rowcount == 0:
+            return None
+        return _cart(db, project_id, user_id)
+
+def update_cart_item(cart_id: int, new_qty: int) -> list[dict]:
+    """
+    Обновляет количество товара в корзине (или удаляет, если количество стало 0).
+    Возвращает корзину владельца позиции ([] — если позиции нет).
+    """
     with _conn() as db:
         if new_qty > 0:
-            db.execute("UPDATE cart_items SET quantity=? WHERE id=?", (new_qty, cart_id))
+            owner = db.execute(
+                "UPDATE cart_items SET quantity=? WHERE id=? RETURNING project_id, user_id",
+                (new_qty, cart_id)
+            ).fetchone()
         else:
-            db.execute("DELETE FROM cart_items WHERE id=?", (cart_id,))
+            owner = db.execute(
+                "DELETE FROM cart_items WHERE id=? RETURNING project_id, user_id", (cart_id,)
+            ).fetchone()
+        return _cart(db, *owner) if owner else []
 
-def delete_cart_item(cart_id: int):
-    """Удаляет позицию из корзины по её идентификатору."""
+def delete_cart_item(cart_id: int) -> list[dict]:
+    """Удаляет позицию из корзины по её идентификатору; возвращает корзину владельца."""
     with _conn() as db:
-        db.execute("DELETE FROM cart_items WHERE id=?", (cart_id,))
+        owner = db.execute(
+            "DELETE FROM cart_items WHERE id=? RETURNING project_id, user_id", (cart_id,)
+        ).fetchone()
+        return _cart(db, *owner) if owner else []
 
-def clear_cart(project_id: int, user_id: int):
+def clear_cart(project_id: int, user_id: int) -> list[dict]:
     """Очищает корзину пользователя (удаляет все позиции)."""
     with _conn() as db:
         db.execute("DELETE FROM cart_items WHERE project_id=? AND user_id=?", (project_id, user_id))
+        return []
+
+def checkout(project_id: int, user_id: int, address: str, media_path: str = "") -> list[dict]:
+    """
+    Оформляет заказ одной транзакцией: все позиции корзины записываются
+    в orders, корзина очищается. Возвращает оформленные позиции
+    ([] — корзина была пуста, заказ не создан).
+    """
+    with _conn() as db:
+        # блокировка записи сразу: между чтением корзины и её очисткой
+        # никто не добавит позицию, которая не попадёт в заказ
+        db.execute("BEGIN IMMEDIATE")
+        items = _cart(db, project_id, user_id)
+        if items:
+            db.executemany(
+                "INSERT INTO orders(project_id, user_id, product, quantity, address, media_path) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(project_id, user_id, it["product_id"], it["quantity"], address, media_path)
+                 for it in items]
+            )
+        db.execute("DELETE FROM cart_items WHERE project_id=? AND user_id=?", (project_id, user_id))
+        return items
 
 def save_order(order: dict):
     """Сохраняет один товар из заказа в таблицу orders."""
@@ -0,0 +1,149 @@
+# utils/outbox.py
+"""
+Фоновая отправка уведомлений из таблицы outbox (создаётся в dp.init_db).
+Строки пишутся в одной транзакции с изменением, о котором сообщают
+(см. dp.cancel_bookings_in_interval), поэтому падение бота их не теряет:
+после перезапуска OutboxSender дошлёт всё, что осталось 'pending'.
+Доставка «хотя бы один раз»: упавший посреди отправки бот повторит
+сообщения, которые были «в полёте».
+"""
+
+import asyncio
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+CONCURRENCY = 8          # одновременных send()
+BATCH_SIZE = 100         # строк за одну выборку
+MAX_ATTEMPTS = 5         # после стольких ошибок — 'failed'
+RETRY_BASE_S = 5         # пауза перед повтором: RETRY_BASE_S * 2**(попытка-1)
+POLL_S = 5               # как часто проверять outbox без notify()
+LEASE_S = 60             # столько выбранная строка не достаётся другому drain()
+
+log = logging.getLogger(__name__)
+
+
+class OutboxSender:
+    """
+    Разбирает outbox: send(user_id, text) — корутина отправки
+    (например, bot.send_message). notify() будит отправителя сразу
+    после записи новых строк.
+    """
+
+    def __init__(self, db_path: Path | str, send, concurrency: int = CONCURRENCY,
+                 clock=time.time):
+        self.db_path = db_path
+        self.send = send
+        self.concurrency = concurrency
+        self.clock = clock
+        self._wake = asyncio.Event()
+        self._task = None
+
+    @contextmanager
+    def _conn(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            yield conn
+            conn.commit()
+        except:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    async def _deliver(self, sem: asyncio.Semaphore, row: tuple, now: int) -> str:
+        """Отправляет одну строку и сразу фиксирует итог: 'sent' / 'retry' / 'failed'."""
+        row_id, user_id, text, attempts = row
+        async with sem:
+            try:
+                await self.send(user_id, text)
+            except Exception as e:
+                error = e
+            else:
+                error = None
+        with self._conn() as db:
+            if error is None:
+                db.execute("UPDATE outbox SET state='sent' WHERE id=?", (row_id,))
+                return "sent"
+            if attempts + 1 >= MAX_ATTEMPTS:
+                log.warning("outbox #%s → %s: %r", row_id, user_id, error)
+                db.execute(
+                    "UPDATE outbox SET state='failed', attempts=attempts+1, last_error=? "
+                    "WHERE id=?", (repr(error), row_id)
+                )
+                return "failed"
+            db.execute(
+                "UPDATE outbox SET next_ts=?, attempts=attempts+1, last_error=? WHERE id=?",
+                (now + RETRY_BASE_S * 2 ** attempts, repr(error), row_id)
+            )
+            return "retry"
+
+    async def drain(self) -> dict:
+        """
+        Отправляет всё, что готово к отправке, пачками по BATCH_SIZE:
+        1) pending-строки с next_ts <= сейчас забираются одним UPDATE:
+           next_ts сдвигается на LEASE_S, и параллельный drain() (или
+           второй процесс) их уже не выберет; упади бот — через LEASE_S
+           их подхватят снова
+        2) отправка параллельно (не больше concurrency сразу)
+        3) итог каждой строки пишется сразу после её отправки: 'sent',
+           повтор с паузой или 'failed' после MAX_ATTEMPTS — так после
+           падения повторяются только сообщения, бывшие «в полёте»
+        """
+        totals = {"sent": 0, "retry": 0, "failed": 0}
+        sem = asyncio.Semaphore(self.concurrency)
+        while True:
+            now = int(self.clock())
+            with self._conn() as db:
+                rows = sorted(db.execute(
+                    "UPDATE outbox SET next_ts=? WHERE id IN ("
+                    "  SELECT id FROM outbox WHERE state='pending' AND next_ts<=? "
+                    "  ORDER BY id LIMIT ?) "
+                    "RETURNING id,user_id,text,attempts",
+                    (now + LEASE_S, now, BATCH_SIZE)
+                ).fetchall())
+            if not rows:
+                return totals
+            for outcome in await asyncio.gather(*(self._deliver(sem, row, now) for row in rows)):
+                totals[outcome] += 1
+
+    def progress(self, batch: str) -> dict:
+        """Сколько строк пачки в каждом состоянии: pending / sent / failed."""
+        with self._conn() as db:
+            counts = dict(db.execute(
+                "SELECT state, COUNT(*) FROM outbox WHERE batch=? GROUP BY state", (batch,)
+            ).fetchall())
+        return {state: counts.get(state, 0) for state in ("pending", "sent", "failed")}
+
+    async def wait_batch(self, batch: str, timeout: float = 600, poll_s: float = 2) -> dict:
+        """Ждёт, пока в пачке не останется pending (или истечёт timeout); итог — progress()."""
+        deadline = self.clock() + timeout
+        while True:
+            progress = self.progress(batch)
+            if not progress["pending"] or self.clock() >= deadline:
+                return progress
+            await asyncio.sleep(poll_s)
+
+    async def run(self) -> None:
+        """Цикл: drain(), затем ждать notify() или POLL_S секунд."""
+        while True:
+            self._wake.clear()
+            try:
+                await self.drain()
+            except Exception:
+                log.exception("outbox: ошибка в drain")
+            try:
+                await asyncio.wait_for(self._wake.wait(), POLL_S)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> asyncio.Task:
+        """Запускает run() фоном в текущем цикле событий."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_event_loop().create_task(self.run())
+        return self._task
@@ -0,0 +1,272 @@
+# utils/scheduled_jobs.py
+"""
+Отложенные задачи бота (напоминания о записи, плановые закрытия) с хранением
+в SQLite — таблица scheduled_jobs.
+
+В памяти держится только горизонт horizon_s (по умолчанию сутки), разложенный
+по минутным корзинам: одно пробуждение в минуту выполняет всё, что созрело.
+Задача остаётся 'pending' в БД, пока обработчик не отработал, поэтому после
+падения или простоя на старте подхватываются и просроченные: выполняются,
+если опоздали не больше чем на grace_s обработчика, иначе помечаются 'missed'.
+"""
+
+import asyncio
+import calendar
+import inspect
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+HORIZON_S = 24 * 3600        # сколько вперёд держать в памяти
+MISFIRE_GRACE_S = 3600       # на сколько можно опоздать (по умолчанию)
+MAX_ATTEMPTS = 3             # после стольких ошибок задача — 'failed'
+CONCURRENCY = 10             # одновременных обработчиков внутри одной минуты
+
+log = logging.getLogger(__name__)
+
+
+def _epoch(dt: datetime) -> int:
+    """Секунды эпохи; «наивное» время — как strftime('%s') в SQLite."""
+    if dt.tzinfo is not None:
+        return int(dt.timestamp())
+    return calendar.timegm(dt.timetuple())
+
+
+class JobWheel:
+    """
+    Минутное «колесо» задач одного проекта.
+    Обработчики регистрируются по виду задачи (kind) и вызываются как
+    handler(ref_id, label); могут быть и обычными функциями, и корутинами.
+    """
+
+    def __init__(self, db_path: Path | str, project_id: int,
+                 horizon_s: int = HORIZON_S, clock=time.time):
+        self.db_path = db_path
+        self.project_id = project_id
+        self.horizon_s = horizon_s
+        self.clock = clock
+        self.handlers: dict[str, tuple] = {}                 # kind → (fn, grace_s)
+        self.buckets: dict[int, dict[int, tuple]] = {}       # минута → {id: задача}
+        self._minute_of: dict[int, int] = {}                 # id задачи → минута
+        self.loaded_until = 0                                # горизонт загружен до (ts)
+        self._task = None
+
+    @contextmanager
+    def _conn(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            yield conn
+            conn.commit()
+        except:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def init_store(self) -> bool:
+        """Создаёт scheduled_jobs; True — если таблицы ещё не было."""
+        with self._conn() as db:
+            created = not db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='scheduled_jobs'"
+            ).fetchone()
+            db.execute("""
+            CREATE TABLE IF NOT EXISTS scheduled_jobs (
+                id         INTEGER PRIMARY KEY AUTOINCREMENT,
+                project_id INTEGER,
+                kind       TEXT NOT NULL,
+                ref_id     INTEGER NOT NULL,
+                label      TEXT NOT NULL DEFAULT '',
+                run_ts     INTEGER NOT NULL,
+                state      TEXT NOT NULL DEFAULT 'pending',
+                attempts   INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                UNIQUE(project_id, kind, ref_id, label)
+            )""")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_due "
+                       "ON scheduled_jobs(project_id, state, run_ts)")
+        return created
+
+    def handler(self, kind: str, grace_s: int | None = MISFIRE_GRACE_S):
+        """Декоратор обработчика; grace_s=None — выполнять при любом опоздании."""
+        def register(fn):
+            self.handlers[kind] = (fn, grace_s)
+            return fn
+        return register
+
+    # --- корзины в памяти ---------------------------------------------------
+
+    def _place(self, job_id: int, kind: str, ref_id: int, label: str, run_ts: int) -> None:
+        self._unplace(job_id)
+        minute = run_ts // 60
+        self.buckets.setdefault(minute, {})[job_id] = (kind, ref_id, label, run_ts)
+        self._minute_of[job_id] = minute
+
+    def _unplace(self, job_id: int) -> None:
+        minute = self._minute_of.pop(job_id, None)
+        if minute is not None:
+            bucket = self.buckets[minute]
+            bucket.pop(job_id, None)
+            if not bucket:
+                del self.buckets[minute]
+
+    def _refill(self, now: float) -> int:
+        """
+        Догружает pending-задачи до now + horizon_s. Первая загрузка берёт
+        и все просроченные (misfire); следующие — только новый хвост окна.
+        """
+        until = int(now) + self.horizon_s
+        with self._conn() as db:
+            rows = db.execute(
+                "SELECT id,kind,ref_id,label,run_ts FROM scheduled_jobs "
+                "WHERE project_id=? AND state='pending' AND run_ts>=? AND run_ts<?",
+                (self.project_id, self.loaded_until if self.loaded_until else -2**62, until)
+            ).fetchall()
+        for row in rows:
+            self._place(*row)
+        self.loaded_until = until
+        return len(rows)
+
+    # --- постановка и отмена ------------------------------------------------
+
+    def schedule(self, kind: str, ref_id: int, run_at: datetime, label: str = "") -> int:
+        """
+        Ставит (или переносит) задачу kind/ref_id/label на run_at.
+        Повторный вызов с теми же ключами только меняет время. Возвращает id.
+        """
+        run_ts = _epoch(run_at)
+        with self._conn() as db:
+            job_id = db.execute(
+                "INSERT INTO scheduled_jobs(project_id,kind,ref_id,label,run_ts) VALUES(?,?,?,?,?) "
+                "ON CONFLICT(project_id,kind,ref_id,label) DO UPDATE SET "
+                "run_ts=excluded.run_ts, state='pending', attempts=0, last_error=NULL "
+                "RETURNING id",
+                (self.project_id, kind, ref_id, label, run_ts)
+            ).fetchone()[0]
+        if self.loaded_until and run_ts < self.loaded_until:
+            self._place(job_id, kind, ref_id, label, run_ts)
+        else:
+            self._unplace(job_id)
+        return job_id
+
+    def schedule_many(self, jobs: list[tuple[str, int, datetime, str]]) -> None:
+        """Пакетная постановка (kind, ref_id, run_at, label) одной транзакцией."""
+        with self._conn() as db:
+            db.executemany(
+                "INSERT INTO scheduled_jobs(project_id,kind,ref_id,label,run_ts) VALUES(?,?,?,?,?) "
+                "ON CONFLICT(project_id,kind,ref_id,label) DO UPDATE SET "
+                "run_ts=excluded.run_ts, state='pending', attempts=0, last_error=NULL",
+                [(self.project_id, kind, ref_id, label, _epoch(run_at))
+                 for kind, ref_id, run_at, label in jobs]
+            )
+        if self.loaded_until:
+            # уже запущены — окно перечитываем целиком
+            self.buckets.clear()
+            self._minute_of.clear()
+            self.loaded_until = 0
+            self._refill(self.clock())
+
+    def cancel(self, kind: str, ref_id: int) -> int:
+        """Отменяет pending-задачи kind/ref_id (все метки). Возвращает их число."""
+        with self._conn() as db:
+            ids = [r[0] for r in db.execute(
+                "UPDATE scheduled_jobs SET state='cancelled' "
+                "WHERE project_id=? AND kind=? AND ref_id=? AND state='pending' RETURNING id",
+                (self.project_id, kind, ref_id)
+            ).fetchall()]
+        for job_id in ids:
+            self._unplace(job_id)
+        return len(ids)
+
+    # --- выполнение ---------------------------------------------------------
+
+    async def _call(self, sem: asyncio.Semaphore, fn, ref_id: int, label: str):
+        async with sem:
+            result = fn(ref_id, label)
+            if inspect.isawaitable(result):
+                await result
+
+    async def tick(self, now: float | None = None) -> dict:
+        """
+        Выполняет все задачи из корзин до текущей минуты включительно:
+        1) просроченные дольше grace_s → 'missed'
+        2) остальные — параллельно (не больше CONCURRENCY сразу)
+        3) итоги пишутся одной транзакцией; упавшие повторяются через
+           attempts минут, после MAX_ATTEMPTS — 'failed'
+        """
+        now = self.clock() if now is None else now
+        minute = int(now) // 60
+        due = []
+        for m in sorted(m for m in self.buckets if m <= minute):
+            for job_id, job in self.buckets.pop(m).items():
+                self._minute_of.pop(job_id, None)
+                due.append((job_id, *job))
+
+        done, missed, retry, failed, calls, runs = [], [], [], [], [], []
+        sem = asyncio.Semaphore(CONCURRENCY)
+        for job_id, kind, ref_id, label, run_ts in due:
+            fn, grace_s = self.handlers.get(kind, (None, None))
+            if fn is None:
+                log.warning("scheduled_jobs: нет обработчика для %s (#%s)", kind, job_id)
+                failed.append(("no handler", job_id))
+            elif grace_s is not None and now - run_ts > grace_s:
+                missed.append((job_id,))
+            else:
+                runs.append((job_id, kind, ref_id, label))
+                calls.append(self._call(sem, fn, ref_id, label))
+
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        with self._conn() as db:
+            attempts = dict(db.execute(
+                "SELECT id, attempts FROM scheduled_jobs WHERE id IN (%s)"
+                % ",".join("?" * len(runs)), [r[0] for r in runs]
+            ).fetchall()) if runs else {}
+            for (job_id, kind, ref_id, label), result in zip(runs, results):
+                # CancelledError — не Exception, но и не успех: повторяем
+                if not isinstance(result, BaseException):
+                    done.append((job_id,))
+                    continue
+                log.warning("scheduled_jobs: %s #%s: %r", kind, job_id, result)
+                n = attempts.get(job_id, 0) + 1
+                if n >= MAX_ATTEMPTS:
+                    failed.append((repr(result), job_id))
+                else:
+                    retry_ts = int(now) + 60 * n
+                    retry.append((retry_ts, repr(result), job_id))
+                    if retry_ts < self.loaded_until:
+                        self._place(job_id, kind, ref_id, label, retry_ts)
+            db.executemany("UPDATE scheduled_jobs SET state='done' WHERE id=?", done)
+            db.executemany("UPDATE scheduled_jobs SET state='missed' WHERE id=?", missed)
+            db.executemany(
+                "UPDATE scheduled_jobs SET run_ts=?, attempts=attempts+1, last_error=? WHERE id=?",
+                retry
+            )
+            db.executemany(
+                "UPDATE scheduled_jobs SET state='failed', attempts=attempts+1, last_error=? "
+                "WHERE id=?", failed
+            )
+        return {"done": len(done), "missed": len(missed),
+                "retry": len(retry), "failed": len(failed)}
+
+    async def run(self) -> None:
+        """Цикл: загрузка горизонта, затем пробуждение на границе каждой минуты."""
+        self._refill(self.clock())
+        await self.tick()                      # то, что пропустили, пока не работали
+        while True:
+            now = self.clock()
+            await asyncio.sleep(60 - now % 60)
+            now = self.clock()
+            if now + self.horizon_s / 2 > self.loaded_until:
+                self._refill(now)
+            try:
+                await self.tick(now)
+            except Exception:
+                log.exception("scheduled_jobs: ошибка в tick")
+
+    def start(self) -> asyncio.Task:
+        """Запускает run() фоном в текущем цикле событий."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_event_loop().create_task(self.run())
+        return self._task
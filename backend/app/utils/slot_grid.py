@@ -0,0 +1,91 @@
+# utils/slot_grid.py
+"""
+Битовая карта ячеек расписания для поиска свободных слотов.
+Модуль без зависимостей от конструктора: им пользуются app/utils/slots.py
+(БД конструктора) и utils/dp.py экспортированного бота (своя БД).
+Строки окон работы, броней и исключений вызывающий читает сам — здесь
+только проход по ячейкам. NumPy необязателен.
+"""
+
+import calendar
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:     # без NumPy — тот же проход на чистом Python
+    np = None
+
+# Насколько раньше окна поиска искать начала окон работы и броней, которые
+# в него заходят (ни то, ни другое не длиннее суток)
+LOOKBACK_S = 24 * 3600
+
+
+def day_epoch(dt: datetime) -> int:
+    """Секунды эпохи для «наивного» времени — как strftime('%s') в SQLite."""
+    return calendar.timegm(dt.timetuple())
+
+
+def parse_day(date_str: str) -> datetime:
+    """'20240501' (callback календаря) или '2024-05-01' → полночь этого дня."""
+    fmt = "%Y%m%d" if date_str.isdigit() else "%Y-%m-%d"
+    return datetime.strptime(date_str[:10], fmt)
+
+
+def free_cells(lo: int, days: int, cell_s: int, intervals, bookings, exceptions):
+    """
+    Битовая карта ячеек [lo, lo + days суток): True — ячейка внутри окна
+    работы и не занята бронью или активным исключением.
+    intervals  — (start_ts, end_ts) окон работы;
+    bookings   — (start_ts, duration_cells) занятых броней;
+    exceptions — (start_ts, end_ts) активных исключений.
+    """
+    n = days * 86400 // cell_s
+    free = np.zeros(n, dtype=bool) if np is not None else bytearray(n)
+
+    def fill(i: int, j: int, value: bool) -> None:
+        i, j = max(0, i), min(n, j)
+        if i < j:
+            free[i:j] = value if np is not None else (b"\x01" if value else b"\x00") * (j - i)
+
+    def busy(start: int, end: int) -> None:
+        # занята каждая ячейка, которую хоть как-то задевает [start, end)
+        fill((start - lo) // cell_s, -(-(end - lo) // cell_s), False)
+
+    # 1) окна работы: свободна только ячейка, целиком лежащая внутри окна
+    for start, end in intervals:
+        if start is not None and end is not None:
+            fill(-(-(start - lo) // cell_s), (end - lo) // cell_s, True)
+
+    # 2) брони: [start_ts, start_ts + duration_cells ячеек)
+    for start, cells in bookings:
+        if start is not None:
+            busy(start, start + (cells or 1) * cell_s)
+
+    # 3) активные исключения
+    for start, end in exceptions:
+        if start is not None and end is not None:
+            busy(start, end)
+    return free
+
+
+def fitting_starts(free, duration_cells: int) -> list[int]:
+    """Индексы ячеек, с которых подряд свободно duration_cells ячеек."""
+    d = max(1, duration_cells)
+    if len(free) < d:
+        return []
+    if np is not None:
+        # скользящее окно через префиксные суммы: сумма окна == d → всё свободно
+        sums = np.concatenate(([0], np.cumsum(free, dtype=np.int32)))
+        return np.flatnonzero(sums[d:] - sums[:-d] == d).tolist()
+    starts, run = [], 0
+    for i, cell in enumerate(free):
+        run = run + 1 if cell else 0
+        if run >= d:
+            starts.append(i - d + 1)
+    return starts
+
+
+def slot_names(day: datetime, cell_s: int, starts: list[int]) -> list[str]:
+    """Индексы ячеек от полуночи day → 'YYYYMMDD_HHMM' (формат callback'ов бота)."""
+    step = timedelta(seconds=cell_s)
+    return [(day + i * step).strftime("%Y%m%d_%H%M") for i in starts]
@@ -1,55 +1,75 @@
 # app/utils/slots.py
+"""
+Слоты расписания в БД конструктора: атомарная бронь, поиск свободных
+начал, сетка дня для просмотра расписания. Сам проход по ячейкам —
+в slot_grid.py, общем с ботом (utils/dp.py экспортированного
+smart_booking_crm ищет слоты в своей БД тем же кодом).
+"""
 
 import sqlite3
-from contextlib import contextmanager
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Iterator
 
-from app.database import DB_PATH, create_booking
+from app.database import DB_PATH, SLOT_SIZE_MIN
+from app.storage import engine_backed
+from app.utils import exception_index
+from app.utils.db_safe import read_transaction, transaction
+from app.utils.slot_grid import (
+    LOOKBACK_S, day_epoch, fitting_starts, free_cells, parse_day, slot_names,
+)
 
-@contextmanager
-def _transaction(db_path: Path | str = DB_PATH) -> Iterator[sqlite3.Connection]:
-    """
-    Открывает транзакцию BEGIN IMMEDIATE, чтобы заблокировать БД на запись.
-    При выходе коммитит, либо при исключении — откатывает.
-    """
-    conn = sqlite3.connect(str(db_path))
-    try:
-        conn.execute("BEGIN IMMEDIATE;")
-        yield conn
-        conn.commit()
-    except:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
+# Брони в этих статусах занимают ячейки расписания. Новая бронь создаётся
+# в 'pending' и ждёт подтверждения — слот на это время уже держит она.
+BUSY_STATUSES = ("pending", "confirmed")
+
+def _interval(start_dt: str, duration_cells: int, slot_size_min: int) -> tuple[int, int]:
+    """[начало, конец) брони в секундах эпохи; ValueError — если время не разобрать."""
+    start = day_epoch(datetime.fromisoformat(start_dt))
+    return start, start + max(1, duration_cells) * slot_size_min * 60
 
-def is_slot_booked(conn: sqlite3.Connection, project_id: int, start_dt: str) -> bool:
+def is_slot_booked(
+    conn: sqlite3.Connection,
+    project_id: int,
+    start_dt: str,
+    duration_cells: int = 1,
+    slot_size_min: int = SLOT_SIZE_MIN
+) -> bool:
     """
-    Проверяет, есть ли в таблице bookings брони на проект и время start_dt.
+    Пересекается ли [start_dt, start_dt + duration_cells ячеек) с бронью
+    в статусе из BUSY_STATUSES. Диапазонный поиск по idx_bookings_status_ts:
+    кандидаты — брони, начавшиеся не раньше чем за LOOKBACK_S до конца.
     """
+    start, end = _interval(start_dt, duration_cells, slot_size_min)
+    marks = ",".join("?" * len(BUSY_STATUSES))
     cur = conn.execute(
-        "SELECT 1 FROM bookings WHERE project_id=? AND start_dt=? AND status='confirmed'",
-        (project_id, start_dt)
+        "SELECT 1 FROM bookings "
+        f"WHERE project_id=? AND status IN ({marks}) AND start_ts>=? AND start_ts<? "
+        "AND start_ts + duration_cells*?>? LIMIT 1",
+        (project_id, *BUSY_STATUSES, start - LOOKBACK_S, end, slot_size_min * 60, start)
     )
     return cur.fetchone() is not None
 
-def is_slot_blocked(conn: sqlite3.Connection, project_id: int, start_dt: str) -> bool:
+def is_slot_blocked(
+    conn: sqlite3.Connection,
+    project_id: int,
+    start_dt: str,
+    duration_cells: int = 1,
+    slot_size_min: int = SLOT_SIZE_MIN
+) -> bool:
     """
-    Проверяет, попадает ли start_dt в активный work_exception.
+    Пересекается ли [start_dt, start_dt + duration_cells ячеек) с активным
+    work_exception. Диапазонный поиск по idx_work_exceptions_ts: кандидаты —
+    исключения, которые ещё не кончились к началу слота (end_ts > start).
     """
+    start, end = _interval(start_dt, duration_cells, slot_size_min)
     cur = conn.execute(
-        """
-        SELECT 1 FROM work_exceptions
-         WHERE project_id=?
-           AND state='active'
-           AND start_dt <= ?
-           AND end_dt > ?
-        """,
-        (project_id, start_dt, start_dt)
+        "SELECT 1 FROM work_exceptions WHERE project_id=? AND state='active' "
+        "AND end_ts>? AND start_ts<? LIMIT 1",
+        (project_id, start, end)
     )
     return cur.fetchone() is not None
 
+@engine_backed
 def create_booking_safe(
     project_id: int,
     user_id: int,
@@ -58,23 +78,132 @@ def create_booking_safe(
     duration_cells: int,
     client_name: str,
     client_phone: str,
-    db_path: Path | str = DB_PATH
+    db_path: Path | str = DB_PATH,
+    slot_size_min: int = SLOT_SIZE_MIN
 ) -> int:
     """
-    Пытается забронировать слот atomically:
-    1) BEGIN IMMEDIATE транзакция
-    2) Проверки is_slot_booked / is_slot_blocked
-    3) Если свободно, вызывает create_booking, иначе — ValueError
-    Возвращает id новой записи.
+    Бронирует слот атомарно, на одном соединении:
+    1) BEGIN IMMEDIATE (db_safe.transaction) — параллельные брони идут по очереди
+    2) интервал [start_dt, start_dt + duration_cells ячеек) не должен
+       пересекаться с активным исключением и с занятыми бронями
+    3) INSERT в той же транзакции
+    Если слот занят или заблокирован — ValueError. Возвращает id брони.
+    Движок в памяти (app.storage) делает то же под своей блокировкой.
     """
-    with _transaction(db_path) as conn:
-        if is_slot_blocked(conn, project_id, start_dt):
+    try:
+        _interval(start_dt, duration_cells, slot_size_min)
+    except ValueError:
+        raise ValueError(f"❗ Некорректное время: {start_dt}") from None
+    with transaction(db_path) as conn:
+        if is_slot_blocked(conn, project_id, start_dt, duration_cells, slot_size_min):
             raise ValueError("⛔ Слот заблокирован администратором")
-        if is_slot_booked(conn, project_id, start_dt):
+        if is_slot_booked(conn, project_id, start_dt, duration_cells, slot_size_min):
             raise ValueError("❌ Этот слот уже занят")
-        # внутри той же транзакции:
-        bid = create_booking(
-            project_id, user_id, service_id,
-            start_dt, duration_cells, client_name, client_phone
+        cur = conn.execute(
+            "INSERT INTO bookings(project_id,user_id,service_id,start_dt,duration_cells,client_name,client_phone) "
+            "VALUES(?,?,?,?,?,?,?)",
+            (project_id, user_id, service_id, start_dt, duration_cells, client_name, client_phone)
         )
-        return bid
+        return cur.lastrowid
+
+
+# --- поиск свободных слотов ---------------------------------------------
+
+@engine_backed
+def schedule_rows(project_id: int, lo: int, hi: int, db_path: Path | str = DB_PATH):
+    """
+    Окна работы (start_ts, end_ts) и занятые брони (start_ts, duration_cells),
+    которые могут задеть [lo, hi). Два запроса на весь диапазон,
+    независимо от числа дней и ячеек.
+    """
+    marks = ",".join("?" * len(BUSY_STATUSES))
+    with read_transaction(db_path) as conn:
+        intervals = conn.execute(
+            "SELECT start_ts, CAST(strftime('%s', end_dt) AS INTEGER) FROM work_intervals "
+            "WHERE project_id=? AND start_ts>=? AND start_ts<?",
+            (project_id, lo - LOOKBACK_S, hi)
+        ).fetchall()
+        bookings = conn.execute(
+            "SELECT start_ts, duration_cells FROM bookings "
+            f"WHERE project_id=? AND status IN ({marks}) AND start_ts>=? AND start_ts<?",
+            (project_id, *BUSY_STATUSES, lo - LOOKBACK_S, hi)
+        ).fetchall()
+    return intervals, bookings
+
+def find_free_slots(
+    project_id: int,
+    date_str: str,
+    duration_cells: int,
+    days: int = 1,
+    slot_size_min: int = SLOT_SIZE_MIN,
+    db_path: Path | str = DB_PATH
+) -> list[str]:
+    """
+    Все начала, куда помещается услуга длиной duration_cells ячеек,
+    на days дней начиная с date_str ('YYYYMMDD' или 'YYYY-MM-DD').
+    Ячейка свободна, если лежит в окне работы (work_intervals), не занята
+    бронью в статусе из BUSY_STATUSES и не попадает в активное исключение.
+    Возвращает строки 'YYYYMMDD_HHMM' по возрастанию (формат callback'ов бота).
+    """
+    day = parse_day(date_str)
+    lo = day_epoch(day)
+    hi = lo + days * 86400
+    cell_s = slot_size_min * 60
+    exceptions = exception_index.segments(project_id, lo, hi, db_path)
+    intervals, bookings = schedule_rows(project_id, lo, hi, db_path)
+    free = free_cells(lo, days, cell_s, intervals, bookings, exceptions)
+    return slot_names(day, cell_s, fitting_starts(free, duration_cells))
+
+def blocked_slots(
+    project_id: int,
+    starts: list[str],
+    duration_cells: int = 1,
+    slot_size_min: int = SLOT_SIZE_MIN,
+    db_path: Path | str = DB_PATH
+) -> list[bool]:
+    """
+    Для каждого начала из starts (ISO) — задевает ли [start, start +
+    duration_cells ячеек) активное исключение. Без запросов к БД, кроме
+    сверки версии и загрузки проекта в exception_index; O(N + k) на N слотов.
+    Неразборчивое время считается заблокированным. Для самой брони
+    решает is_slot_blocked внутри транзакции create_booking_safe.
+    """
+    intervals, bad = [], []
+    for start_dt in starts:
+        try:
+            intervals.append(_interval(start_dt, duration_cells, slot_size_min))
+            bad.append(False)
+        except (TypeError, ValueError):
+            intervals.append((0, 0))
+            bad.append(True)
+    hits = exception_index.blocked(project_id, intervals, db_path)
+    return [b or h for b, h in zip(bad, hits)]
+
+def day_schedule(
+    project_id: int,
+    date_str: str,
+    slot_size_min: int = SLOT_SIZE_MIN,
+    db_path: Path | str = DB_PATH
+) -> list[tuple[str, str]]:
+    """
+    Сетка дня для просмотра расписания администратором: по каждой ячейке
+    ('HH:MM', состояние), состояние — 'blocked' (активное исключение),
+    'busy' (бронь), 'off' (вне окон работы) или 'free'.
+    Блокировки — одним blocked_slots по всем ячейкам, а не is_slot_blocked
+    на каждую; окна и брони — двумя запросами schedule_rows.
+    """
+    day = parse_day(date_str)
+    lo = day_epoch(day)
+    cell_s = slot_size_min * 60
+    step = timedelta(seconds=cell_s)
+    cells = [day + i * step for i in range(86400 // cell_s)]
+    intervals, bookings = schedule_rows(project_id, lo, lo + 86400, db_path)
+    working = free_cells(lo, 1, cell_s, intervals, (), ())
+    unbooked = free_cells(lo, 1, cell_s, [(lo, lo + 86400)], bookings, ())
+    blocked = blocked_slots(project_id, [c.isoformat() for c in cells], 1, slot_size_min, db_path)
+    return [
+        (c.strftime("%H:%M"),
+         "blocked" if blocked[i] else "busy" if not unbooked[i]
+         else "off" if not working[i] else "free")
+        for i, c in enumerate(cells)
+    ]
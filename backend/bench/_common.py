@@ -0,0 +1,67 @@
+# bench/_common.py
+"""
+Общее для бенчмарков и тестов: временная БД конструктора, проект-болванка
+и замер времени. Бенчмарки запускаются из backend/: python -m bench.<имя>;
+tests/conftest.py строит на temp_database фикстуру db_path.
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+
+from app import database
+from app.utils import db_safe, exception_index, feedback, moderation
+
+# Модули, которые держат путь к основной БД у себя
+_DB_PATH_HOLDERS = (database, db_safe, feedback, moderation)
+
+
+@contextmanager
+def temp_database():
+    """
+    Создаёт БД конструктора во временном каталоге и на время блока
+    переключает на неё app.database и app.utils.* (DB_PATH).
+    """
+    tmp = Path(tempfile.mkdtemp(prefix="bench-"))
+    path = tmp / "database.db"
+    saved = [(m, m.DB_PATH) for m in _DB_PATH_HOLDERS]
+    export_utils = sys.modules.get("app.export_utils")
+    if export_utils is not None:
+        saved.append((export_utils, export_utils.DB_PATH))
+    for module, _ in saved:
+        module.DB_PATH = path
+    database.invalidate_project()
+    exception_index.invalidate()
+    try:
+        database.init_db(path)
+        yield path
+    finally:
+        db_safe.close_pool(path)
+        for module, old in saved:
+            module.DB_PATH = old
+        database.invalidate_project()
+        exception_index.invalidate()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def make_project(name: str = "bench", template_type: str = "order_bot",
+                 conn=None, **fields) -> int:
+    """Создаёт проект через app.database.create_project и возвращает его id."""
+    project = dict(name=name, template_type=template_type, description="",
+                   token="t", content={"admin_chat_id": 1})
+    project.update(fields)
+    return database.create_project(SimpleNamespace(**project), conn=conn)
+
+
+def best_of(fn, repeat: int = 3) -> float:
+    """Лучшее время fn() из repeat запусков, секунды."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
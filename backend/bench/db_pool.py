@@ -0,0 +1,92 @@
+# bench/db_pool.py
+"""
+Соединение на каждый вызов против пула db_safe (user-010).
+Режимы переключаются переменной DB_POOL_SIZE (0 — пул выключен), поэтому
+каждый замер идёт в отдельном процессе:
+1) синхронный FastAPI-обработчик с get_projects() под конкурентной
+   нагрузкой (httpx.ASGITransport, без сети)
+2) get_projects() в одном потоке, мкс на вызов
+
+    python -m bench.db_pool [--requests 4000] [--concurrency 64]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+MODES = (("connect per call", "0"), ("pool", "8"))
+
+
+def run_once(requests: int, concurrency: int, calls: int) -> dict:
+    import httpx
+    from fastapi import FastAPI
+
+    from app import database
+    from bench._common import make_project, temp_database
+
+    with temp_database():
+        project_id = make_project()
+
+        app = FastAPI()
+
+        @app.get("/projects/{pid}")
+        def read(pid: int):
+            # мимо кэша проектов — каждый запрос идёт в SQLite
+            database.invalidate_project(pid)
+            return database.get_projects(pid)
+
+        async def load() -> float:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                sem = asyncio.Semaphore(concurrency)
+
+                async def one():
+                    async with sem:
+                        r = await client.get(f"/projects/{project_id}")
+                        r.raise_for_status()
+
+                started = time.perf_counter()
+                await asyncio.gather(*(one() for _ in range(requests)))
+                return time.perf_counter() - started
+
+        seconds = asyncio.run(load())
+
+        started = time.perf_counter()
+        for _ in range(calls):
+            database.invalidate_project(project_id)
+            database.get_projects(project_id)
+        per_call = (time.perf_counter() - started) / calls
+
+    return {"rps": requests / seconds, "per_call_us": per_call * 1e6}
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_once(args.requests, args.concurrency, args.calls)))
+        return
+
+    for name, pool_size in MODES:
+        out = subprocess.run(
+            [sys.executable, "-m", "bench.db_pool", "--child",
+             "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+             "--calls", str(args.calls)],
+            env={**os.environ, "DB_POOL_SIZE": pool_size},
+            capture_output=True, text=True, check=True,
+        )
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"  {name:<17} {r['rps']:8.0f} req/s   get_projects {r['per_call_us']:7.1f} us/call")
+
+
+if __name__ == "__main__":
+    main()
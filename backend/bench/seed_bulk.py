@@ -0,0 +1,50 @@
+# bench/seed_bulk.py
+"""
+Засев товаров (user-016): add_product() построчно — своя транзакция на
+каждую строку, как сидеры работали раньше, — против add_products_bulk()
+одним executemany в одной транзакции.
+
+    python -m bench.seed_bulk [--products 10000]
+"""
+
+import argparse
+import time
+
+from app import database
+from bench._common import make_project, temp_database
+
+
+def make_items(n: int) -> list[tuple[str, str, str, str]]:
+    return [(f"Товар {i}", "кратко", "подробное описание " * 5, "") for i in range(n)]
+
+
+def per_row(project_id: int, items) -> None:
+    for item in items:
+        database.add_product(project_id, *item)
+
+
+def bulk(project_id: int, items) -> None:
+    database.add_products_bulk(project_id, items)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    items = make_items(args.products)
+    print(f"  {args.products} товаров в один проект")
+    for name, fn, commits in (("add_product per row", per_row, args.products),
+                              ("add_products_bulk", bulk, 1)):
+        # каждый вариант — в свежей БД, чтобы размер таблицы не влиял
+        with temp_database():
+            project_id = make_project()
+            started = time.perf_counter()
+            fn(project_id, items)
+            seconds = time.perf_counter() - started
+            assert len(database.get_products_list(project_id)) == args.products
+        print(f"  {name:<20} {seconds:8.3f} s  транзакций: {commits}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# bench/wal_reads.py
+"""
+Пропускная способность конкурентного чтения (user-011): N потоков крутят
+get_projects(), один поток раз в 1 мс пишет update_project_content().
+
+- legacy: журнал отката (journal_mode=DELETE), чтение под BEGIN IMMEDIATE —
+  как до WAL; эмулируется подменой read_transaction на transaction
+- wal: WAL, чтение через read-only соединения без блокировки записи
+
+Каждый режим — в отдельном процессе (journal_mode хранится в файле БД).
+
+    python -m bench.wal_reads [--readers 1 4 8] [--seconds 3]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import threading
+import time
+
+
+def run_once(mode: str, readers: int, seconds: float) -> dict:
+    from app import database
+    from app.utils import db_safe
+    from bench._common import make_project, temp_database
+
+    if mode == "legacy":
+        db_safe.JOURNAL_MODE = "DELETE"
+        db_safe.read_transaction = db_safe.transaction
+
+    with temp_database():
+        project_id = make_project()
+        stop = threading.Event()
+        counts = [0] * (readers + 1)
+
+        def reader(i: int):
+            while not stop.is_set():
+                database.get_projects(project_id)
+                counts[i] += 1
+
+        def writer():
+            n = 0
+            while not stop.is_set():
+                database.update_project_content(project_id, {"admin_chat_id": 1, "n": n})
+                counts[readers] += 1
+                n += 1
+                time.sleep(0.001)
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+        threads.append(threading.Thread(target=writer))
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+
+    return {"reads": sum(counts[:readers]) / seconds, "writes": counts[readers] / seconds}
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--readers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "READERS"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        mode, readers = args.child
+        print(json.dumps(run_once(mode, int(readers), args.seconds)))
+        return
+
+    print(f"  {'readers':<8} {'legacy (rollback journal)':>30} {'wal (ro reads)':>30}")
+    for readers in args.readers:
+        cells = []
+        for mode in ("legacy", "wal"):
+            out = subprocess.run(
+                [sys.executable, "-m", "bench.wal_reads", "--child", mode, str(readers),
+                 "--seconds", str(args.seconds)],
+                capture_output=True, text=True, check=True,
+            )
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            cells.append(f"{r['reads']:8.0f} reads/s {r['writes']:6.0f} w/s")
+        print(f"  {readers:<8} {cells[0]:>30} {cells[1]:>30}")
+
+
+if __name__ == "__main__":
+    main()
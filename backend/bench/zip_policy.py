@@ -0,0 +1,107 @@
+# bench/zip_policy.py
+"""
+Размер и время экспорта «тяжёлого» по медиа проекта (user-006):
+все записи STORED (прежний ZipFile), deflate всего, политика по расширениям
+в один поток и в ZIP_WORKERS потоков.
+
+    python -m bench.zip_policy [--media-mb 55] [--db-mb 11]
+"""
+
+import argparse
+import io
+import os
+import random
+import sqlite3
+import tempfile
+import zipfile
+from pathlib import Path
+from unittest import mock
+
+from app import export_utils
+from app.export_utils import ZIP_WORKERS, stream_zip
+from bench._common import best_of
+
+
+def make_files(tmp: Path, media_mb: int, db_mb: int) -> list[tuple[str, Path | bytes]]:
+    """Код и README бота, проектная .db и несжимаемые медиа (jpg/mp4)."""
+    rnd = random.Random(0)
+    code = (Path(export_utils.__file__).read_text(encoding="utf-8") * 4).encode("utf-8")
+    files: list[tuple[str, Path | bytes]] = [
+        ("bot.py", code),
+        ("run.py", code[:20000]),
+        ("README.md", ("Бот заказов. " * 4000).encode("utf-8")),
+    ]
+
+    db = tmp / "order_bot.db"
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE products(id INTEGER PRIMARY KEY, name TEXT, full_desc TEXT)")
+    words = ["кофе", "чай", "торт", "пицца", "доставка", "скидка", "заказ", "набор"]
+    rows = db_mb * 1024 * 1024 // 300
+    conn.executemany("INSERT INTO products(name, full_desc) VALUES(?,?)",
+                     ((f"Товар {i}", " ".join(rnd.choices(words, k=40))) for i in range(rows)))
+    conn.commit()
+    conn.close()
+    files.append(("utils/order_bot.db", db))
+
+    media_dir = tmp / "media"
+    media_dir.mkdir()
+    for i in range(30):
+        path = media_dir / f"photo_{i}.jpg"
+        path.write_bytes(os.urandom(media_mb * 1024 * 1024 * 2 // 3 // 30))
+        files.append((f"media/1/{path.name}", path))
+    for i in range(5):
+        path = media_dir / f"clip_{i}.mp4"
+        path.write_bytes(os.urandom(media_mb * 1024 * 1024 // 3 // 5))
+        files.append((f"media/1/{path.name}", path))
+    return files
+
+
+def stored_zipfile(files) -> int:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for arcname, data in files:
+            if isinstance(data, Path):
+                zf.write(data, arcname)
+            else:
+                zf.writestr(arcname, data)
+    return buf.tell()
+
+
+def streamed(files, workers: int) -> int:
+    return sum(len(chunk) for chunk in stream_zip(iter(files), workers=workers))
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--media-mb", type=int, default=55)
+    parser.add_argument("--db-mb", type=int, default=11)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="bench-zip-") as tmp:
+        files = make_files(Path(tmp), args.media_mb, args.db_mb)
+        total = sum(d.stat().st_size if isinstance(d, Path) else len(d) for _, d in files)
+        print(f"sources: {len(files)} files, {total / 1e6:.2f} MB")
+
+        deflate_all = mock.patch.object(export_utils, "compression_for",
+                                        lambda name: zipfile.ZIP_DEFLATED)
+        cases = [
+            ("previous writer, all stored", lambda: stored_zipfile(files)),
+            ("deflate everything, 1 thread", lambda: streamed(files, 1), deflate_all),
+            ("policy, 1 thread", lambda: streamed(files, 1)),
+        ]
+        if ZIP_WORKERS > 1:
+            cases.append((f"policy, {ZIP_WORKERS} threads", lambda: streamed(files, ZIP_WORKERS)))
+        else:
+            print("  (ZIP_WORKERS=1 на этой машине — параллельный вариант пропущен)")
+        for name, fn, *patch in cases:
+            if patch:
+                with patch[0]:
+                    size, seconds = fn(), best_of(fn, args.repeat)
+            else:
+                size, seconds = fn(), best_of(fn, args.repeat)
+            print(f"  {name:<30} {size / 1e6:8.2f} MB  {seconds * 1000:8.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# tests/conftest.py
+"""
+Общие фикстуры: каждая проверка работает со своей БД конструктора
+во временном каталоге. Тесты запускаются из backend/: python -m pytest
+"""
+
+import sqlite3
+
+import pytest
+
+from app.utils import dp
+from bench._common import temp_database
+
+
+@pytest.fixture
+def db_path():
+    """
+    Пустая БД конструктора последней версии схемы во временном каталоге;
+    DB_PATH переключён на неё (см. bench/_common.temp_database).
+    """
+    with temp_database() as path:
+        yield path
+
+
+@pytest.fixture
+def bot_db_path(tmp_path, monkeypatch):
+    """БД бота (utils/dp.py) во временном каталоге."""
+    path = tmp_path / "bot.db"
+    monkeypatch.setattr(dp, "DB_PATH", path)
+    dp.init_db()
+    return path
+
+
+@pytest.fixture
+def traced(monkeypatch):
+    """Список SQL (с подставленными параметрами), выполненных новыми соединениями."""
+    statements: list[str] = []
+    connect = sqlite3.connect
+
+    def traced_connect(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(sqlite3, "connect", traced_connect)
+    return statements
@@ -0,0 +1,80 @@
+# tests/test_async_db.py
+"""
+Чтение из async-обработчиков через app.async_db (user-017) не встаёт в
+очередь за долгой записью, а read-only соединения работают и без пула
+(DB_POOL_SIZE=0), когда -wal/-shm уже удалены.
+"""
+
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app import async_db, database
+from app.utils import db_safe
+from bench._common import make_project
+
+SLOW_WRITE_S = 1.0
+READS = 20
+
+
+def test_reads_are_not_serialized_behind_slow_write(db_path):
+    project_id = make_project()
+    app = FastAPI()
+
+    def slow_write():
+        # держит блокировку записи SLOW_WRITE_S секунд
+        with db_safe.transaction(db_path) as conn:
+            conn.execute("UPDATE projects SET description='busy' WHERE id=?", (project_id,))
+            time.sleep(SLOW_WRITE_S)
+
+    @app.post("/write")
+    async def write():
+        await async_db.run_db(slow_write)
+
+    @app.get("/projects/{pid}")
+    async def read(pid: int):
+        database.invalidate_project(pid)        # мимо кэша — каждый запрос идёт в SQLite
+        return await async_db.get_projects(pid)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            writing = asyncio.create_task(client.post("/write"))
+            await asyncio.sleep(0.1)
+
+            async def timed_read() -> float:
+                started = time.perf_counter()
+                r = await client.get(f"/projects/{project_id}")
+                r.raise_for_status()
+                assert r.json()["description"] == ""    # снимок до записи
+                return time.perf_counter() - started
+
+            latencies = await asyncio.gather(*(timed_read() for _ in range(READS)))
+            write_pending = not writing.done()
+            (await writing).raise_for_status()
+            return latencies, write_pending
+
+    latencies, write_pending = asyncio.run(scenario())
+    assert write_pending, "запись закончилась раньше чтений — проверка ничего не показала"
+    assert max(latencies) < SLOW_WRITE_S / 2, latencies
+
+
+def test_readonly_reads_without_pool_after_wal_files_removed(db_path, monkeypatch):
+    # пулы размера 0 (как при DB_POOL_SIZE=0): соединение закрывается после каждого вызова
+    db_safe.close_pool(db_path)
+    for readonly in (False, True):
+        key = (str(db_path.resolve()), readonly)
+        monkeypatch.setitem(db_safe._pools, key,
+                            db_safe.ConnectionPool(key[0], size=0, readonly=readonly))
+    project_id = make_project()
+
+    for suffix in ("-wal", "-shm"):
+        db_path.with_name(db_path.name + suffix).unlink(missing_ok=True)
+    database.invalidate_project()
+
+    with db_safe.read_transaction(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM projects").fetchone()[0] == 1
+    assert database.get_projects(project_id)["name"] == "bench"
+    assert asyncio.run(async_db.get_projects(project_id))["name"] == "bench"
@@ -0,0 +1,116 @@
+# tests/test_exception_index.py
+"""
+Индекс исключений (user-023): событие, пришедшее между SELECT и записью
+индекса в кэш, не теряется; правка из другого процесса видна по версии
+work_exceptions_rev; индексы разных файлов БД не смешиваются;
+ProjectExceptions.blocked отвечает за N слотов одним проходом.
+"""
+
+import sqlite3
+from datetime import datetime, timedelta
+
+from app import database
+from app.storage import iso_epoch
+from app.utils import exception_index
+from app.utils.exception_index import ProjectExceptions
+
+PROJECT_ID = 1
+
+
+def iso(hours: int) -> str:
+    base = datetime(2030, 1, 1)
+    return (base + timedelta(hours=hours)).isoformat()
+
+
+def epoch(hours: int) -> int:
+    return iso_epoch(iso(hours))
+
+
+def test_event_during_load_is_not_lost(db_path, monkeypatch):
+    database.add_work_exception(PROJECT_ID, iso(0), iso(1), "active")
+    planned = database.add_work_exception(PROJECT_ID, iso(10), iso(11), "planned")
+    load = exception_index._load
+    calls = []
+
+    def racing_load(project_id, path):
+        index = load(project_id, path)
+        if not calls:
+            # изменения после SELECT, но до записи индекса в _projects
+            database.add_work_exception(PROJECT_ID, iso(5), iso(6), "active")
+            database.activate_planned_exception(planned)
+        calls.append(project_id)
+        return index
+
+    monkeypatch.setattr(exception_index, "_load", racing_load)
+    segments = exception_index.segments(PROJECT_ID, epoch(0), epoch(24), db_path)
+    assert segments == [(epoch(0), epoch(1)), (epoch(5), epoch(6)), (epoch(10), epoch(11))]
+    assert len(calls) == 2
+
+    # повторные события по уже загруженному индексу не дублируют интервалы
+    database.add_work_exception(PROJECT_ID, iso(20), iso(21), "active")
+    assert len(exception_index.get(PROJECT_ID, db_path).active) == 4
+
+
+def test_indexes_are_per_database(db_path, tmp_path, monkeypatch):
+    database.add_work_exception(PROJECT_ID, iso(0), iso(1), "active")
+    other = tmp_path / "other.db"
+    database.init_db(other)
+    monkeypatch.setattr(database, "DB_PATH", other)
+    database.add_work_exception(PROJECT_ID, iso(5), iso(6), "active")
+
+    assert exception_index.segments(PROJECT_ID, epoch(0), epoch(24), db_path) \
+        == [(epoch(0), epoch(1))]
+    assert exception_index.segments(PROJECT_ID, epoch(0), epoch(24), other) \
+        == [(epoch(5), epoch(6))]
+
+    exception_index.invalidate(PROJECT_ID, other)
+    assert exception_index.get(PROJECT_ID, db_path).active
+    assert exception_index.segments(PROJECT_ID, epoch(0), epoch(24), other) \
+        == [(epoch(5), epoch(6))]
+
+
+def test_write_from_another_process_is_seen(db_path):
+    database.add_work_exception(PROJECT_ID, iso(0), iso(1), "active")
+    planned = database.add_work_exception(PROJECT_ID, iso(10), iso(11), "planned")
+    index = exception_index.get(PROJECT_ID, db_path)
+    assert exception_index.get(PROJECT_ID, db_path) is index     # версия та же — кэш
+
+    # другой процесс: своё соединение, событий exception_index не шлёт
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO work_exceptions(project_id,start_dt,end_dt,state) "
+                     "VALUES(?,?,?,'active')", (PROJECT_ID, iso(5), iso(6)))
+    assert exception_index.segments(PROJECT_ID, epoch(0), epoch(24), db_path) \
+        == [(epoch(0), epoch(1)), (epoch(5), epoch(6))]
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE work_exceptions SET state='active' WHERE id=?", (planned,))
+    assert len(exception_index.get(PROJECT_ID, db_path).active) == 3
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM work_exceptions WHERE project_id=?", (PROJECT_ID,))
+    assert exception_index.segments(PROJECT_ID, epoch(0), epoch(24), db_path) == []
+
+    # своя правка поднимает версию индекса вместе с БД — без перезагрузки
+    database.add_work_exception(PROJECT_ID, iso(2), iso(3), "active")
+    index = exception_index.get(PROJECT_ID, db_path)
+    assert exception_index.get(PROJECT_ID, db_path) is index
+    assert index.rev == database.get_exceptions_rev(PROJECT_ID, db_path)
+
+
+def test_project_exceptions_blocked():
+    index = ProjectExceptions()
+    for exception_id, (start, end) in enumerate([(50, 60), (10, 20), (15, 30), (40, 45)]):
+        index.add(exception_id, start, end, "active")
+    index.add(9, 0, 100, "planned")                 # запланированное не блокирует
+    assert index.merged() == ([10, 40, 50], [30, 45, 60])
+
+    # стык с концом или началом — не пересечение
+    slots = [(0, 10), (5, 11), (30, 40), (29, 31), (45, 50), (44, 46), (60, 70), (59, 61)]
+    assert index.blocked(slots) == [False, True, False, True, False, True, False, True]
+    # порядок ответа — порядок слотов, даже если они не отсортированы
+    assert index.blocked(slots[::-1]) == index.blocked(slots)[::-1]
+    assert index.blocked([]) == []
+    assert ProjectExceptions().blocked([(0, 100)]) == [False]
+
+    index.activate(9)
+    assert index.blocked(slots) == [True] * len(slots)
@@ -0,0 +1,135 @@
+# tests/test_export_api.py
+"""
+Фоновый экспорт (user-004): этапы и ETA задачи, 429 при переполненной
+очереди, 409/410 при скачивании неготового, массового или вытесненного
+архива. Роутер app.export_api подключается к отдельному FastAPI().
+Архив smart_booking_crm (user-025) несёт utils/dp.py и его БД.
+"""
+
+import io
+import zipfile
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import database, export_cache, export_jobs, export_utils
+from app.export_api import router
+from app.utils import dp
+from bench._common import make_project
+
+
+@pytest.fixture
+def client(db_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(export_cache, "EXPORTS_DIR", tmp_path / "exports")
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+@pytest.fixture
+def project(db_path) -> dict:
+    return database.get_projects(make_project("shop"))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(export_jobs, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def register(monkeypatch, job):
+    monkeypatch.setitem(export_jobs._jobs, job.id, job)
+    return job
+
+
+def test_job_stage_and_eta(project, clock):
+    job = export_jobs.ExportJob(project)
+    assert job.to_dict()["stage"] == "queued"
+    assert job.eta_seconds() is None
+
+    job.started_at = clock[0]
+    job._on_stage("render", 100)
+    assert (job.stage, job.eta_seconds()) == ("render", None)   # ещё ничего не упаковано
+
+    clock[0] += 10
+    job._on_progress(25)
+    job._on_stage("media", 100)
+    assert job.stage == "media"
+    assert job.eta_seconds() == 70.0        # 10 с на 25 байт, осталось 175
+
+    job._on_chunk(b"x" * 7)
+    job.stage = "failed"
+    assert job.eta_seconds() is None
+    job.stage = "done"
+    assert job.to_dict()["eta_seconds"] == 0.0
+    assert job.to_dict()["bytes_written"] == 7
+
+
+def test_job_run_builds_archive(client, project):
+    job = export_jobs.ExportJob(project)
+    stages = []
+    on_stage = job._on_stage
+    job._on_stage = lambda stage, nbytes: (stages.append(stage), on_stage(stage, nbytes))
+    job.run()
+
+    assert job.stage == "done", job.error
+    assert stages == ["render", "media", "utils", "database"]
+    assert job.bytes_read > 0
+    assert job.bytes_written == job.path.stat().st_size
+
+
+def test_queue_full_is_429(client, project, monkeypatch):
+    monkeypatch.setattr(export_jobs, "EXPORT_QUEUE_LIMIT", 0)
+    r = client.post(f"/projects/{project['id']}/exports")
+    assert r.status_code == 429
+    r = client.post("/exports/bulk", json={"template_type": "order_bot"})
+    assert r.status_code == 429
+
+
+def test_unknown_project_and_job_are_404(client):
+    assert client.post("/projects/999/exports").status_code == 404
+    assert client.get("/exports/nope").status_code == 404
+    assert client.get("/exports/nope/download").status_code == 404
+
+
+def test_bulk_needs_exactly_one_selector(client):
+    assert client.post("/exports/bulk", json={}).status_code == 400
+    r = client.post("/exports/bulk", json={"project_ids": [1], "template_type": "order_bot"})
+    assert r.status_code == 400
+
+
+def test_download_not_ready_is_409(client, project, monkeypatch):
+    job = register(monkeypatch, export_jobs.ExportJob(project))
+    r = client.get(f"/exports/{job.id}/download")
+    assert r.status_code == 409
+    assert client.get(f"/exports/{job.id}").json()["stage"] == "queued"
+
+    bulk = register(monkeypatch, export_jobs.BulkExportJob([project["id"]], None, 1))
+    bulk.stage = "done"
+    assert client.get(f"/exports/{bulk.id}/download").status_code == 409
+
+
+def test_download_done_and_evicted(client, project, monkeypatch):
+    job = register(monkeypatch, export_jobs.ExportJob(project))
+    job.run()
+    assert job.stage == "done", job.error
+
+    r = client.get(f"/exports/{job.id}/download")
+    assert r.status_code == 200
+    assert 'filename="shop.zip"' in r.headers["content-disposition"]
+    names = zipfile.ZipFile(io.BytesIO(r.content)).namelist()
+    assert "run.py" in names
+
+    job.path.unlink()           # архив вытеснен из exports/
+    assert client.get(f"/exports/{job.id}/download").status_code == 410
+
+
+def test_booking_export_ships_bot_utils(db_path):
+    # шаблон импортирует utils.dp, а dp.DB_PATH — utils/database.db
+    project = database.get_projects(make_project("crm", template_type="smart_booking_crm"))
+    names = [name for name, _ in export_utils.iter_export_files(project)]
+    assert {"utils/dp.py", "utils/slot_grid.py", "utils/database.db"} <= set(names)
+    assert dp.DB_PATH.name == "database.db"
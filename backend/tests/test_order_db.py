@@ -0,0 +1,135 @@
+# tests/test_order_db.py
+"""
+Корзина order-бота (user-020): add_to_cart — один UPSERT без потерянных
+нажатий, init_db склеивает дубли позиций из старых БД, checkout переносит
+корзину в orders целиком или не переносит ничего.
+"""
+
+import sqlite3
+import threading
+
+import pytest
+
+from app.utils import order_db
+
+PROJECT_ID = 1
+USER_ID = 7
+THREADS = 8
+TAPS = 25
+
+
+@pytest.fixture
+def order_db_path(tmp_path, monkeypatch):
+    path = tmp_path / "order_bot.db"
+    monkeypatch.setattr(order_db, "DB_PATH", path)
+    order_db.init_db()
+    return path
+
+
+def rows(path, sql: str, params=()) -> list[tuple]:
+    with sqlite3.connect(path) as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def test_add_to_cart_upserts_one_row(order_db_path):
+    product = order_db.add_product(PROJECT_ID, "чай", "s", "f")
+    barrier = threading.Barrier(THREADS)
+
+    def tap():
+        barrier.wait()
+        for _ in range(TAPS):
+            order_db.add_to_cart(PROJECT_ID, USER_ID, product)
+
+    threads = [threading.Thread(target=tap) for _ in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    cart = order_db.add_to_cart(PROJECT_ID, USER_ID, product, 2)
+    assert [(i["product_id"], i["quantity"]) for i in cart] == [(product, THREADS * TAPS + 2)]
+    assert rows(order_db_path, "SELECT COUNT(*) FROM cart_items") == [(1,)]
+
+
+def test_init_db_merges_duplicate_positions(tmp_path, monkeypatch):
+    path = tmp_path / "old.db"
+    with sqlite3.connect(path) as conn:
+        # корзина старой версии: без уникального индекса, с дублями
+        conn.execute("CREATE TABLE cart_items (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                     "project_id INTEGER, user_id INTEGER, product_id INTEGER, "
+                     "quantity INTEGER DEFAULT 1)")
+        conn.executemany(
+            "INSERT INTO cart_items(project_id,user_id,product_id,quantity) VALUES(?,?,?,?)",
+            [(1, 7, 10, 1), (1, 7, 11, 5), (1, 7, 10, 2), (1, 8, 10, 4), (1, 7, 10, 3)])
+    monkeypatch.setattr(order_db, "DB_PATH", path)
+    order_db.init_db()
+
+    assert rows(path, "SELECT id, user_id, product_id, quantity FROM cart_items ORDER BY id") \
+        == [(1, 7, 10, 6), (2, 7, 11, 5), (4, 8, 10, 4)]
+    with pytest.raises(sqlite3.IntegrityError):
+        rows(path, "INSERT INTO cart_items(project_id,user_id,product_id) VALUES(1,7,10)")
+
+    order_db.init_db()          # повторный запуск ничего не меняет
+    assert rows(path, "SELECT SUM(quantity) FROM cart_items") == [(15,)]
+
+
+def test_checkout_moves_cart_to_orders(order_db_path):
+    tea = order_db.add_product(PROJECT_ID, "чай", "s", "f")
+    cake = order_db.add_product(PROJECT_ID, "торт", "s", "f")
+    order_db.add_to_cart(PROJECT_ID, USER_ID, tea, 2)
+    order_db.add_to_cart(PROJECT_ID, USER_ID, cake)
+    order_db.add_to_cart(PROJECT_ID, USER_ID + 1, cake)
+
+    items = order_db.checkout(PROJECT_ID, USER_ID, "ул. Ленина, 1", "photo.jpg")
+    assert [(i["product_id"], i["quantity"]) for i in items] == [(tea, 2), (cake, 1)]
+    assert rows(order_db_path, "SELECT user_id, product, quantity, address, media_path "
+                               "FROM orders ORDER BY id") \
+        == [(USER_ID, tea, 2, "ул. Ленина, 1", "photo.jpg"),
+            (USER_ID, cake, 1, "ул. Ленина, 1", "photo.jpg")]
+    assert order_db.get_cart_items(PROJECT_ID, USER_ID) == []
+    assert len(order_db.get_cart_items(PROJECT_ID, USER_ID + 1)) == 1
+
+    assert order_db.checkout(PROJECT_ID, USER_ID, "ул. Ленина, 1") == []
+    assert rows(order_db_path, "SELECT COUNT(*) FROM orders") == [(2,)]
+
+
+def test_failed_checkout_keeps_cart(order_db_path):
+    tea = order_db.add_product(PROJECT_ID, "чай", "s", "f")
+    order_db.add_to_cart(PROJECT_ID, USER_ID, tea, 3)
+    with sqlite3.connect(order_db_path) as conn:
+        # запись в orders падает после чтения корзины
+        conn.execute("CREATE TRIGGER no_orders BEFORE INSERT ON orders "
+                     "BEGIN SELECT RAISE(ABORT, 'orders offline'); END")
+
+    with pytest.raises(sqlite3.IntegrityError, match="orders offline"):
+        order_db.checkout(PROJECT_ID, USER_ID, "адрес")
+    assert [i["quantity"] for i in order_db.get_cart_items(PROJECT_ID, USER_ID)] == [3]
+    assert rows(order_db_path, "SELECT COUNT(*) FROM orders") == [(0,)]
+
+
+def test_checkout_races_with_add_to_cart(order_db_path):
+    tea = order_db.add_product(PROJECT_ID, "чай", "s", "f")
+    barrier = threading.Barrier(THREADS + 1)
+    ordered = []
+
+    def tap():
+        barrier.wait()
+        for _ in range(TAPS):
+            order_db.add_to_cart(PROJECT_ID, USER_ID, tea)
+
+    def check_out():
+        barrier.wait()
+        for _ in range(TAPS):
+            ordered.extend(i["quantity"] for i in order_db.checkout(PROJECT_ID, USER_ID, "адрес"))
+
+    threads = [threading.Thread(target=tap) for _ in range(THREADS)]
+    threads.append(threading.Thread(target=check_out))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # каждое нажатие — либо в заказе, либо ещё в корзине; ничего не потеряно
+    left = sum(i["quantity"] for i in order_db.get_cart_items(PROJECT_ID, USER_ID))
+    assert sum(ordered) + left == THREADS * TAPS
+    assert rows(order_db_path, "SELECT SUM(quantity) FROM orders") == [(sum(ordered) or None,)]
@@ -0,0 +1,127 @@
+# tests/test_outbox.py
+"""
+OutboxSender (user-025) с поддельными send и часами: повтор с паузой
+RETRY_BASE_S * 2**попытка, 'failed' после MAX_ATTEMPTS, параллельные
+drain() не отправляют одну строку дважды, а бывшая «в полёте» строка
+упавшего бота досылается после LEASE_S.
+"""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.utils import dp
+from app.utils.outbox import LEASE_S, MAX_ATTEMPTS, RETRY_BASE_S, OutboxSender
+
+PROJECT_ID = 1
+START = 1_900_000_000
+
+
+class Clock:
+    def __init__(self, now: float = START):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeSend:
+    """send(user_id, text): пишет вызовы; user_id из failing падают."""
+
+    def __init__(self, failing=()):
+        self.calls: list[tuple[int, str]] = []
+        self.failing = set(failing)
+
+    async def __call__(self, user_id: int, text: str) -> None:
+        self.calls.append((user_id, text))
+        await asyncio.sleep(0)          # уступаем цикл, как настоящая отправка
+        if user_id in self.failing:
+            raise ConnectionError(f"нет сети для {user_id}")
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def enqueue(path, users: list[int], batch: str = "b1") -> None:
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO outbox(project_id,user_id,text,batch) VALUES(?,?,?,?)",
+            [(PROJECT_ID, u, f"привет {u}", batch) for u in users]
+        )
+
+
+def rows(path) -> dict[int, tuple]:
+    with sqlite3.connect(path) as conn:
+        return {r[0]: r[1:] for r in conn.execute(
+            "SELECT user_id, state, attempts, next_ts FROM outbox")}
+
+
+def test_sends_pending_rows(bot_db_path, clock):
+    enqueue(bot_db_path, [1, 2, 3])
+    send = FakeSend()
+    sender = OutboxSender(bot_db_path, send, clock=clock)
+
+    assert asyncio.run(sender.drain()) == {"sent": 3, "retry": 0, "failed": 0}
+    assert sorted(send.calls) == [(1, "привет 1"), (2, "привет 2"), (3, "привет 3")]
+    assert sender.progress("b1") == {"pending": 0, "sent": 3, "failed": 0}
+    assert asyncio.run(sender.drain()) == {"sent": 0, "retry": 0, "failed": 0}
+
+
+def test_retry_backoff_then_failed(bot_db_path, clock):
+    enqueue(bot_db_path, [1, 2])
+    send = FakeSend(failing={2})
+    sender = OutboxSender(bot_db_path, send, clock=clock)
+
+    assert asyncio.run(sender.drain()) == {"sent": 1, "retry": 1, "failed": 0}
+    for attempt in range(1, MAX_ATTEMPTS - 1):
+        assert rows(bot_db_path)[2] == ("pending", attempt,
+                                        int(clock.now) + RETRY_BASE_S * 2 ** (attempt - 1))
+        clock.now += RETRY_BASE_S * 2 ** (attempt - 1) - 1
+        assert asyncio.run(sender.drain())["retry"] == 0    # пауза ещё не прошла
+        clock.now += 1
+        assert asyncio.run(sender.drain()) == {"sent": 0, "retry": 1, "failed": 0}
+
+    clock.now = rows(bot_db_path)[2][2]
+    assert asyncio.run(sender.drain()) == {"sent": 0, "retry": 0, "failed": 1}
+    assert rows(bot_db_path)[2][:2] == ("failed", MAX_ATTEMPTS)
+    assert send.calls.count((2, "привет 2")) == MAX_ATTEMPTS
+    assert sender.progress("b1") == {"pending": 0, "sent": 1, "failed": 1}
+
+
+def test_concurrent_drains_send_once(bot_db_path, clock):
+    users = list(range(1, 251))                 # больше BATCH_SIZE
+    enqueue(bot_db_path, users)
+    send = FakeSend()
+    first = OutboxSender(bot_db_path, send, concurrency=4, clock=clock)
+    second = OutboxSender(bot_db_path, send, concurrency=4, clock=clock)
+
+    async def both():
+        return await asyncio.gather(first.drain(), second.drain(), first.drain())
+
+    totals = asyncio.run(both())
+    assert sum(t["sent"] for t in totals) == len(users)
+    assert sorted(u for u, _ in send.calls) == users
+    assert first.progress("b1") == {"pending": 0, "sent": len(users), "failed": 0}
+
+
+def test_row_in_flight_is_resent_after_lease(bot_db_path, clock):
+    enqueue(bot_db_path, [1])
+    crashed = OutboxSender(bot_db_path, FakeSend(), clock=clock)
+
+    async def crash():
+        task = asyncio.create_task(crashed.drain())
+        await asyncio.sleep(0)          # строка забрана, send ещё не завершён
+        task.cancel()
+
+    asyncio.run(crash())
+    assert rows(bot_db_path)[1][:2] == ("pending", 0)
+
+    send = FakeSend()
+    sender = OutboxSender(bot_db_path, send, clock=clock)
+    assert asyncio.run(sender.drain())["sent"] == 0     # ещё «в полёте»
+    clock.now += LEASE_S
+    assert asyncio.run(sender.drain())["sent"] == 1
+    assert send.calls == [(1, "привет 1")]
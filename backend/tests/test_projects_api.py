@@ -0,0 +1,73 @@
+# tests/test_projects_api.py
+"""
+Листинг проектов (user-015): keyset-пагинация по next_after_id, фильтр по
+шаблону и проверка fields — неизвестные поля и token дают 400.
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import database
+from app.projects_api import router
+from bench._common import make_project
+
+PROJECTS = 5
+
+
+@pytest.fixture
+def client(db_path):
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+@pytest.fixture
+def project_ids(db_path) -> list[int]:
+    return [
+        make_project(f"p{i}", "order_bot" if i % 2 else "faq_bot",
+                     token=f"secret{i}", content={"n": i})
+        for i in range(PROJECTS)
+    ]
+
+
+def test_pages_follow_next_after_id(client, project_ids):
+    seen, after_id = [], 0
+    while after_id is not None:
+        r = client.get("/projects", params={"after_id": after_id, "limit": 2})
+        assert r.status_code == 200
+        page = r.json()
+        assert page["total"] == PROJECTS
+        assert len(page["items"]) <= 2
+        seen += [p["id"] for p in page["items"]]
+        after_id = page["next_after_id"]
+    assert seen == project_ids
+
+    # ровно limit оставшихся строк — следующей страницы нет
+    r = client.get("/projects", params={"after_id": project_ids[2], "limit": 2})
+    assert r.json()["next_after_id"] is None
+
+
+def test_default_fields_and_template_filter(client, project_ids):
+    page = client.get("/projects", params={"template_type": "order_bot"}).json()
+    assert page["total"] == 2
+    assert [p["id"] for p in page["items"]] == [project_ids[1], project_ids[3]]
+    assert set(page["items"][0]) == set(database.PROJECT_LIST_FIELDS)
+
+
+def test_requested_fields(client, project_ids):
+    page = client.get("/projects", params={"fields": "name, content", "limit": 1}).json()
+    assert page["items"] == [{"id": project_ids[0], "name": "p0", "content": {"n": 0}}]
+    assert page["next_after_id"] == project_ids[0]
+
+
+@pytest.mark.parametrize("fields", ["token", "name,token", "nope"])
+def test_unknown_fields_are_400(client, project_ids, fields):
+    r = client.get("/projects", params={"fields": fields})
+    assert r.status_code == 400
+    assert "secret" not in r.text
+
+
+@pytest.mark.parametrize("limit", [0, 501])
+def test_limit_bounds(client, limit):
+    assert client.get("/projects", params={"limit": limit}).status_code == 422
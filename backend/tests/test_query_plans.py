@@ -0,0 +1,76 @@
+# tests/test_query_plans.py
+"""
+Выборки броней и окон по дате/интервалу (user-013) должны идти диапазоном
+по индексу на start_ts, а не сканировать таблицу. Запросы не дублируются
+в тесте: функции вызываются как есть, их SQL перехватывается через
+trace callback и прогоняется через EXPLAIN QUERY PLAN.
+"""
+
+import re
+import sqlite3
+
+from app import database
+from app.utils import db_safe, dp
+from app.utils.slots import is_slot_blocked
+
+
+def query_plans(path, statements: list[str], table: str) -> dict[str, str]:
+    """SQL → план для запросов к table, которые фильтруют по start_ts."""
+    plans = {}
+    with sqlite3.connect(path) as conn:
+        for sql in statements:
+            if table not in sql or "start_ts" not in sql or sql.lstrip().upper().startswith(
+                    ("CREATE", "ALTER", "PRAGMA")):
+                continue
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+            plans[sql] = "\n".join(r[-1] for r in rows)
+    assert plans, f"ни одного запроса к {table} по start_ts"
+    return plans
+
+
+def assert_uses_index(plans: dict[str, str], index: str) -> None:
+    """Поиск по index, причём диапазон по start_ts входит в условие индекса."""
+    for sql, plan in plans.items():
+        assert re.search(rf"SEARCH \w+ USING INDEX {index} \([^)]*start_ts[<>]", plan), \
+            f"{sql}\n→ {plan}"
+        assert "SCAN" not in plan, f"{sql}\n→ {plan}"
+
+
+def test_bookings_by_date_uses_status_ts_index(db_path, traced):
+    db_safe.close_pool(db_path)         # новые соединения — уже с трассировкой
+    database.get_bookings_by_date(1, "2025-03-01")
+    assert_uses_index(query_plans(db_path, traced, "bookings"), "idx_bookings_status_ts")
+
+
+def test_cancel_bookings_in_interval_uses_status_ts_index(db_path, traced):
+    db_safe.close_pool(db_path)
+    database.cancel_bookings_in_interval(1, "2025-03-01T10:00:00", "2025-03-01T18:00:00")
+    plans = query_plans(db_path, traced, "bookings")
+    assert any(sql.lstrip().upper().startswith("UPDATE") for sql in plans)
+    assert_uses_index(plans, "idx_bookings_status_ts")
+
+
+def test_work_intervals_use_ts_index(db_path, traced):
+    db_safe.close_pool(db_path)
+    database.get_work_intervals(1, 7)
+    assert_uses_index(query_plans(db_path, traced, "work_intervals"), "idx_work_intervals_ts")
+
+
+def test_slot_blocked_probe_uses_exceptions_ts_index(db_path, traced):
+    db_safe.close_pool(db_path)
+    with db_safe.transaction(db_path) as conn:
+        is_slot_blocked(conn, 1, "2025-03-01T10:00:00", 2)
+    plans = query_plans(db_path, traced, "work_exceptions")
+    for sql, plan in plans.items():
+        assert re.search(r"USING INDEX idx_work_exceptions_ts \([^)]*end_ts>", plan), \
+            f"{sql}\n→ {plan}"
+
+
+def test_bot_bookings_by_date_uses_status_ts_index(bot_db_path, traced):
+    dp.get_bookings_by_date(1, "2025-03-01", "confirmed")
+    assert_uses_index(query_plans(bot_db_path, traced, "bookings"), "idx_bookings_status_ts")
+
+
+def test_bot_future_bookings_use_status_ts_index(bot_db_path, traced):
+    dp.get_confirmed_future_bookings(1)
+    assert_uses_index(query_plans(bot_db_path, traced, "bookings"), "idx_bookings_status_ts")
@@ -0,0 +1,59 @@
+# tests/test_run_py.py
+"""
+run.py экспортированного бота (user-024): фоновые задачи шаблона
+(start_background) стартуют в цикле событий бота до start_polling.
+Сам шаблон здесь не импортируется (нужен aiogram) — вместо него модуль
+с теми же именами, который записывает порядок вызовов.
+"""
+
+import asyncio
+import sys
+import types
+
+import pytest
+
+from app.export_utils import _render_run_py
+
+TEMPLATE = "fake_bot_template"
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls: list[str] = []
+
+    async def setup_bot_commands(bot):
+        calls.append("commands")
+
+    async def start_polling(bot, skip_updates=False):
+        asyncio.get_running_loop()
+        calls.append("polling")
+
+    module = types.ModuleType(TEMPLATE)
+    module.bot = object()
+    module.dp = types.SimpleNamespace(start_polling=start_polling)
+    module.setup_bot_commands = setup_bot_commands
+    monkeypatch.setitem(sys.modules, TEMPLATE, module)
+    monkeypatch.setitem(sys.modules, "dotenv",
+                        types.SimpleNamespace(load_dotenv=lambda: None))
+    return calls
+
+
+def run(source: str) -> None:
+    namespace = {"__name__": "run"}
+    exec(compile(source, "run.py", "exec"), namespace)
+    asyncio.run(namespace["main"]())
+
+
+def test_background_tasks_start_before_polling(calls):
+    def start_background():
+        asyncio.get_running_loop()      # уже внутри цикла бота
+        calls.append("background")
+
+    sys.modules[TEMPLATE].start_background = start_background
+    run(_render_run_py(TEMPLATE))
+    assert calls == ["commands", "background", "polling"]
+
+
+def test_template_without_background_tasks(calls):
+    run(_render_run_py(TEMPLATE))
+    assert calls == ["commands", "polling"]
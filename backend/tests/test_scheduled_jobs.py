@@ -0,0 +1,146 @@
+# tests/test_scheduled_jobs.py
+"""
+JobWheel (user-024) на поддельных часах: горизонт догружается без дублей,
+опоздавшие дольше grace_s задачи — 'missed', упавшие повторяются и после
+MAX_ATTEMPTS становятся 'failed' (в том числе отменённые CancelledError),
+schedule_many после старта сразу попадает в корзины.
+"""
+
+import asyncio
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+from app.utils import scheduled_jobs
+from app.utils.scheduled_jobs import MAX_ATTEMPTS, JobWheel
+
+PROJECT_ID = 1
+START = 1_900_000_020            # 20 секунд после границы минуты
+HOUR = 3600
+
+
+class Clock:
+    def __init__(self, now: float = START):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def at(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def wheel(tmp_path, clock):
+    wheel = JobWheel(tmp_path / "jobs.db", PROJECT_ID, horizon_s=HOUR, clock=clock)
+    wheel.init_store()
+    return wheel
+
+
+def states(wheel) -> dict[int, tuple]:
+    with sqlite3.connect(wheel.db_path) as conn:
+        return {r[0]: r[1:] for r in conn.execute(
+            "SELECT ref_id, state, attempts FROM scheduled_jobs ORDER BY ref_id")}
+
+
+def tick(wheel) -> dict:
+    return asyncio.run(wheel.tick())
+
+
+def test_horizon_refill(wheel, clock):
+    ran = []
+    wheel.handler("remind")(lambda ref_id, label: ran.append(ref_id))
+    wheel.schedule("remind", 1, at(START - 120))             # просрочена на старте
+    wheel.schedule("remind", 2, at(START + HOUR / 2))
+    wheel.schedule("remind", 3, at(START + 2 * HOUR))        # за горизонтом
+
+    assert wheel._refill(clock()) == 2
+    assert tick(wheel) == {"done": 1, "missed": 0, "retry": 0, "failed": 0}
+
+    clock.now += 1.5 * HOUR
+    assert wheel._refill(clock()) == 1                        # только новый хвост окна
+    assert tick(wheel)["done"] == 1
+    clock.now += HOUR
+    assert tick(wheel)["done"] == 1
+    assert ran == [1, 2, 3]
+    assert wheel.buckets == {}
+
+
+def test_misfire_grace(wheel, clock):
+    ran = []
+    wheel.handler("strict", grace_s=60)(lambda ref_id, label: ran.append(ref_id))
+    wheel.handler("always", grace_s=None)(lambda ref_id, label: ran.append(ref_id))
+    wheel.schedule("strict", 1, at(START - 30))
+    wheel.schedule("strict", 2, at(START - 10 * 60))
+    wheel.schedule("always", 3, at(START - 10 * HOUR))
+
+    wheel._refill(clock())
+    assert tick(wheel) == {"done": 2, "missed": 1, "retry": 0, "failed": 0}
+    assert sorted(ran) == [1, 3]
+    assert states(wheel)[2] == ("missed", 0)
+
+
+@pytest.mark.parametrize("error", [RuntimeError("нет сети"), asyncio.CancelledError()])
+def test_retry_then_failed(wheel, clock, error):
+    async def flaky(ref_id, label):
+        raise error
+
+    wheel.handler("remind", grace_s=None)(flaky)
+    wheel.schedule("remind", 1, at(START))
+    wheel._refill(clock())
+
+    for attempt in range(1, MAX_ATTEMPTS):
+        assert tick(wheel) == {"done": 0, "missed": 0, "retry": 1, "failed": 0}
+        assert states(wheel)[1] == ("pending", attempt)
+        assert tick(wheel)["retry"] == 0                      # повтор — через attempt минут
+        clock.now += 60 * attempt
+    assert tick(wheel) == {"done": 0, "missed": 0, "retry": 0, "failed": 1}
+    assert states(wheel)[1] == ("failed", MAX_ATTEMPTS)
+    with sqlite3.connect(wheel.db_path) as conn:
+        last_error = conn.execute("SELECT last_error FROM scheduled_jobs").fetchone()[0]
+    assert last_error.startswith(type(error).__name__)
+
+
+def test_schedule_many_after_start(wheel, clock):
+    ran = []
+    wheel.handler("remind")(lambda ref_id, label: ran.append((ref_id, label)))
+    wheel.schedule("remind", 1, at(START + 60))
+    wheel._refill(clock())
+
+    wheel.schedule_many([
+        ("remind", 1, at(START + 120), ""),                   # перенос уже загруженной
+        ("remind", 2, at(START + 60), "2h"),
+        ("remind", 3, at(START + 2 * HOUR), ""),              # за горизонтом
+    ])
+    assert sum(len(b) for b in wheel.buckets.values()) == 2
+
+    clock.now += 60
+    assert tick(wheel)["done"] == 1
+    clock.now += 60
+    assert tick(wheel)["done"] == 1
+    assert ran == [(2, "2h"), (1, "")]
+    assert states(wheel)[3] == ("pending", 0)
+
+
+def test_cancel(wheel, clock):
+    wheel.handler("remind")(lambda ref_id, label: None)
+    wheel.schedule("remind", 1, at(START), "24h")
+    wheel.schedule("remind", 1, at(START), "2h")
+    wheel._refill(clock())
+    assert wheel.cancel("remind", 1) == 2
+    assert tick(wheel) == {"done": 0, "missed": 0, "retry": 0, "failed": 0}
+    assert states(wheel)[1][0] == "cancelled"
+
+
+def test_epoch_matches_sqlite():
+    with sqlite3.connect(":memory:") as conn:
+        expected = conn.execute("SELECT CAST(strftime('%s', ?) AS INTEGER)",
+                                (at(START).isoformat(),)).fetchone()[0]
+    assert scheduled_jobs._epoch(at(START)) == expected == START
@@ -0,0 +1,85 @@
+# tests/test_seeders.py
+"""
+Засев проекта (user-016): сидеры пишут в транзакцию вызывающего, поэтому
+сбой посреди засева (дубль alias у helper-бота) откатывает и строку
+проекта, и уже вставленные товары.
+Pydantic-моделей сидов в app.schemas нет — вместо них модуль с теми же
+именами, а сами сиды — объекты той же формы.
+"""
+
+import sqlite3
+import sys
+import types
+from types import SimpleNamespace
+
+import pytest
+
+from app import database, storage
+
+SEED_MODELS = ("SeedUnion", "OrderBotSeed", "FAQBotSeed", "HelperBotSeed",
+               "FeedbackBotSeed", "ModeratorBotSeed", "SmartBookingSeed", "QuizBotSeed")
+
+
+@pytest.fixture
+def seeders(monkeypatch):
+    schemas = types.ModuleType("app.schemas")
+    for name in SEED_MODELS:
+        setattr(schemas, name, SimpleNamespace)
+    monkeypatch.setitem(sys.modules, "app.schemas", schemas)
+    monkeypatch.delitem(sys.modules, "app.seeders", raising=False)
+    from app import seeders
+    yield seeders
+    sys.modules.pop("app.seeders", None)
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def engine(request, db_path, monkeypatch):
+    monkeypatch.setattr(storage, "_engine", None)
+    storage.set_engine(request.param)
+    return storage.get_engine()
+
+
+def make_project(seed=None):
+    return SimpleNamespace(name="seeded", template_type="order_bot", description="",
+                           token="t", content={"admin_chat_id": 1}, seed=seed)
+
+
+def order_seed(count=3):
+    return SimpleNamespace(type="order_bot", products=[
+        SimpleNamespace(name=f"item{i}", short_descr="s", full_descr="f", photo_file=None)
+        for i in range(count)
+    ])
+
+
+def helper_seed(*aliases):
+    return SimpleNamespace(type="helper_bot", entries=[
+        SimpleNamespace(alias=alias, content="text", photo_file=None) for alias in aliases
+    ])
+
+
+def test_duplicate_alias_rolls_back_caller_transaction(engine, seeders):
+    with pytest.raises(sqlite3.IntegrityError):
+        with storage.transaction() as conn:
+            project_id = database.create_project(make_project(), conn=conn)
+            seeders.seed_order_bot(project_id, order_seed(), conn)
+            seeders.apply_seed(project_id, helper_seed("hi", "bye", "hi"), conn=conn)
+
+    assert database.count_projects() == 0
+    assert database.get_products_list(project_id) == []
+
+
+def test_create_seeded_project(engine, seeders):
+    project_id = seeders.create_seeded_project(make_project(order_seed()))
+    assert database.get_projects(project_id)["name"] == "seeded"
+    assert [p["name"] for p in database.get_products_list(project_id)] \
+        == ["item0", "item1", "item2"]
+
+    with pytest.raises(sqlite3.IntegrityError):
+        seeders.create_seeded_project(make_project(helper_seed("a", "a")))
+    assert database.count_projects() == 1
+
+
+def test_unknown_seed_type(engine, seeders):
+    with pytest.raises(ValueError, match="Неизвестный тип"):
+        seeders.create_seeded_project(make_project(SimpleNamespace(type="nope")))
+    assert database.count_projects() == 0
@@ -0,0 +1,199 @@
+# tests/test_slots.py
+"""
+create_booking_safe (user-022): параллельные брони одного слота дают ровно
+одну строку, без «database is locked»; активное исключение блокирует слот,
+даже если началось больше суток назад.
+find_free_slots (user-021): брони и исключения вырезают ячейки из окон
+работы, NumPy и чистый Python дают одно и то же, число запросов не зависит
+от длины диапазона; бот (utils/dp.py) считает так же по своей БД.
+day_schedule (user-023): сетка дня, блокировки — из exception_index.
+"""
+
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import database
+from app.utils import db_safe, dp, slot_grid
+from app.utils.db_safe import transaction
+from app.utils.slots import (
+    create_booking_safe, day_schedule, find_free_slots, is_slot_blocked,
+)
+
+THREADS = 16
+PROJECT_ID = 1
+DAY = "2030-01-01"
+
+
+def slot(hours: int) -> str:
+    base = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    return (base + timedelta(hours=hours)).isoformat()
+
+
+def test_concurrent_bookings_of_one_slot(db_path):
+    start_dt = slot(24)
+    barrier = threading.Barrier(THREADS)
+    booked, refused, errors = [], [], []
+
+    def book(user_id: int):
+        barrier.wait()
+        try:
+            booked.append(create_booking_safe(
+                PROJECT_ID, user_id, 1, start_dt, 2, f"client {user_id}", "+7",
+                db_path=db_path))
+        except ValueError:
+            refused.append(user_id)
+        except sqlite3.Error as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=book, args=(i,)) for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert len(booked) == 1 and len(refused) == THREADS - 1
+    assert [b["id"] for b in database.get_all_bookings(PROJECT_ID)] == booked
+
+
+def test_long_active_exception_blocks_slot(db_path):
+    # паника на двое суток, проверяемый слот — через 30 часов после её начала
+    database.add_work_exception(PROJECT_ID, slot(-30), slot(18), "active")
+    with transaction(db_path) as conn:
+        assert is_slot_blocked(conn, PROJECT_ID, slot(0))
+        assert is_slot_blocked(conn, PROJECT_ID, slot(17))
+        assert not is_slot_blocked(conn, PROJECT_ID, slot(18))
+        assert not is_slot_blocked(conn, PROJECT_ID + 1, slot(0))
+    with pytest.raises(ValueError, match="заблокирован"):
+        create_booking_safe(PROJECT_ID, 1, 1, slot(1), 1, "client", "+7", db_path=db_path)
+
+
+def at(hhmm: str, day: str = DAY) -> str:
+    return f"{day}T{hhmm}:00"
+
+
+def fill_schedule(add_interval, add_booking, add_exception):
+    """
+    09:00–12:00 и 14:00–15:00; брони 09:30 (2 ячейки) и 10:50 (1 ячейка —
+    задевает две); активное исключение 11:20–11:40, запланированное 14:00–15:00.
+    """
+    add_interval(at("09:00"), at("12:00"))
+    add_interval(at("14:00"), at("15:00"))
+    add_booking(at("09:30"), 2)
+    add_booking(at("10:50"), 1)
+    add_exception(at("11:20"), at("11:40"), "active")
+    add_exception(at("14:00"), at("15:00"), "planned")
+
+
+FREE_1 = ["0900", "0915", "1000", "1015", "1030", "1145", "1400", "1415", "1430", "1445"]
+FREE_2 = ["0900", "1000", "1015", "1400", "1415", "1430"]
+FREE_4 = ["1400"]
+
+
+@pytest.fixture
+def schedule(db_path):
+    fill_schedule(
+        lambda start, end: database.add_work_interval(PROJECT_ID, start, end),
+        lambda start, cells: database.create_booking(
+            PROJECT_ID, 1, 1, start, cells, "client", "+7"),
+        lambda start, end, state: database.add_work_exception(PROJECT_ID, start, end, state),
+    )
+    return db_path
+
+
+def names(times: list[str], day: str = DAY) -> list[str]:
+    return [f"{day.replace('-', '')}_{t}" for t in times]
+
+
+def test_free_slots_are_cut_by_bookings_and_exceptions(schedule):
+    assert find_free_slots(PROJECT_ID, DAY, 1, db_path=schedule) == names(FREE_1)
+    assert find_free_slots(PROJECT_ID, DAY.replace("-", ""), 2, db_path=schedule) \
+        == names(FREE_2)
+    assert find_free_slots(PROJECT_ID, DAY, 4, db_path=schedule) == names(FREE_4)
+    assert find_free_slots(PROJECT_ID, DAY, 13, db_path=schedule) == []
+    assert find_free_slots(PROJECT_ID + 1, DAY, 1, db_path=schedule) == []
+
+
+def test_booked_and_blocked_cells_stay_taken(schedule):
+    create_booking_safe(PROJECT_ID, 2, 1, at("14:15"), 2, "client", "+7", db_path=schedule)
+    assert find_free_slots(PROJECT_ID, DAY, 1, db_path=schedule) \
+        == names(FREE_1[:7] + ["1445"])
+    assert find_free_slots(PROJECT_ID, DAY, 2, db_path=schedule) == names(FREE_2[:3])
+
+    # запланированное исключение начинает резать ячейки, когда становится активным
+    planned = database.get_planned_exceptions(PROJECT_ID)[0]["id"]
+    database.activate_planned_exception(planned)
+    assert find_free_slots(PROJECT_ID, DAY, 1, db_path=schedule) == names(FREE_1[:6])
+
+
+def test_numpy_and_pure_python_agree(schedule, monkeypatch):
+    pytest.importorskip("numpy")
+    with_numpy = [find_free_slots(PROJECT_ID, DAY, d, days=2, db_path=schedule)
+                  for d in range(1, 6)]
+    monkeypatch.setattr(slot_grid, "np", None)
+    without = [find_free_slots(PROJECT_ID, DAY, d, days=2, db_path=schedule)
+               for d in range(1, 6)]
+    assert without == with_numpy
+    assert with_numpy[0] == names(FREE_1) and with_numpy[1] == names(FREE_2)
+
+
+def selects(statements: list[str]) -> list[str]:
+    return [sql for sql in statements if sql.lstrip().upper().startswith("SELECT")]
+
+
+def test_query_count_does_not_depend_on_range(schedule, traced):
+    db_safe.close_pool(schedule)        # новые соединения — уже с трассировкой
+    for hours in range(0, 24 * 30, 5):  # месяц броней
+        day = (datetime(2030, 1, 2) + timedelta(hours=hours)).isoformat()
+        database.create_booking(PROJECT_ID, 1, 1, day, 1, "client", "+7")
+
+    find_free_slots(PROJECT_ID, DAY, 1, db_path=schedule)   # загрузка индекса исключений
+    traced.clear()
+    find_free_slots(PROJECT_ID, DAY, 1, db_path=schedule)
+    one_day = selects(traced)
+    traced.clear()
+    find_free_slots(PROJECT_ID, DAY, 3, days=30, db_path=schedule)
+    # версия исключений (exception_index), окна работы, брони
+    assert len(selects(traced)) == len(one_day) == 3
+
+
+def test_day_schedule(schedule):
+    cells = dict(day_schedule(PROJECT_ID, DAY, db_path=schedule))
+    assert len(cells) == 24 * 4
+    assert [t for t, state in cells.items() if state == "free"] \
+        == [f"{t[:2]}:{t[2:]}" for t in FREE_1]
+    assert [t for t, state in cells.items() if state == "busy"] \
+        == ["09:30", "09:45", "10:45", "11:00"]
+    assert [t for t, state in cells.items() if state == "blocked"] == ["11:15", "11:30"]
+    assert cells["08:45"] == cells["12:00"] == "off"
+
+    # то же, что is_slot_blocked по каждой ячейке
+    with transaction(schedule) as conn:
+        assert [state == "blocked" for state in cells.values()] \
+            == [is_slot_blocked(conn, PROJECT_ID, at(t)) for t in cells]
+
+    planned = database.get_planned_exceptions(PROJECT_ID)[0]["id"]
+    database.activate_planned_exception(planned)
+    cells = dict(day_schedule(PROJECT_ID, DAY, db_path=schedule))
+    assert [cells[t] for t in ("14:00", "14:45", "15:00")] == ["blocked", "blocked", "off"]
+
+
+@pytest.fixture
+def bot_schedule(bot_db_path):
+    fill_schedule(
+        lambda start, end: dp.add_work_interval(PROJECT_ID, start, end),
+        lambda start, cells: dp.create_booking(PROJECT_ID, 1, 1, start, cells, "client", "+7"),
+        lambda start, end, status: dp.add_work_exception(PROJECT_ID, start, end, status),
+    )
+    return bot_db_path
+
+
+def test_bot_finds_the_same_slots(bot_schedule):
+    for cells, expected in ((1, FREE_1), (2, FREE_2), (4, FREE_4)):
+        assert dp.find_free_slots(PROJECT_ID, DAY, cells) == names(expected)
+    planned = dp.get_planned_exceptions(PROJECT_ID)[-1]["id"]
+    dp.activate_planned_exception(planned)
+    assert dp.find_free_slots(PROJECT_ID, DAY, 1) == names(FREE_1[:6])
@@ -0,0 +1,241 @@
+# tests/test_storage_contract.py
+"""
+Контракт движков хранения (user-018): одни и те же вызовы app.database
+дают одинаковый результат на SQLite и в памяти.
+"""
+
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import database, storage
+from app.utils import exception_index
+from app.utils.slots import create_booking_safe, find_free_slots
+from bench._common import make_project
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def engine(request, db_path, monkeypatch):
+    """Активный движок на время теста; SQLite — во временной БД из db_path."""
+    monkeypatch.setattr(storage, "_engine", None)
+    storage.set_engine(request.param)
+    return storage.get_engine()
+
+
+def iso(days=0, hours=0) -> str:
+    return (datetime.utcnow() + timedelta(days=days, hours=hours)).replace(
+        minute=0, second=0, microsecond=0).isoformat()
+
+
+def test_engines_implement_contract():
+    assert storage.contract()
+    for name, cls in storage.ENGINES.items():
+        assert cls().missing() == [], name
+
+
+def test_base_engine_is_abstract():
+    with pytest.raises(TypeError):
+        storage.StorageEngine()
+
+
+def test_projects(engine):
+    first = make_project("a")
+    second = make_project("b", template_type="faq_bot")
+    assert database.get_projects(first)["name"] == "a"
+    assert [p["id"] for p in database.get_projects()] == [first, second]
+    assert database.count_projects() == 2
+    assert database.count_projects(template_type="faq_bot") == 1
+    assert database.get_project_ids(template_type="order_bot") == [first]
+
+    database.update_project_content(first, {"admin_chat_id": 2})
+    assert database.get_project_content(first) == {"admin_chat_id": 2}
+    assert database.get_projects(first)["content"] == {"admin_chat_id": 2}
+
+    page = list(database.iter_projects(after_id=first, limit=10, fields=("id", "name")))
+    assert page == [{"id": second, "name": "b"}]
+
+
+def test_transaction_rolls_back(engine):
+    with pytest.raises(RuntimeError):
+        with storage.transaction() as conn:
+            pid = make_project(conn=conn)
+            database.add_products_bulk(pid, [("p", "s", "f", "")], conn=conn)
+            raise RuntimeError
+    assert database.count_projects() == 0
+
+
+def test_products_and_cart(engine):
+    pid = make_project()
+    assert database.add_products_bulk(pid, [("a", "s", "f", ""), ("b", "s", "f", "b.jpg")]) == 2
+    one = database.add_product(pid, "c", "s", "f")
+    products = database.get_products_list(pid)
+    assert [p["name"] for p in products] == ["a", "b", "c"]
+
+    a, b = products[0]["id"], products[1]["id"]
+    database.add_to_cart(pid, 7, a)
+    cart = database.add_to_cart(pid, 7, a, 2)
+    assert [(i["product_id"], i["quantity"]) for i in cart] == [(a, 3)]
+    cart = database.add_to_cart(pid, 7, b)
+    assert [i["product_id"] for i in cart] == [a, b]
+
+    cart = database.update_cart_item(cart[0]["cart_id"], 5)
+    assert [(i["product_id"], i["quantity"]) for i in cart] == [(a, 5), (b, 1)]
+    cart = database.update_cart_item(cart[1]["cart_id"], 0)
+    assert [i["product_id"] for i in cart] == [a]
+    assert database.delete_cart_item(cart[0]["cart_id"]) == []
+
+    database.add_to_cart(pid, 7, b)
+    database.clear_cart(pid, 7)
+    assert database.get_cart_items(pid, 7) == []
+
+    database.delete_product(pid, one)
+    assert [p["name"] for p in database.get_products_list(pid)] == ["a", "b"]
+
+
+def test_bookings(engine):
+    pid = make_project(template_type="smart_booking_crm")
+    day = iso(days=1)[:10]
+    first = database.create_booking(pid, 1, 10, f"{day}T10:00:00", 2, "Анна", "+7")
+    assert database.create_bookings_bulk(pid, [
+        (2, 10, f"{day}T12:00:00", 1, "Борис", "+7"),
+        (3, 10, f"{day}T16:00:00", 1, "Вера", "+7"),
+    ]) == 2
+
+    assert database.get_booking(first)["client_name"] == "Анна"
+    pending = database.get_bookings_by_date(pid, day, "pending")
+    assert [b["client_name"] for b in pending] == ["Анна", "Борис", "Вера"]
+    assert database.get_bookings_by_date(pid, day) == []
+    for b in pending:
+        database.update_booking_status(b["id"], "confirmed")
+    assert len(database.get_confirmed_future_bookings(pid)) == 3
+
+    cancelled = database.cancel_bookings_in_interval(pid, f"{day}T11:00:00", f"{day}T16:00:00")
+    assert [b["user_id"] for b in cancelled] == [2]
+    database.update_booking_status(first, "done")
+    assert [(b["client_name"], b["status"]) for b in database.get_all_bookings(pid)] == [
+        ("Анна", "done"), ("Борис", "cancelled_by_provider"), ("Вера", "confirmed")]
+    assert [b["client_name"] for b in database.get_bookings_by_date(pid, day)] == ["Вера"]
+
+
+def test_work_intervals_and_exceptions(engine):
+    pid = make_project(template_type="smart_booking_crm")
+    database.add_work_interval(pid, iso(days=1), iso(days=1, hours=8))
+    assert database.add_work_intervals_bulk(pid, [
+        (iso(days=2), iso(days=2, hours=8)),
+        (iso(days=30), iso(days=30, hours=8)),
+    ]) == 2
+    week = database.get_work_intervals(pid, 7)
+    assert [w["start_dt"] for w in week] == [iso(days=1), iso(days=2)]
+    database.delete_work_interval(week[0]["id"])
+    assert [w["start_dt"] for w in database.get_work_intervals(pid, 7)] == [iso(days=2)]
+
+    exc = database.add_work_exception(pid, iso(days=3), iso(days=4), "planned")
+    assert [e["id"] for e in database.get_planned_exceptions(pid)] == [exc]
+    assert tuple(database.activate_planned_exception(exc)) == (iso(days=3), iso(days=4))
+    assert database.get_planned_exceptions(pid) == []
+
+
+def test_create_booking_safe(engine, db_path):
+    pid = make_project(template_type="smart_booking_crm")
+    day = iso(days=1)[:10]
+
+    def book(start: str, cells: int = 1) -> int:
+        return create_booking_safe(pid, 1, 10, f"{day}T{start}:00", cells, "Анна", "+7",
+                                   db_path=db_path)
+
+    first = book("10:00", 4)                       # 10:00–11:00
+    assert database.get_booking(first)["status"] == "pending"
+    with pytest.raises(ValueError, match="занят"):
+        book("10:45")
+    with pytest.raises(ValueError, match="занят"):
+        book("09:30", 3)                           # задевает начало брони
+    book("11:00")                                  # стык — не пересечение
+    database.update_booking_status(first, "cancelled_by_provider")
+    book("10:15")                                  # отменённая не держит слот
+
+    database.add_work_exception(pid, f"{day}T13:00:00", f"{day}T14:00:00", "active")
+    with pytest.raises(ValueError, match="заблокирован"):
+        book("12:30", 4)
+    book("14:00")
+    with pytest.raises(ValueError, match="Некорректное время"):
+        book("25:99")
+    assert len(database.get_all_bookings(pid)) == 4
+
+
+def test_find_free_slots(engine, db_path):
+    pid = make_project(template_type="smart_booking_crm")
+    day = iso(days=1)[:10]
+    database.add_work_interval(pid, f"{day}T09:00:00", f"{day}T11:00:00")
+    database.create_booking(pid, 1, 10, f"{day}T09:30:00", 2, "Анна", "+7")
+    database.add_work_exception(pid, f"{day}T10:30:00", f"{day}T10:45:00", "active")
+    planned = database.add_work_exception(pid, f"{day}T09:00:00", f"{day}T09:15:00",
+                                          "planned")
+    compact = day.replace("-", "")
+
+    assert find_free_slots(pid, day, 1, db_path=db_path) \
+        == [f"{compact}_0900", f"{compact}_0915", f"{compact}_1000",
+            f"{compact}_1015", f"{compact}_1045"]
+    assert find_free_slots(pid, compact, 2, db_path=db_path) \
+        == [f"{compact}_0900", f"{compact}_1000"]
+
+    database.activate_planned_exception(planned)   # индекс обновляется событием
+    assert find_free_slots(pid, day, 2, db_path=db_path) == [f"{compact}_1000"]
+
+
+def test_memory_engine_slots_skip_sqlite(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_engine", None)
+    storage.set_engine("memory")
+    missing = tmp_path / "no-such-dir" / "database.db"   # SQLite тут упал бы
+    pid = make_project(template_type="smart_booking_crm")
+    day = iso(days=1)[:10]
+    database.add_work_interval(pid, f"{day}T09:00:00", f"{day}T10:00:00")
+    database.add_work_exception(pid, f"{day}T09:30:00", f"{day}T10:00:00", "active")
+
+    assert len(find_free_slots(pid, day, 1, db_path=missing)) == 2
+    create_booking_safe(pid, 1, 10, f"{day}T09:00:00", 1, "Анна", "+7", db_path=missing)
+    assert len(find_free_slots(pid, day, 1, db_path=missing)) == 1
+    assert exception_index.segments(pid, 0, 2**40, missing)
+
+
+def test_switching_engine_resets_exception_index(db_path, monkeypatch):
+    monkeypatch.setattr(storage, "_engine", None)
+    storage.set_engine("sqlite")
+    pid = make_project(template_type="smart_booking_crm")
+    database.add_work_exception(pid, iso(days=1), iso(days=2), "active")
+    assert exception_index.get(pid, db_path).active
+
+    storage.set_engine("memory")
+    assert exception_index.get(pid, db_path).active == []
+
+
+def test_settings_faq_and_bans(engine):
+    pid = make_project(template_type="faq_bot")
+    assert database.get_setting("summary_enabled") == "true"
+    database.set_setting("summary_enabled", "false")
+    database.set_setting("new_key", "1")
+    assert (database.get_setting("summary_enabled"), database.get_setting("new_key")) \
+        == ("false", "1")
+
+    entry = database.add_faq_entry(pid, "q1", "a1")
+    assert database.add_faq_entries_bulk(pid, [("q2", "a2", "")]) == 1
+    assert [e["question"] for e in database.get_faq_entries(pid)] == ["q1", "q2"]
+    database.delete_faq_entry(pid, entry)
+    assert [e["question"] for e in database.get_faq_entries(pid)] == ["q2"]
+
+    assert not database.is_banned(pid, 5)
+    database.ban_user(pid, 5)
+    assert database.is_banned(pid, 5)
+    assert not database.is_banned(pid + 1, 5)
+
+
+def test_seed_writes(engine):
+    pid = make_project(template_type="helper_bot")
+    assert database.add_helper_entries_bulk(pid, [("hi", "Привет", "", 0)]) == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        database.add_helper_entries_bulk(pid, [("hi", "ещё раз", "", 0)])
+
+    database.block_users_bulk(pid, [1, 2, 2])
+    assert database.log_feedback_bulk(pid, [(1, "in", "привет"), (2, "in", "ещё")]) == 2
+    database.set_moderation_settings(pid, {})
+    database.whitelist_add_bulk(pid, ["example.com", "example.com"])
@@ -0,0 +1,69 @@
+# tests/test_stream_zip.py
+"""
+stream_zip (user-001, user-006): архив, собранный порциями, читается
+zipfile'ом — STORED, DEFLATED, параллельное сжатие и ZIP64.
+"""
+
+import io
+import os
+import zipfile
+
+import pytest
+
+from app import export_utils
+from app.export_utils import stream_zip
+
+
+@pytest.fixture
+def files(tmp_path):
+    big = tmp_path / "order_bot.db"
+    big.write_bytes("INSERT INTO products VALUES (1, 'Товар');\n".encode() * 20000)  # > PARALLEL_MIN_SIZE
+    photo = tmp_path / "photo.jpg"
+    photo.write_bytes(os.urandom(300_000))
+    return [
+        ("bot.py", "print('привет')\n".encode("utf-8") * 500),
+        ("media/1/photo.jpg", photo),
+        ("utils/order_bot.db", big),
+        ("README.md", b""),
+        ("utils/пусто.txt", b"x"),
+    ]
+
+
+def unzip(files, **kwargs) -> zipfile.ZipFile:
+    archive = b"".join(stream_zip(iter(files), chunk_size=4096, **kwargs))
+    zf = zipfile.ZipFile(io.BytesIO(archive))
+    assert zf.testzip() is None
+    expected = {name: data.read_bytes() if hasattr(data, "read_bytes") else data
+                for name, data in files}
+    assert zf.namelist() == list(expected)
+    for name, data in expected.items():
+        assert zf.read(name) == data, name
+    return zf
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_round_trip(files, workers):
+    zf = unzip(files, workers=workers)
+    methods = {i.filename: i.compress_type for i in zf.infolist()}
+    assert methods["media/1/photo.jpg"] == zipfile.ZIP_STORED
+    assert methods["bot.py"] == methods["utils/order_bot.db"] == zipfile.ZIP_DEFLATED
+    assert zf.getinfo("utils/order_bot.db").compress_size < zf.getinfo("utils/order_bot.db").file_size
+
+
+def test_parallel_path_keeps_order_and_reports_progress(files):
+    progress = []
+    unzip(files, workers=3, on_progress=progress.append)
+    assert sum(progress) == sum(
+        d.stat().st_size if hasattr(d, "stat") else len(d) for _, d in files)
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_zip64_records(files, workers, monkeypatch):
+    # порог 4 ГБ опускаем, чтобы ZIP64-записи, смещения и конец каталога
+    # получились на маленьких файлах
+    monkeypatch.setattr(export_utils, "ZIP64_LIMIT", 1000)
+    zf = unzip(files, workers=workers)
+    info = zf.getinfo("utils/order_bot.db")
+    assert info.header_offset > 1000 and info.file_size > 1000
+    archive = zf.fp.getvalue()
+    assert b"PK\x06\x06" in archive and b"PK\x06\x07" in archive    # ZIP64 EOCD + locator